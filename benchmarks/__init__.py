@@ -0,0 +1,23 @@
+"""
+Performance benchmarks for booker_engine.
+
+Run them with `python manage.py benchmark [suite ...]`. Every run seeds a
+throwaway test database, so the configured database is never touched.
+"""
+
+SUITES = {
+    'archive': 'benchmarks.archive',
+    'bulk_create': 'benchmarks.bulk_create',
+    'connections': 'benchmarks.connections',
+    'deployments': 'benchmarks.deployments',
+    'endpoints': 'benchmarks.endpoints',
+    'export': 'benchmarks.export',
+    'live_subscribers': 'benchmarks.live_subscribers',
+    'range_queries': 'benchmarks.range_queries',
+    'recurrence': 'benchmarks.recurrence',
+    'renderers': 'benchmarks.renderers',
+    'request_metrics': 'benchmarks.request_metrics',
+    'rooms': 'benchmarks.rooms',
+    'token_auth': 'benchmarks.token_auth',
+    'utilization': 'benchmarks.utilization',
+}
@@ -0,0 +1,94 @@
+"""
+Uncached day queries with every seeded booking in the booking table, then
+after archive_bookings moved the past and soft deleted ones to the monthly
+partitions of the archive table. Meant for large seeds, e.g. --rows 10000000.
+
+The archive is moved back into the booking table at the end, so the seeded
+database stays reusable with --keepdb.
+"""
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from booker_engine import archive, day_cache
+from booker_engine.models import default_room
+
+from .timing import measure
+
+
+def table_sizes():
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT pg_total_relation_size('booker_engine_booking'),
+                   coalesce(sum(pg_total_relation_size(inhrelid)), 0)
+            FROM pg_inherits WHERE inhparent = 'booker_engine_archivedbooking'::regclass
+        """)
+        return [round(size / 2**20, 1) for size in cursor.fetchone()]
+
+
+def vacuum(full=False):
+    with connection.cursor() as cursor:
+        # FULL gives the space back, as a table that was always archived would not have grown.
+        cursor.execute(f"VACUUM {'FULL ' if full else ''}ANALYZE booker_engine_booking")
+        cursor.execute("VACUUM ANALYZE booker_engine_archivedbooking")
+
+
+def unarchive():
+    with transaction.atomic(), connection.cursor() as cursor:
+        archive.moving_archive(cursor)
+        cursor.execute(f"""
+            WITH moved AS (DELETE FROM booker_engine_archivedbooking RETURNING {archive.COLUMNS})
+            INSERT INTO booker_engine_booking ({archive.COLUMNS}) SELECT {archive.COLUMNS} FROM moved
+        """)
+        cursor.execute("SELECT inhrelid::regclass::text FROM pg_inherits "
+                       "WHERE inhparent = 'booker_engine_archivedbooking'::regclass")
+        for (partition,) in cursor.fetchall():
+            cursor.execute(f'DROP TABLE {partition}')
+    vacuum()
+
+
+def measure_days(room_id, days, iterations):
+    return measure(lambda i: day_cache.fetch_rows(room_id, [days[i]]), iterations)
+
+
+def run(owners, options, log):
+    """Times fetching single days from the last year and from older history, before and after archiving."""
+    today = timezone.localdate()
+    archive_days = settings.BOOKING_ARCHIVE_AFTER_DAYS
+    rng = random.Random(0)
+    iterations = options['iterations']
+    recent = [today - timedelta(days=rng.randrange(archive_days - 1)) for _ in range(iterations)]
+    older = [today - timedelta(days=rng.randrange(archive_days + 1, 365 * options['years'])) for _ in range(iterations)]
+    room_id = default_room()
+
+    results = {}
+    vacuum()
+    before = table_sizes()
+    for name, days in (('recent', recent), ('older', older)):
+        results[f'fetch_day_{name}_single_table'] = measure_days(room_id, days, iterations)
+
+    started = time.perf_counter()
+    # Every soft deleted booking, the seeded ones were all modified just now.
+    moved = archive.archive(inactive_before=timezone.now())
+    elapsed = time.perf_counter() - started
+    try:
+        vacuum(full=True)
+        after = table_sizes()
+        for name, days in (('recent', recent), ('older', older)):
+            results[f'fetch_day_{name}_archived'] = measure_days(room_id, days, iterations)
+    finally:
+        unarchive()
+
+    # A batch holds locks for its duration, it is not a request latency.
+    results['archive_bookings'] = {'moved': moved, 'seconds': round(elapsed, 1),
+                                   'rows_per_s': round(moved / elapsed) if elapsed else None}
+    log(f"Archived {moved} bookings in {elapsed:.1f}s. Booking table {before[0]}MB -> {after[0]}MB, "
+        f"archive partitions {after[1]}MB")
+    for name in ('recent', 'older'):
+        log(f"Day query p50, {name} days: {results[f'fetch_day_{name}_single_table']['p50_ms']}ms -> "
+            f"{results[f'fetch_day_{name}_archived']['p50_ms']}ms")
+    return results
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from booker_engine.models import default_room
+
+from .timing import measure
+
+BATCH = 1000
+RUNS = 20
+
+
+def run(owners, options, log):
+    """Times importing batches of 1,000 bookings through api/bulk_create_bookings."""
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=owners[0])
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+    url = reverse('api_bulk_create_bookings')
+    # Every run gets its own stretch of empty calendar after the seeded history.
+    first = datetime.combine(timezone.localdate() + timedelta(days=365), datetime.min.time())
+    # Naming the room, as importers do, so its lookup is part of what is timed.
+    room = default_room()
+
+    def batch(i):
+        offset = first + timedelta(hours=i * BATCH * 2)
+        return [{'name': f'Import {i}-{n}',
+                 'start': (offset + timedelta(hours=n)).isoformat(),
+                 'end': (offset + timedelta(hours=n, minutes=45)).isoformat(), 'room': room}
+                for n in range(BATCH)]
+
+    def request(i):
+        response = client.post(url, {'bookings': batch(i)}, format='json')
+        assert response.status_code == 201, response.data
+
+    stats = measure(request, RUNS)
+    # One request writes a whole batch, which should take well under a second.
+    stats['budget_ms'] = 500
+    return {'api_bulk_create_bookings': stats}
@@ -0,0 +1,54 @@
+"""
+Times API requests against a gunicorn WSGI worker that opens a database
+connection per request and one that keeps it open (DB_CONN_MAX_AGE), and
+counts the connections Postgres saw being opened.
+"""
+import asyncio
+import time
+
+from django.db import connection
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from booker_engine.models import Booking
+
+from .deployments import fetch, request_bytes, serve
+from .live_subscribers import free_port
+from .timing import summarize
+
+
+def sessions():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sessions FROM pg_stat_database WHERE datname = current_database()")
+        return cursor.fetchone()[0]
+
+
+def run(owners, options, log):
+    """Sequential single-booking lookups, with and without persistent connections."""
+    token, _ = Token.objects.get_or_create(user=owners[0])
+    booking_id = Booking.objects.filter(userid=owners[0], active=True).values_list('id', flat=True).first()
+    request = request_bytes(f"{reverse('api_get_booking')}?id={booking_id}", token.key)
+
+    results = {}
+    for name, max_age in (('per_request', '0'), ('persistent', '60')):
+        port = free_port()
+        server = serve('wsgi', port, {**options, 'workers': 1}, DB_CONN_MAX_AGE=max_age)
+        try:
+            asyncio.run(fetch(port, request))
+            before = sessions()
+            samples = []
+            for _ in range(options['iterations']):
+                _, elapsed = asyncio.run(fetch(port, request))
+                samples.append(elapsed)
+            # Stats are flushed when a session ends, give the last one a moment.
+            time.sleep(0.5)
+            stats = summarize(samples)
+            stats['connections_per_request'] = round((sessions() - before) / options['iterations'], 3)
+        finally:
+            server.terminate()
+            server.wait()
+        results[f'api_get_booking_{name}'] = stats
+    log(f"Connections per request: {results['api_get_booking_per_request']['connections_per_request']} -> "
+        f"{results['api_get_booking_persistent']['connections_per_request']}, p50 "
+        f"{results['api_get_booking_per_request']['p50_ms']}ms -> {results['api_get_booking_persistent']['p50_ms']}ms")
+    return results
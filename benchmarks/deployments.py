@@ -0,0 +1,158 @@
+"""
+Load test of the read-only booking API served by gunicorn with sync WSGI
+workers and with uvicorn ASGI workers, on the same machine and database.
+
+Each deployment is driven by --concurrency clients for --duration seconds,
+once on its own and once while --slow-clients connections trickle their
+request headers in, like clients on a bad network. A sync worker is tied up by
+such a connection until it completes, an ASGI worker is not.
+"""
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from booker_engine.models import Booking
+
+from .live_subscribers import free_port
+from .timing import summarize
+
+DEPLOYMENTS = {
+    'wsgi': ['bookersite.wsgi:application'],
+    'asgi': ['bookersite.asgi:application', '--worker-class', 'uvicorn.workers.UvicornWorker'],
+}
+# Requests still unanswered after this are given up on, counted as errors and
+# as taking this long.
+CLIENT_TIMEOUT = 5
+
+
+def request_bytes(path, token):
+    return (
+        f"GET {path} HTTP/1.1\r\n"
+        "Host: testserver\r\n"
+        f"Authorization: Token {token}\r\n"
+        "Connection: close\r\n\r\n"
+    ).encode()
+
+
+async def fetch(port, request):
+    """(status or None, seconds) of one request on a new connection."""
+    started = time.perf_counter()
+    writer = None
+    try:
+        async with asyncio.timeout(CLIENT_TIMEOUT):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(request)
+            status = int((await reader.readline()).split()[1])
+            await reader.read()
+    except (OSError, IndexError, ValueError, TimeoutError):
+        status = None
+    finally:
+        if writer is not None:
+            writer.close()
+    return status, min(time.perf_counter() - started, CLIENT_TIMEOUT)
+
+
+async def client(port, requests, deadline, samples, statuses):
+    while time.perf_counter() < deadline:
+        status, elapsed = await fetch(port, random.choice(requests))
+        samples.append(elapsed)
+        statuses[status] += 1
+
+
+async def slow_client(port, request, deadline):
+    """Sends the request headers a line per second until the deadline."""
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(request.split(b'\r\n', 1)[0] + b'\r\n')
+        n = 0
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(1)
+            writer.write(f"X-Slow-{n}: 1\r\n".encode())
+            await writer.drain()
+            n += 1
+        writer.close()
+    except OSError:
+        pass
+
+
+async def load(port, requests, options, slow_clients):
+    samples, statuses = [], Counter()
+    deadline = time.perf_counter() + options['duration']
+    slow = [asyncio.create_task(slow_client(port, requests[0], deadline)) for _ in range(slow_clients)]
+    await asyncio.sleep(0.5 if slow_clients else 0)
+    started = time.perf_counter()
+    await asyncio.gather(*(client(port, requests, deadline, samples, statuses)
+                           for _ in range(options['concurrency'])))
+    elapsed = time.perf_counter() - started
+    await asyncio.gather(*slow)
+
+    result = summarize(samples)
+    result.update({
+        'requests_per_s': round(sum(count for status, count in statuses.items() if status) / elapsed, 1),
+        'errors': sum(count for status, count in statuses.items() if status not in (200, 304)),
+        'concurrency': options['concurrency'],
+        'slow_clients': slow_clients,
+    })
+    return result
+
+
+def serve(deployment, port, options, **env):
+    env = {**os.environ, 'DB_NAME': connection.settings_dict['NAME'], **env}
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', *DEPLOYMENTS[deployment], '--bind', f'127.0.0.1:{port}',
+         '--workers', str(options['workers']), '--log-level', 'warning'],
+        env=env,
+    )
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port)).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    return server
+
+
+def run(owners, options, log):
+    """Requests/s and latency of the read API under WSGI and ASGI workers, with and without slow clients."""
+    token, _ = Token.objects.get_or_create(user=owners[0])
+    booking_ids = list(Booking.objects.filter(userid=owners[0], active=True, start__gt=timezone.now())
+                       .values_list('id', flat=True)[:20])
+    today = timezone.localdate()
+    paths = (
+        [f"{reverse('api_get_day_bookings')}?date={today - timedelta(days=offset)}" for offset in range(20)]
+        + [f"{reverse('api_get_week_bookings')}?date={today}", reverse('api_my_bookings')]
+        + [f"{reverse('api_get_booking')}?id={booking_id}" for booking_id in booking_ids]
+    )
+    requests = [request_bytes(path, token.key) for path in paths]
+
+    results = {}
+    for deployment in DEPLOYMENTS:
+        port = free_port()
+        server = serve(deployment, port, options)
+        try:
+            # Boots the workers and fills their caches.
+            for request in requests * options['workers']:
+                asyncio.run(fetch(port, request))
+            for slow_clients in sorted({0, options['slow_clients']}):
+                name = f'{deployment}_slow_clients' if slow_clients else deployment
+                results[name] = asyncio.run(load(port, requests, options, slow_clients))
+                # Latency at saturation is mostly queueing, it is compared between the
+                # deployments rather than held to --budget-ms.
+                results[name]['budget_ms'] = CLIENT_TIMEOUT * 1000
+                log(f"{name}: {results[name]['requests_per_s']} requests/s, "
+                    f"p99 {results[name]['p99_ms']}ms, {results[name]['errors']} errors")
+        finally:
+            server.terminate()
+            server.wait()
+    return results
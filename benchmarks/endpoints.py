@@ -0,0 +1,291 @@
+"""
+Drives every URL in booker_engine/urls.py against a real gunicorn server with
+--concurrency clients, and reports requests/s, latency and errors per
+endpoint together with the queries a single request runs, counted in process.
+
+Write endpoints get a slot, booking or series of their own per request, far
+after the seeded history, so every request does the same work. They write as
+a user of their own, so the reads see only the seeded bookings.
+"""
+import asyncio
+import json
+import warnings
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+from rest_framework.authtoken.models import Token
+
+from booker_engine import recurrence
+from booker_engine.urls import urlpatterns
+from booker_engine.models import Booking, RecurringBooking, default_room
+
+from .deployments import CLIENT_TIMEOUT, fetch, serve
+from .live_subscribers import free_port
+from .timing import summarize
+
+Request = namedtuple('Request', 'method path body content_type auth', defaults=(None, None, 'token'))
+
+EXCLUDED = {
+    'logout': "ends the session the other requests use",
+    'api_logout': "deletes the token the other requests use",
+    'live_stream': "never completes, see the live_subscribers suite",
+}
+# Password hashing makes these slow on purpose. A few requests, from as many
+# clients as there are workers, show it without queueing into timeouts.
+SLOW = {'api_login', 'api_token_auth'}
+SLOW_REQUESTS = 20
+PASSWORD = 'bench-password'
+# Bookings per bulk edit and bulk delete request.
+BULK = 5
+
+
+class Fixtures:
+    """Users, credentials and the bookings and series the write endpoints work on."""
+
+    def __init__(self, owners, count):
+        self.token = Token.objects.get_or_create(user=owners[0])[0].key
+        self.writer, _ = User.objects.get_or_create(username='bench-writer')
+        self.writer_token = Token.objects.get_or_create(user=self.writer)[0].key
+        admin, _ = User.objects.get_or_create(username='bench-admin', defaults={'is_staff': True})
+        self.admin_token = Token.objects.get_or_create(user=admin)[0].key
+        login_user, created = User.objects.get_or_create(username='bench-login')
+        if created:
+            login_user.set_password(PASSWORD)
+            login_user.save()
+
+        client = Client()
+        client.force_login(self.writer)
+        self.session = client.cookies['sessionid'].value
+        self.csrf = get_random_string(32)
+
+        # Regions of their own, a year after the seeded history ends. Whatever
+        # an earlier run left there goes first.
+        after = timezone.now() + timedelta(days=30)
+        Booking.objects.filter(start__gte=after).delete()
+        RecurringBooking.objects.filter(start__gte=after).delete()
+        self.origin = timezone.make_aware(datetime.combine(timezone.localdate() + timedelta(days=365),
+                                                           datetime.min.time()))
+        self.room = default_room()
+        self.bookings = {
+            name: self.create_bookings(region, count)
+            for region, name in enumerate(('api_delete_booking', 'api_update_booking', 'delete_booking'), start=1)
+        }
+        # BULK bookings per request, spanning three regions each.
+        self.batches = {
+            name: self.create_bookings(region, count * BULK)
+            for region, name in ((4, 'api_bulk_update_bookings'), (7, 'api_bulk_delete_bookings'))
+        }
+        self.series = {
+            name: self.create_series(region, count)
+            for region, name in enumerate(('api_delete_recurring_booking', 'api_cancel_occurrence'), start=20)
+        }
+
+    def slot(self, region, i):
+        """Start of the i-th 30 minute slot of a region, two hours apart."""
+        return self.origin + timedelta(days=30 * region, hours=2 * i)
+
+    def create_bookings(self, region, count):
+        bookings = Booking.objects.bulk_create(
+            Booking(name='Bench fixture', start=self.slot(region, i), end=self.slot(region, i) + timedelta(minutes=30),
+                    userid=self.writer, room_id=self.room)
+            for i in range(count)
+        )
+        return [booking.id for booking in bookings]
+
+    def create_series(self, region, count):
+        ids = []
+        for i in range(count):
+            series = RecurringBooking(name='Bench series', start=self.slot(region, i),
+                                      end=self.slot(region, i) + timedelta(minutes=30), frequency=RecurringBooking.DAILY,
+                                      count=1, userid=self.writer, room_id=self.room)
+            series.last_start = recurrence.span(series)[1]
+            series.save()
+            ids.append(series.id)
+        return ids
+
+
+def endpoints(fixtures):
+    """{url name: request(i) -> Request} for every URL that is not excluded."""
+    f = fixtures
+    today = timezone.localdate()
+    local = lambda value: timezone.localtime(value).replace(tzinfo=None).isoformat()
+    payload = lambda start, **extra: {
+        'name': 'Bench', 'start': local(start), 'end': local(start + timedelta(minutes=30)), **extra
+    }
+    day = lambda i: (today - timedelta(days=i % 365)).isoformat()
+    query = lambda name, **params: f"{reverse(name)}?{urlencode(params)}"
+
+    return {
+        'signup': lambda i: Request('GET', reverse('signup'), auth=None),
+        'login': lambda i: Request('GET', reverse('login'), auth=None),
+        'index': lambda i: Request('GET', reverse('index'), auth=None),
+        'home': lambda i: Request('GET', reverse('home'), auth='session'),
+        'calendar': lambda i: Request('GET', reverse('calendar'), auth='session'),
+        'live_view': lambda i: Request('GET', reverse('live_view'), auth='session'),
+        'create_booking': lambda i: Request('POST', reverse('create_booking'), urlencode({
+            'name': 'Bench', 'date': timezone.localdate(f.slot(10, i)).isoformat(),
+            'time': timezone.localtime(f.slot(10, i)).strftime('%H:%M'), 'duration': 30, 'room': f.room,
+        }), 'application/x-www-form-urlencoded', 'session'),
+        'edit_booking': lambda i: Request('GET', reverse('edit_booking', args=[f.bookings['api_update_booking'][i]]),
+                                          auth='session'),
+        'delete_booking': lambda i: Request('POST', reverse('delete_booking', args=[f.bookings['delete_booking'][i]]),
+                                            auth='session'),
+        'all_bookings': lambda i: Request('GET', query('all_bookings', start=f"{day(i + 30)}T00:00",
+                                                       end=f"{day(i)}T00:00"), auth='session'),
+        'get_bookings': lambda i: Request('GET', query('get_bookings', date=day(i)), auth='session'),
+        'api_login': lambda i: Request('POST', reverse('api_login'),
+                                       json.dumps({'username': 'bench-login', 'password': PASSWORD}), auth=None),
+        'api_token_auth': lambda i: Request('POST', reverse('api_token_auth'),
+                                            json.dumps({'username': 'bench-login', 'password': PASSWORD}), auth=None),
+        'api_get_day_bookings': lambda i: Request('GET', query('api_get_day_bookings', date=day(i))),
+        'api_get_week_bookings': lambda i: Request('GET', query('api_get_week_bookings', date=day(i))),
+        'api_create_booking': lambda i: Request('POST', reverse('api_create_booking'),
+                                                json.dumps(payload(f.slot(11, i))), auth='writer'),
+        'api_bulk_create_bookings': lambda i: Request('POST', reverse('api_bulk_create_bookings'), json.dumps({
+            'bookings': [payload(f.slot(12, 10 * i + j)) for j in range(10)],
+        }), auth='writer'),
+        'api_my_bookings': lambda i: Request('GET', reverse('api_my_bookings')),
+        'api_get_booking': lambda i: Request('GET', query('api_get_booking', id=f.bookings['api_update_booking'][i]),
+                                             auth='writer'),
+        'api_delete_booking': lambda i: Request('DELETE', query('api_delete_booking',
+                                                                id=f.bookings['api_delete_booking'][i]), auth='writer'),
+        'api_update_booking': lambda i: Request('PUT', query('api_update_booking',
+                                                             id=f.bookings['api_update_booking'][i]),
+                                                json.dumps(payload(f.slot(2, i) + timedelta(minutes=30))), auth='writer'),
+        'api_bulk_update_bookings': lambda i: Request('POST', reverse('api_bulk_update_bookings'), json.dumps({
+            'bookings': [dict(payload(f.slot(4, BULK * i + j) + timedelta(minutes=30)),
+                              id=f.batches['api_bulk_update_bookings'][BULK * i + j]) for j in range(BULK)],
+        }), auth='writer'),
+        'api_bulk_delete_bookings': lambda i: Request('POST', reverse('api_bulk_delete_bookings'), json.dumps({
+            'ids': f.batches['api_bulk_delete_bookings'][BULK * i:BULK * (i + 1)],
+        }), auth='writer'),
+        'api_create_recurring_booking': lambda i: Request('POST', reverse('api_create_recurring_booking'), json.dumps(
+            payload(f.slot(30, 0) + timedelta(days=15 * i), frequency='weekly', count=2)
+        ), auth='writer'),
+        'api_delete_recurring_booking': lambda i: Request('DELETE', query(
+            'api_delete_recurring_booking', id=f.series['api_delete_recurring_booking'][i]), auth='writer'),
+        'api_cancel_occurrence': lambda i: Request('POST', reverse('api_cancel_occurrence'), json.dumps({
+            'id': f.series['api_cancel_occurrence'][i], 'date': timezone.localdate(f.slot(21, i)).isoformat(),
+        }), auth='writer'),
+        'api_rooms': lambda i: Request('GET', reverse('api_rooms')),
+        'api_free_slots': lambda i: Request('GET', query('api_free_slots', start=f"{day(i)}T08:00",
+                                                         end=f"{day(i)}T18:00", duration=30)),
+        'api_utilization': lambda i: Request('GET', query(
+            'api_utilization', month=(today.replace(day=1) - timedelta(days=31 * (i % 12))).strftime('%Y-%m'))),
+        # A week of the seeded history, so a request reads a bounded number of rows.
+        'api_export': lambda i: Request('GET', query('api_export', output='ndjson', start=f"{day(i + 7)}T00:00",
+                                                     end=f"{day(i)}T00:00")),
+        'api_cache_stats': lambda i: Request('GET', reverse('api_cache_stats'), auth='admin'),
+        'metrics': lambda i: Request('GET', reverse('metrics'), auth='admin'),
+    }
+
+
+def headers(request, fixtures):
+    result = {}
+    if request.auth == 'token':
+        result['Authorization'] = f'Token {fixtures.token}'
+    elif request.auth == 'writer':
+        result['Authorization'] = f'Token {fixtures.writer_token}'
+    elif request.auth == 'admin':
+        result['Authorization'] = f'Token {fixtures.admin_token}'
+    elif request.auth == 'session':
+        result['Cookie'] = f'sessionid={fixtures.session}; csrftoken={fixtures.csrf}'
+        result['X-CSRFToken'] = fixtures.csrf
+    if request.body is not None:
+        result['Content-Type'] = request.content_type or 'application/json'
+    return result
+
+
+def http_request(request, fixtures):
+    body = (request.body or '').encode()
+    lines = [f"{request.method} {request.path} HTTP/1.1", "Host: testserver", "Connection: close"]
+    lines += [f"{name}: {value}" for name, value in headers(request, fixtures).items()]
+    lines.append(f"Content-Length: {len(body)}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode() + body
+
+
+def count_queries(warm_up, request, fixtures):
+    """Queries `request` runs in this process, after `warm_up` filled the caches."""
+    client = Client()
+    if request.auth == 'session':
+        client.force_login(fixtures.writer)
+
+    def send(request):
+        extra = {}
+        if 'Authorization' in headers(request, fixtures):
+            extra['HTTP_AUTHORIZATION'] = headers(request, fixtures)['Authorization']
+        with warnings.catch_warnings():
+            # The test client consumes all_bookings' async stream synchronously, and says so.
+            warnings.filterwarnings('ignore', 'StreamingHttpResponse must consume')
+            response = client.generic(request.method, request.path, request.body or '',
+                                      content_type=request.content_type or 'application/json', **extra)
+            b''.join(response)
+
+    send(warm_up)
+    with CaptureQueriesContext(connection) as queries:
+        send(request)
+    return len(queries)
+
+
+async def drive(port, requests, concurrency):
+    pending = iter(requests)
+    samples, statuses = [], Counter()
+
+    async def client():
+        for request in pending:
+            status, elapsed = await fetch(port, request)
+            samples.append(elapsed)
+            statuses[status] += 1
+
+    started = asyncio.get_running_loop().time()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = asyncio.get_running_loop().time() - started
+    result = summarize(samples)
+    result.update({
+        'requests_per_s': round(len(samples) / elapsed, 1),
+        'errors': sum(count for status, count in statuses.items() if status is None or status >= 400),
+    })
+    return result
+
+
+def run(owners, options, log):
+    """Throughput, latency and queries per request of every endpoint, one endpoint at a time."""
+    count = options['iterations']
+    # Three more per endpoint for warming up the server, and for warming up and
+    # counting queries in process.
+    fixtures = Fixtures(owners, count + 3)
+    routes = endpoints(fixtures)
+    names = {pattern.name for pattern in urlpatterns}
+    uncovered = names - set(routes) - set(EXCLUDED)
+    if uncovered:
+        raise RuntimeError(f"No benchmark request for {', '.join(sorted(uncovered))}")
+
+    results = {}
+    port = free_port()
+    server = serve(options['server'], port, options)
+    try:
+        for name, build in routes.items():
+            total, concurrency = count, options['concurrency']
+            if name in SLOW:
+                total, concurrency = min(count, SLOW_REQUESTS), options['workers']
+            asyncio.run(fetch(port, http_request(build(total), fixtures)))
+            queries = count_queries(build(total + 1), build(total + 2), fixtures)
+            stats = asyncio.run(drive(port, [http_request(build(i), fixtures) for i in range(total)], concurrency))
+            stats['queries_per_request'] = queries
+            # Latency at saturation is mostly queueing, compare it between commits instead.
+            stats['budget_ms'] = CLIENT_TIMEOUT * 1000
+            results[name] = stats
+            log(f"{name}: {stats['requests_per_s']} requests/s, p95 {stats['p95_ms']}ms, "
+                f"{queries} queries, {stats['errors']} errors")
+    finally:
+        server.terminate()
+        server.wait()
+    return results
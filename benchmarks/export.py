@@ -0,0 +1,92 @@
+"""
+Export throughput over the whole seeded history, e.g. --rows 1000000, per
+format, downloaded from gunicorn with sync WSGI workers and with uvicorn ASGI
+workers, with how much the serving worker's peak memory grew meanwhile.
+Streaming keeps that growth at about one chunk of rows, however many there
+are, under either server. A response buffered whole grows it by its size.
+"""
+import asyncio
+import time
+from urllib.parse import urlencode
+
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from booker_engine import export
+from booker_engine.models import ArchivedBooking, Booking
+
+from .deployments import DEPLOYMENTS, request_bytes, serve
+from .live_subscribers import free_port
+
+# A whole history takes longer than gunicorn's default 30 second worker timeout.
+WORKER_TIMEOUT = 600
+
+
+def worker_peak_rss_mb(server):
+    """Peak resident memory of the server's workers, read from /proc (Linux)."""
+    with open(f'/proc/{server.pid}/task/{server.pid}/children') as children:
+        pids = children.read().split()
+    peak = 0
+    for pid in pids:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    # Kilobytes.
+                    peak = max(peak, int(line.split()[1]))
+    return peak / 1024
+
+
+async def download(port, request):
+    """(status, body bytes, seconds to the first of them, seconds) of one request, read as it streams."""
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(request)
+        status = int((await reader.readline()).split()[1])
+        while await reader.readline() not in (b'\r\n', b''):
+            pass
+        first, size = None, 0
+        while chunk := await reader.read(2**16):
+            first = first or time.perf_counter() - started
+            size += len(chunk)
+    finally:
+        writer.close()
+    return status, size, first, time.perf_counter() - started
+
+
+def run(owners, options, log):
+    """Downloads every active booking as CSV, NDJSON and iCalendar from a WSGI and an ASGI server."""
+    token, _ = Token.objects.get_or_create(user=owners[0])
+    rows = Booking.objects.filter(active=True).count() + ArchivedBooking.objects.filter(active=True).count()
+    url = reverse('api_export')
+    # Boots the worker without reading much.
+    warm_up = request_bytes(f"{url}?{urlencode({'start': '2000-01-01T00:00', 'end': '2000-01-02T00:00'})}", token.key)
+
+    results = {}
+    for deployment in DEPLOYMENTS:
+        port = free_port()
+        # A single worker, so it is the one that served every download.
+        server = serve(deployment, port, dict(options, workers=1), GUNICORN_CMD_ARGS=f'--timeout {WORKER_TIMEOUT}')
+        try:
+            asyncio.run(download(port, warm_up))
+            for name in sorted(export.FORMATS):
+                before = worker_peak_rss_mb(server)
+                status, size, first, elapsed = asyncio.run(
+                    download(port, request_bytes(f"{url}?output={name}", token.key))
+                )
+                key = f'export_{deployment}_{name}'
+                results[key] = {
+                    'rows': rows,
+                    'seconds': round(elapsed, 2),
+                    'first_byte_ms': round(first * 1000, 1) if first is not None else None,
+                    'rows_per_s': round(rows / elapsed) if elapsed else None,
+                    'mb': round(size / 2**20, 1),
+                    'peak_rss_growth_mb': round(worker_peak_rss_mb(server) - before, 1),
+                    'errors': int(status != 200),
+                }
+                log(f"{deployment} {name}: {rows} rows in {elapsed:.1f}s, first byte after "
+                    f"{results[key]['first_byte_ms']}ms, worker peak memory +{results[key]['peak_rss_growth_mb']}MB")
+        finally:
+            server.terminate()
+            server.wait()
+    return results
@@ -0,0 +1,131 @@
+"""
+Holds hundreds of idle live view streams open against a real ASGI server and
+measures the server's memory per connection and how long a booking change
+takes to reach every subscriber.
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from asgiref.sync import sync_to_async
+from django.db import connection, connections
+from django.test import Client
+from django.utils import timezone
+
+from booker_engine.days import day_bounds
+from booker_engine.models import Booking
+
+from .timing import summarize
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def rss_kb(pid):
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+
+
+class Subscriber:
+    def __init__(self, port, session):
+        self.port = port
+        self.session = session
+        self.snapshot = asyncio.Event()
+        self.deliveries = {}
+
+    async def run(self):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+        writer.write((
+            "GET /liveview/stream HTTP/1.1\r\n"
+            "Host: testserver\r\n"
+            f"Cookie: sessionid={self.session}\r\n"
+            "Accept: text/event-stream\r\n\r\n"
+        ).encode())
+        await writer.drain()
+        try:
+            while line := await reader.readline():
+                if line.startswith(b'event: snapshot'):
+                    self.snapshot.set()
+                elif line.startswith(b'data: {"id": '):
+                    self.deliveries[int(line[13:].split(b'}')[0])] = time.perf_counter()
+        finally:
+            writer.close()
+
+
+async def drive(pid, port, session, options, log):
+    subscribers = [Subscriber(port, session) for _ in range(options['subscribers'] + 1)]
+    tasks = []
+
+    # The first connection pays for imports and the feed's listener thread.
+    tasks.append(asyncio.create_task(subscribers[0].run()))
+    await subscribers[0].snapshot.wait()
+    baseline = rss_kb(pid)
+
+    for subscriber in subscribers[1:]:
+        tasks.append(asyncio.create_task(subscriber.run()))
+    await asyncio.gather(*(subscriber.snapshot.wait() for subscriber in subscribers))
+    await asyncio.sleep(1)
+    loaded = rss_kb(pid)
+    log(f"{options['subscribers']} idle subscribers: {loaded - baseline} kB")
+
+    today_start, today_end = day_bounds(timezone.localdate())
+    bookings = await sync_to_async(list)(
+        Booking.objects.filter(active=True, start__gte=today_start, start__lt=today_end)[:options['iterations']]
+    )
+    samples = []
+    for booking in bookings:
+        booking.active = False
+        started = time.perf_counter()
+        await sync_to_async(booking.save)()
+        while not all(booking.id in subscriber.deliveries for subscriber in subscribers):
+            await asyncio.sleep(0.001)
+        samples.append(max(subscriber.deliveries[booking.id] for subscriber in subscribers) - started)
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await sync_to_async(connections.close_all)()
+
+    result = summarize(samples) if samples else {}
+    result.update({
+        'subscribers': options['subscribers'],
+        'rss_baseline_kb': baseline,
+        'rss_kb': loaded,
+        'kb_per_connection': round((loaded - baseline) / options['subscribers'], 2),
+        # A change should reach every screen within a second.
+        'budget_ms': 1000,
+    })
+    return result
+
+
+def run(owners, options, log):
+    """Times the fan-out of a change to every subscriber, from save() to the last delivery."""
+    client = Client()
+    client.force_login(owners[0])
+    session = client.cookies['sessionid'].value
+
+    port = free_port()
+    env = {**os.environ, 'DB_NAME': connection.settings_dict['NAME']}
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'bookersite.asgi:application', '--port', str(port), '--log-level', 'warning'],
+        env=env,
+    )
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(('127.0.0.1', port)).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        return {'live_stream': asyncio.run(drive(server.pid, port, session, options, log))}
+    finally:
+        server.terminate()
+        server.wait()
@@ -0,0 +1,49 @@
+import random
+from datetime import datetime, timedelta
+
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from booker_engine.models import Booking, default_room
+
+from .timing import measure
+
+
+def run(owners, options, log):
+    """Times the day/week endpoints against random days inside the seeded history."""
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=owners[0])
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    today = timezone.localdate()
+    rng = random.Random(0)
+    days = [today - timedelta(days=rng.randrange(365 * options['years'])) for _ in range(options['iterations'])]
+
+    day_start = timezone.make_aware(datetime.combine(days[0], datetime.min.time()))
+    log(Booking.objects.filter(room=default_room(), start__gte=day_start, start__lt=day_start + timedelta(days=1),
+                               active=True).explain())
+
+    def get(name):
+        url = reverse(name)
+        return lambda i: client.get(url, {'date': days[i].isoformat()})
+
+    results = {
+        'api_get_day_bookings': measure(get('api_get_day_bookings'), options['iterations']),
+        'api_get_week_bookings': measure(get('api_get_week_bookings'), options['iterations']),
+        'api_my_bookings': measure(lambda i: client.get(reverse('api_my_bookings')), options['iterations']),
+    }
+
+    # The same, now cached, weeks as objects and as columns.
+    url = reverse('api_get_week_bookings')
+    for name, params in (('api_get_week_bookings_cached', {}), ('api_get_week_bookings_compact', {'compact': '1'})):
+        sizes = []
+        results[name] = measure(
+            lambda i: sizes.append(len(client.get(url, {'date': days[i].isoformat(), **params}).content)),
+            options['iterations'],
+        )
+        results[name]['bytes'] = sum(sizes) // len(sizes)
+    log(f"Week payload: {results['api_get_week_bookings_cached']['bytes']} -> "
+        f"{results['api_get_week_bookings_compact']['bytes']} bytes")
+    return results
@@ -0,0 +1,62 @@
+"""
+Compares a year of daily series stored as one row per occurrence (materialized)
+with the same series stored once and expanded on read (lazy).
+"""
+from datetime import date, datetime, timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from booker_engine import day_cache, recurrence
+from booker_engine.models import Booking, RecurringBooking, default_room
+
+from .timing import measure
+
+SERIES = 10
+RUNS = 20
+
+
+def year_days(year):
+    first = date(year, 1, 1)
+    return [first + timedelta(days=offset) for offset in range((date(year + 1, 1, 1) - first).days)]
+
+
+def seed(owner, materialized_year, lazy_year):
+    Booking.objects.filter(name__startswith='Recurring bench').delete()
+    RecurringBooking.objects.filter(name__startswith='Recurring bench').delete()
+    bookings, series = [], []
+    for hour in range(8, 8 + SERIES):
+        for year, rows in ((materialized_year, bookings), (lazy_year, series)):
+            start = timezone.make_aware(datetime(year, 1, 1, hour))
+            one = RecurringBooking(name=f'Recurring bench {hour}', start=start, end=start + timedelta(minutes=30),
+                                   frequency=RecurringBooking.DAILY, until=date(year, 12, 31), userid=owner)
+            _, one.last_start = recurrence.span(one)
+            if rows is series:
+                series.append(one)
+            else:
+                bookings.extend(Booking(name=one.name, start=start, end=end, userid=owner)
+                                for start, end in recurrence.occurrences(one))
+    Booking.objects.bulk_create(bookings, batch_size=5000)
+    RecurringBooking.objects.bulk_create(series)
+    cache.clear()
+    return len(bookings), len(series)
+
+
+def run(owners, options, log):
+    """Times uncached day/week/year reads over materialized and lazily expanded series."""
+    this_year = timezone.localdate().year
+    materialized_year, lazy_year = this_year + 2, this_year + 3
+    booking_rows, series_rows = seed(owners[0], materialized_year, lazy_year)
+    log(f"Recurring series: {booking_rows} materialized rows against {series_rows} series rows")
+
+    room_id = default_room()
+    results = {}
+    for name, year, rows in (('materialized', materialized_year, booking_rows), ('lazy', lazy_year, series_rows)):
+        days = year_days(year)
+        for window, length in (('day', 1), ('week', 9), ('year', len(days))):
+            stats = measure(lambda i: day_cache.fetch_rows(room_id, days[i * 7 % (len(days) - length + 1):][:length]), RUNS)
+            stats['stored_rows'] = rows
+            results[f'{window}_{name}'] = stats
+    # A year is read in one go, not on every request.
+    results['year_materialized']['budget_ms'] = results['year_lazy']['budget_ms'] = 1000
+    return results
@@ -0,0 +1,33 @@
+"""
+Renders week responses of the seeded history with DRF's JSONRenderer and with
+the orjson based FastJSONRenderer used by the API.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from booker_engine import day_cache
+from booker_engine.models import default_room
+from booker_engine.renderers import FastJSONRenderer
+
+from .timing import measure
+
+
+def run(owners, options, log):
+    """Times rendering alone, on payloads read once through the day cache."""
+    today = timezone.localdate()
+    weeks = []
+    for week in range(options['iterations']):
+        days = [today - timedelta(days=7 * week + offset) for offset in range(9)]
+        rows = day_cache.get_days(default_room(), days)
+        weeks.append({str(day): rows[day] for day in days if rows[day]})
+
+    results = {}
+    for name, renderer in (('drf_json', JSONRenderer()), ('fast_json', FastJSONRenderer())):
+        results[f'render_week_{name}'] = measure(lambda i: renderer.render(weeks[i]), options['iterations'])
+    if any(JSONRenderer().render(week) != FastJSONRenderer().render(week) for week in weeks):
+        raise RuntimeError("FastJSONRenderer output differs from JSONRenderer's")
+    log(f"Week rendering p50: {results['render_week_drf_json']['p50_ms']}ms -> "
+        f"{results['render_week_fast_json']['p50_ms']}ms")
+    return results
@@ -0,0 +1,48 @@
+"""
+Overhead of RequestMetricsMiddleware on the API reads, timed in-process with
+the middleware off and on.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from booker_engine import metrics
+from booker_engine.models import Booking
+
+from .timing import measure
+
+MIDDLEWARE = 'booker_engine.metrics.RequestMetricsMiddleware'
+
+
+def run(owners, options, log):
+    """Times a cached day read and a booking lookup with and without the metrics middleware."""
+    token, _ = Token.objects.get_or_create(user=owners[0])
+    today = timezone.localdate()
+    requests = {
+        'api_get_day_bookings': (reverse('api_get_day_bookings'), {'date': str(today - timedelta(days=1))}),
+        'api_get_booking': (reverse('api_get_booking'), {
+            'id': Booking.objects.filter(userid=owners[0], active=True).values_list('id', flat=True).first(),
+        }),
+    }
+    without = [name for name in settings.MIDDLEWARE if name != MIDDLEWARE]
+
+    results = {}
+    for setting, middleware in (('off', without), ('on', [MIDDLEWARE, *without])):
+        with override_settings(MIDDLEWARE=middleware):
+            # A new client loads the middleware of the current settings.
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+            for name, (url, params) in requests.items():
+                client.get(url, params)
+                results[f'{name}_metrics_{setting}'] = measure(lambda i: client.get(url, params),
+                                                               options['iterations'])
+    metrics.reset()
+    for name in requests:
+        log(f"{name} p50 with metrics: {results[f'{name}_metrics_off']['p50_ms']}ms -> "
+            f"{results[f'{name}_metrics_on']['p50_ms']}ms")
+    return results
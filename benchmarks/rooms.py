@@ -0,0 +1,57 @@
+"""
+Per-room reads against bookings spread over many rooms (--rooms). A room's
+day, week and free slot lookups should cost the same however many other
+rooms share the table.
+"""
+import random
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from booker_engine.days import day_bounds
+from booker_engine.models import Booking, Room
+
+from .timing import measure
+
+
+def run(owners, options, log):
+    """Times uncached day/week and free slot lookups in random rooms on random days."""
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=owners[0])
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    room_ids = list(Room.objects.values_list('id', flat=True))
+    log(f"{Booking.objects.count()} bookings in {len(room_ids)} rooms")
+    today = timezone.localdate()
+    rng = random.Random(0)
+    picks = [(rng.choice(room_ids), today - timedelta(days=rng.randrange(365 * options['years'])))
+             for _ in range(options['iterations'])]
+
+    start, end = day_bounds(picks[0][1])
+    log(Booking.objects.filter(room=picks[0][0], start__gte=start, start__lt=end, active=True).explain())
+
+    def get(name):
+        url = reverse(name)
+
+        def request(i):
+            # Cold reads, the day cache would otherwise answer repeated picks.
+            cache.clear()
+            room_id, day = picks[i]
+            client.get(url, {'room': room_id, 'date': day.isoformat()})
+        return request
+
+    def free_slots(i):
+        room_id, day = picks[i]
+        start = timezone.now() + timedelta(days=i % 7)
+        client.get(reverse('api_free_slots'), {'room': room_id, 'start': start.isoformat(),
+                                               'end': (start + timedelta(hours=8)).isoformat()})
+
+    return {
+        'api_get_day_bookings': measure(get('api_get_day_bookings'), options['iterations']),
+        'api_get_week_bookings': measure(get('api_get_week_bookings'), options['iterations']),
+        'api_free_slots': measure(free_slots, options['iterations']),
+    }
@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from booker_engine.models import Booking, Room, default_room
+
+
+def seed_users(count):
+    users = [User(username=f'bench{i}') for i in range(count)]
+    User.objects.bulk_create(users, ignore_conflicts=True)
+    return list(User.objects.filter(username__startswith='bench').order_by('id')[:count])
+
+
+def seed_rooms(count):
+    """The default room plus count - 1 more."""
+    rooms = [Room(name=f'Bench room {i}') for i in range(1, count)]
+    Room.objects.bulk_create(rooms, ignore_conflicts=True)
+    return [default_room()] + list(Room.objects.filter(name__startswith='Bench room').order_by('id')
+                                   .values_list('id', flat=True)[:count - 1])
+
+
+def seed_bookings(rows, users=10, years=5, inactive_ratio=0.9, rooms=1, batch_size=10000):
+    """
+    Spreads `rows` bookings evenly over the last `years` years, ending a week from now,
+    and round robin over `rooms` rooms. Active bookings never overlap each other
+    and `inactive_ratio` of the rows, spread evenly, are soft deleted.
+    """
+    owners = seed_users(users)
+    room_ids = seed_rooms(rooms)
+    span = timedelta(days=365 * years)
+    step = span / rows
+    length = min(step, timedelta(minutes=60))
+    origin = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=7) - span
+
+    batch = []
+    for i in range(rows):
+        start = origin + step * i
+        batch.append(Booking(
+            name=f'Bench booking {i}',
+            description='',
+            start=start,
+            end=start + length,
+            active=int((i + 1) * inactive_ratio) == int(i * inactive_ratio),
+            userid=owners[i % len(owners)],
+            room_id=room_ids[i % len(room_ids)],
+        ))
+        if len(batch) == batch_size:
+            Booking.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Booking.objects.bulk_create(batch)
+    return owners
@@ -0,0 +1,35 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from booker_engine import authentication
+from booker_engine.models import Booking
+
+from .timing import measure
+
+
+def run(owners, options, log):
+    """Times an authenticated single-booking lookup with and without the token cache."""
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=owners[0])
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+    url = reverse('api_get_booking')
+    params = {'id': Booking.objects.filter(userid=owners[0]).values_list('id', flat=True).first()}
+
+    def request(i):
+        client.get(url, params)
+
+    results = {}
+    for name, ttls in (('uncached', {'TOKEN_CACHE_TTL': 0, 'TOKEN_CACHE_LOCAL_TTL': 0}), ('cached', {})):
+        with override_settings(**ttls):
+            authentication.forget(token.key)
+            request(0)
+            with CaptureQueriesContext(connection) as queries:
+                stats = measure(request, options['iterations'])
+            stats['queries_per_request'] = len(queries) / options['iterations']
+        results[f'api_get_booking_{name}'] = stats
+    log(f"Token cache: {results['api_get_booking_uncached']['queries_per_request']} -> "
+        f"{results['api_get_booking_cached']['queries_per_request']} queries per request")
+    return results
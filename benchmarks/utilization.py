@@ -0,0 +1,45 @@
+"""
+Month and year utilization stats answered from the hourly rollups, against
+the same stats computed by scanning the bookings of the range.
+"""
+import random
+from datetime import date
+
+from django.db.models import Count, F, Q, Sum
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from booker_engine.days import midnight
+from booker_engine.models import Booking, default_room
+
+from .timing import measure
+
+
+def run(owners, options, log):
+    """Times api/utilization for random months and years, and the scan it replaces."""
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=owners[0])
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    today = timezone.localdate()
+    rng = random.Random(0)
+    years = [today.year - rng.randrange(options['years']) for _ in range(options['iterations'])]
+    months = [f'{year}-{rng.randint(1, 12):02d}' for year in years]
+    url = reverse('api_utilization')
+    room_id = default_room()
+
+    def scan(i):
+        # Booked time per day of one year, straight from the booking table.
+        start, end = midnight(date(years[i], 1, 1)), midnight(date(years[i] + 1, 1, 1))
+        list(Booking.objects.filter(room=room_id, start__gte=start, start__lt=end)
+             .values('start__date')
+             .annotate(booked=Sum(F('end') - F('start'), filter=Q(active=True)), bookings=Count('id')))
+
+    return {
+        'api_utilization_month': measure(lambda i: client.get(url, {'month': months[i]}), options['iterations']),
+        'api_utilization_year': measure(lambda i: client.get(url, {'year': years[i]}), options['iterations']),
+        # A scan, not a request latency, compare it with api_utilization_year.
+        'scan_year': dict(measure(scan, min(options['iterations'], 20)), budget_ms=60000),
+    }
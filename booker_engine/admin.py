@@ -1,7 +1,9 @@
 from django.contrib import admin
 
 
-from .models import Booking
+from .models import Booking, RecurringBooking, Room
 
 admin.site.register(Booking)
+admin.site.register(RecurringBooking)
+admin.site.register(Room)
 # Register your models here.
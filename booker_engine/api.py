@@ -2,12 +2,13 @@ from rest_framework.authtoken.views import obtain_auth_token
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth import login, logout, authenticate
+from django.http import HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from django.utils import timezone
 from datetime import datetime, timedelta
@@ -17,13 +18,74 @@ from booker_engine.models import Booking
 from collections import defaultdict
 from rest_framework import status
 from django.db.models.functions import Cast
+import time
 
 
-from .forms import BookingAPIForm
-from .models import Booking
+from . import availability, bulk, compact, day_cache, export, sync, utilization, versions
+from . import metrics as request_metrics
+from .authentication import CachedTokenAuthentication
+from .conditional import conditional
+from .forms import BookingAPIForm, RecurringBookingAPIForm
+from .models import Booking, RecurringBooking, Room
+from .query_inspector import query_budget
 
+
+def date_param(request):
+    try:
+        return datetime.strptime(request.GET.get('date', ''), "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def room_param(request):
+    try:
+        return Room.id_param(request.GET.get('room'))
+    except ValueError:
+        return None
+
+
+def day_versions(request):
+    day, room_id = date_param(request), room_param(request)
+    return day and room_id and list(versions.day_versions(room_id, [day]).values())
+
+
+def week_versions(request):
+    day, room_id = date_param(request), room_param(request)
+    days = day and [day + timedelta(days=offset) for offset in range(9)]
+    return days and room_id and list(versions.day_versions(room_id, days).values())
+
+
+def current_minute():
+    return int(time.time()) // 60 * 60 * 10**9
+
+
+def upcoming_versions(request):
+    # Bookings drop out of the list as they start, so the tag also rolls over every minute.
+    return [versions.user_version(request.user.id), current_minute()]
+
+
+def parse_datetime_param(value):
+    # Naive values are in the configured TIME_ZONE, like the create/update payloads.
+    parsed = datetime.fromisoformat(value)
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+def booking_form_data(data, user):
+    # Add the user ID to the request data
+    data = data.copy()
+    data['userid'] = user.id
+
+    # Convert start and end times to timezone-aware datetime objects if they exist
+    if 'start' in data:
+        data['start'] = datetime.fromisoformat(data['start']).replace(tzinfo=timezone.get_current_timezone())
+    if 'end' in data:
+        data['end'] = datetime.fromisoformat(data['end']).replace(tzinfo=timezone.get_current_timezone())
+    return data
+
+@query_budget(6)
 @csrf_exempt
 @api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
 def login_view(request):
     username = request.data.get('username')
     password = request.data.get('password')
@@ -36,21 +98,24 @@ def login_view(request):
 
 
 
+@query_budget(4)
 @csrf_exempt
 @api_view(['POST'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def logout_view(request):
-    request.user.auth_token.delete()
+    request.auth.delete()
     logout(request)
     return Response({'message': 'Logged out successfully'})
 
 
 
 
+@query_budget(4)
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
+@conditional(day_versions)
 def get_day(request):
     date_str = request.query_params.get('date')
     if date_str:
@@ -60,19 +125,22 @@ def get_day(request):
             return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
     else:
         return Response({"error": "No Date input"}, status=400)
-    start_of_day = timezone.make_aware(datetime.combine(fetched_date, datetime.min.time()))
-    end_of_day = timezone.make_aware(datetime.combine(fetched_date + timedelta(days=1), datetime.min.time()) - timedelta(seconds=1))
-    bookings = Booking.objects.filter(start__gt=start_of_day, start__lt=end_of_day, active=True).select_related('userid').order_by("start")
-    bookings_list = list(bookings.values('id','name', 'description', 'start', 'end', username=F('userid__username')))
-    
-    return Response(bookings_list)
+    room_id = room_param(request)
+    if not room_id:
+        return Response({"error": "Invalid room"}, status=400)
+    rows = day_cache.get_day(room_id, fetched_date.date())
+    if compact.requested(request):
+        return Response(compact.encode([(fetched_date.date(), rows)]))
+    return Response(rows)
 
 
 
 
+@query_budget(4)
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
+@conditional(week_versions)
 def get_week(request):
     date_str = request.query_params.get('date')
     if date_str:
@@ -82,46 +150,125 @@ def get_week(request):
             return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
     else:
         return Response({"error": "No Date input"}, status=400)
-    start_of_day = timezone.make_aware(datetime.combine(fetched_date, datetime.min.time()))
-    end_of_day = timezone.make_aware(datetime.combine(fetched_date + timedelta(days=1), datetime.min.time()) - timedelta(seconds=1))
-    weekBookings = list(Booking.objects.filter(active=True, start__gt=start_of_day, start__lt=(end_of_day + timedelta(days=8)))
-               .select_related('userid')
-               .order_by("start")
-               .values('id','name', 'description', 'start', 'end', username=F('userid__username')))
-
-    bookingByDay = dict()
-
-    for booking in weekBookings:
-        bookingDay = str(booking['start'].date())
-        if bookingDay in bookingByDay:
-            bookingByDay[bookingDay].append(booking)
-        else:
-            bookingByDay[bookingDay] = [booking]
+    room_id = room_param(request)
+    if not room_id:
+        return Response({"error": "Invalid room"}, status=400)
+    days = [fetched_date.date() + timedelta(days=offset) for offset in range(9)]
+    weekBookings = day_cache.get_days(room_id, days)
+    if compact.requested(request):
+        return Response(compact.encode((day, weekBookings[day]) for day in days))
+
+    bookingByDay = {str(day): weekBookings[day] for day in days if weekBookings[day]}
 
     return Response(bookingByDay)
 
+@query_budget(2)
+@api_view(['GET'])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def rooms(request):
+    return Response(list(Room.objects.order_by('name').values('id', 'name', 'description')))
+
+@query_budget(1)
+@api_view(['GET'])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    # Counters are per worker process.
+    return Response(day_cache.stats())
+
+@query_budget(1)
+@api_view(['GET'])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAdminUser])
+def metrics(request):
+    # Prometheus text format, per worker process like cache_stats.
+    return HttpResponse(request_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def utilization_range(params):
+    """The local days [first, last) of a month=YYYY-MM or year=YYYY parameter. Raises ValueError."""
+    if params.get('month'):
+        first = datetime.strptime(params['month'], "%Y-%m").date()
+        return first, (first + timedelta(days=31)).replace(day=1)
+    first = datetime.strptime(params.get('year', ''), "%Y").date()
+    return first, first.replace(year=first.year + 1)
+
+@query_budget(4)
+@api_view(['GET'])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def utilization_stats(request):
+    try:
+        first_day, last_day = utilization_range(request.query_params)
+    except ValueError:
+        return Response({"error": "Pass month=YYYY-MM or year=YYYY"}, status=status.HTTP_400_BAD_REQUEST)
+    room_id = room_param(request)
+    if not room_id:
+        return Response({"error": "Invalid room"}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(utilization.stats(room_id, first_day, last_day))
+
+# Two more for the bookings and series of a window before the index's horizon.
+@query_budget(5)
+@api_view(['GET'])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def free_slots(request):
+    try:
+        window_start = parse_datetime_param(request.query_params['start'])
+        window_end = parse_datetime_param(request.query_params['end'])
+    except KeyError:
+        return Response({"error": "start and end are required"}, status=status.HTTP_400_BAD_REQUEST)
+    except ValueError:
+        return Response({"error": "Invalid date format"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        duration = int(request.query_params.get('duration', 15))
+        limit = min(int(request.query_params.get('limit', 10)), 100)
+    except ValueError:
+        return Response({"error": "duration and limit must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+    if window_end <= window_start or duration < 1 or limit < 1:
+        return Response({"error": "Invalid range"}, status=status.HTTP_400_BAD_REQUEST)
+    room_id = room_param(request)
+    if not room_id:
+        return Response({"error": "Invalid room"}, status=status.HTTP_400_BAD_REQUEST)
+
+    slots = availability.free_slots(room_id, window_start, window_end, timedelta(minutes=duration), limit)
+    return Response([{'start': timezone.localtime(start), 'end': timezone.localtime(end)} for start, end in slots])
+
+# The rows are read while the response streams, after the budget is checked.
+@query_budget(2)
+@api_view(['GET'])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def export_bookings(request):
+    # Not `format`, DRF picks the renderer by that one.
+    output = request.query_params.get('output', 'csv')
+    if output not in export.FORMATS:
+        return Response({"error": f"output must be one of {', '.join(export.FORMATS)}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        range_start = request.query_params.get('start') and parse_datetime_param(request.query_params['start'])
+        range_end = request.query_params.get('end') and parse_datetime_param(request.query_params['end'])
+        room_id = request.query_params.get('room') and int(request.query_params['room'])
+    except ValueError:
+        return Response({"error": "Invalid start, end or room"}, status=status.HTTP_400_BAD_REQUEST)
+
+    content_type, extension, write = export.FORMATS[output]
+    rows = export.bookings(range_start, range_end, room_id, cancelled=request.query_params.get('cancelled') == '1')
+    chunks = write(rows)
+    response = StreamingHttpResponse(export.aiterate(chunks) if settings.ASYNC_API else chunks,
+                                     content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="bookings.{extension}"'
+    return response
+
+@query_budget(8)
 @api_view(['POST'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def create_booking(request):
-    # Extract the token from the request
-    try:
-        token = request.auth
-        # Reverse search the token to find the user
-        user = Token.objects.get(key=token).user
-    except Token.DoesNotExist:
-        return Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
-
-    # Add the user ID to the request data
-    data = request.data.copy()
-    data['userid'] = user.id
+    user = request.user
 
-    # Convert start and end times to timezone-aware datetime objects if they exist
     try:
-        if 'start' in data:
-            data['start'] = datetime.fromisoformat(data['start']).replace(tzinfo=timezone.get_current_timezone())
-        if 'end' in data:
-            data['end'] = datetime.fromisoformat(data['end']).replace(tzinfo=timezone.get_current_timezone())
+        data = booking_form_data(request.data, user)
     except (ValueError, TypeError) as e:
         return Response({"error": "Invalid date format"}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -129,54 +276,189 @@ def create_booking(request):
     # Validate the form
     form = BookingAPIForm(data=data)
 
-    if form.is_valid():
-        # Save the booking with the correct user
-        booking = form.save(commit=False)
-        booking.userid = user  # Ensure the user is correctly set
-        booking.save()
+    form.instance.userid = user  # Ensure the user is correctly set
+    if form.is_valid() and form.save():
         return Response({"message": "Booking created successfully"}, status=status.HTTP_201_CREATED)
     else:
         # Return validation errors
         return Response(form.errors, status=status.HTTP_400_BAD_REQUEST)
     
 
+# The rooms, the locks, the bookings and series in the way, the insert batches
+# and the notification, however many bookings there are.
+def named_rooms(items):
+    """{id: room} of the rooms the items name, read with one query for the whole batch."""
+    ids = set()
+    for item in items:
+        try:
+            ids.add(int(item['room']))
+        except (KeyError, TypeError, ValueError):
+            pass
+    return Room.objects.in_bulk(ids)
+
+
+@query_budget(12)
+@api_view(['POST'])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def bulk_create_bookings(request):
+    items = request.data.get('bookings') if isinstance(request.data, dict) else None
+    if not isinstance(items, list) or not items:
+        return Response({"error": "Expected a non-empty list of bookings"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > bulk.MAX_BOOKINGS:
+        return Response({"error": f"At most {bulk.MAX_BOOKINGS} bookings per request"}, status=status.HTTP_400_BAD_REQUEST)
+
+    rooms = named_rooms(items)
+    results = [None] * len(items)
+    positions, bookings = [], []
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[position] = {"status": "error", "errors": {"__all__": ["Expected a booking object"]}}
+            continue
+        try:
+            data = booking_form_data(item, request.user)
+        except (ValueError, TypeError):
+            results[position] = {"status": "error", "errors": {"__all__": ["Invalid date format"]}}
+            continue
+        form = BookingAPIForm(data=data, rooms=rooms)
+        form.instance.userid = request.user
+        if form.is_valid():
+            positions.append(position)
+            bookings.append(form.save(commit=False))
+        else:
+            results[position] = {"status": "error", "errors": form.errors}
+
+    errors = bulk.create_bookings(bookings)
+    for index, (position, booking) in enumerate(zip(positions, bookings)):
+        if index in errors:
+            results[position] = {"status": "error", "errors": {"__all__": [errors[index]]}}
+        else:
+            results[position] = {"status": "created", "id": booking.id}
+
+    created = sum(result["status"] == "created" for result in results)
+    if created == len(results):
+        response_status = status.HTTP_201_CREATED
+    elif created:
+        response_status = status.HTTP_207_MULTI_STATUS
+    else:
+        response_status = status.HTTP_400_BAD_REQUEST
+    return Response({"created": created, "results": results}, status=response_status)
+
+
+def is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def batch_status(done, total, none_status):
+    if done == total:
+        return status.HTTP_200_OK
+    return status.HTTP_207_MULTI_STATUS if done else none_status
+
+
+# The bookings and their rooms, the locks, two queries per overlap pass (usually
+# one or two), the updates and the notification, however many bookings there are.
+@query_budget(16)
+@api_view(['POST'])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def bulk_update_bookings(request):
+    items = request.data.get('bookings') if isinstance(request.data, dict) else None
+    if not isinstance(items, list) or not items:
+        return Response({"error": "Expected a non-empty list of bookings"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > bulk.MAX_BOOKINGS:
+        return Response({"error": f"At most {bulk.MAX_BOOKINGS} bookings per request"}, status=status.HTTP_400_BAD_REQUEST)
+
+    ids = [item.get('id') if isinstance(item, dict) else None for item in items]
+    loaded = Booking.objects.filter(id__in=[booking_id for booking_id in ids if is_id(booking_id)],
+                                    userid=request.user, active=True).in_bulk()
+
+    rooms = named_rooms(items)
+    results = [None] * len(items)
+    positions, bookings, fields = [], [], set()
+    for position, (item, booking_id) in enumerate(zip(items, ids)):
+        booking = loaded.pop(booking_id, None) if is_id(booking_id) else None
+        if booking is None:
+            # Also a second edit of the same booking in the request.
+            results[position] = {"id": booking_id, "status": "not_found"}
+            continue
+        try:
+            data = booking_form_data(item, request.user)
+        except (ValueError, TypeError):
+            results[position] = {"id": booking_id, "status": "error", "errors": {"__all__": ["Invalid date format"]}}
+            continue
+        before = {field: getattr(booking, field) for field in bulk.UPDATE_FIELDS}
+        form = BookingAPIForm(data=data, instance=booking, rooms=rooms)
+        if not form.is_valid():
+            results[position] = {"id": booking_id, "status": "error", "errors": form.errors}
+            continue
+        changed = {field for field in bulk.UPDATE_FIELDS if getattr(booking, field) != before[field]}
+        results[position] = {"id": booking_id, "status": "updated"}
+        if changed:
+            positions.append(position)
+            bookings.append(booking)
+            fields |= changed
+
+    errors = bulk.update_bookings(bookings, sorted(field.removesuffix('_id') for field in fields))
+    for index, position in enumerate(positions):
+        if index in errors:
+            results[position] = {"id": ids[position], "status": "error", "errors": {"__all__": [errors[index]]}}
+
+    updated = sum(result["status"] == "updated" for result in results)
+    return Response({"updated": updated, "results": results},
+                    status=batch_status(updated, len(results), status.HTTP_400_BAD_REQUEST))
+
+
+@query_budget(4)
+@api_view(['POST'])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def bulk_delete_bookings(request):
+    ids = request.data.get('ids') if isinstance(request.data, dict) else None
+    if not isinstance(ids, list) or not ids or not all(is_id(booking_id) for booking_id in ids):
+        return Response({"error": "Expected a non-empty list of booking ids"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(ids) > bulk.MAX_BOOKINGS:
+        return Response({"error": f"At most {bulk.MAX_BOOKINGS} bookings per request"}, status=status.HTTP_400_BAD_REQUEST)
+
+    deleted = bulk.delete_bookings(request.user.id, ids)
+    results = [{"id": booking_id, "status": "deleted" if booking_id in deleted else "not_found"} for booking_id in ids]
+    return Response({"deleted": len(deleted), "results": results},
+                    status=batch_status(len(deleted), len(set(ids)), status.HTTP_404_NOT_FOUND))
+
+
+@query_budget(4)
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
+@conditional(upcoming_versions)
 def my_bookings(request):
-    # Extract the token from the request
-    try:
-        token = request.auth
-        # Reverse search the token to find the user
-        user = Token.objects.get(key=token).user_id
-    except Token.DoesNotExist:
-        return Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
+    user = request.user.id
+    if sync.requested(request.query_params):
+        try:
+            return Response(sync.respond(user, request.query_params))
+        except ValueError:
+            return Response({"error": "Invalid cursor, since or limit"}, status=status.HTTP_400_BAD_REQUEST)
 
     now = timezone.now()
 
     bookings = list(Booking.objects.filter(start__gt=now, userid=user, active=True)
             .select_related('userid')
             .order_by("start")
-            .values('id','name', 'description', 'start', 'end', username=F('userid__username')))
+            .values('id','name', 'description', 'start', 'end', 'room', username=F('userid__username')))
 
     return Response(bookings)
 
 
+@query_budget(2)
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def get_booking(request):
     booking_id = request.query_params.get('id')
 
-    try:
-        token = request.auth
-        # Reverse search the token to find the user
-        user = Token.objects.get(key=token.key).user
-    except Token.DoesNotExist:
-        return Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
+    user = request.user
 
     booking = Booking.objects.filter(id=booking_id, userid=user, active=True).select_related('userid').values(
-        'id', 'name', 'description', 'start', 'end', username=F('userid__username')
+        'id', 'name', 'description', 'start', 'end', 'room', username=F('userid__username')
     ).first()
 
     if not booking:
@@ -185,8 +467,9 @@ def get_booking(request):
     
     return Response(booking, status=status.HTTP_200_OK)
 
+@query_budget(4)
 @api_view(['DELETE'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def delete_booking(request):
     booking_id = request.query_params.get('id')
@@ -194,10 +477,7 @@ def delete_booking(request):
     if not booking_id:
         return Response({"error": "Booking ID is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-    try:
-        user = request.user  # Get the user directly from the request
-    except Token.DoesNotExist:
-        return Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
+    user = request.user
 
     try:
         # Find the booking belonging to the user
@@ -211,21 +491,16 @@ def delete_booking(request):
 
     return Response(status=status.HTTP_200_OK)
 
+@query_budget(8)
 @api_view(['PUT'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def update_booking(request):
     booking_id = request.query_params.get('id')
     if not booking_id:
         return Response({"error": "Booking ID is required"}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Extract the token from the request
-    try:
-        token = request.auth
-        # Reverse search the token to find the user
-        user = Token.objects.get(key=token).user
-    except Token.DoesNotExist:
-        return Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
+    user = request.user
 
     # Check if the booking exists and belongs to the user
     try:
@@ -249,10 +524,62 @@ def update_booking(request):
     # Validate the form with existing instance
     form = BookingAPIForm(data=data, instance=booking)
 
-    if form.is_valid():
-        # Save the updated booking
-        updated_booking = form.save()
+    if form.is_valid() and form.save():
         return Response({"message": "Booking updated successfully"}, status=status.HTTP_200_OK)
     else:
         # Return validation errors
-        return Response(form.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(form.errors, status=status.HTTP_400_BAD_REQUEST)
+
+@query_budget(7)
+@api_view(['POST'])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def create_recurring_booking(request):
+    try:
+        data = booking_form_data(request.data, request.user)
+    except (ValueError, TypeError):
+        return Response({"error": "Invalid date format"}, status=status.HTTP_400_BAD_REQUEST)
+    if isinstance(data.get('exceptions'), list):
+        data['exceptions'] = ','.join(data['exceptions'])
+
+    form = RecurringBookingAPIForm(data=data)
+    form.instance.userid = request.user
+    series = form.is_valid() and form.save()
+    if series:
+        return Response({"message": "Recurring booking created successfully", "id": series.id},
+                        status=status.HTTP_201_CREATED)
+    return Response(form.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@query_budget(4)
+@api_view(['DELETE'])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def delete_recurring_booking(request):
+    try:
+        series = RecurringBooking.objects.get(id=request.query_params.get('id'), userid=request.user, active=True)
+    except (RecurringBooking.DoesNotExist, ValueError):
+        return Response({"error": "Recurring booking not found"}, status=status.HTTP_404_NOT_FOUND)
+    series.active = False
+    series.save()
+    return Response(status=status.HTTP_200_OK)
+
+
+@query_budget(4)
+@api_view(['POST'])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def cancel_occurrence(request):
+    # Takes a single occurrence, by its local date, out of a series.
+    try:
+        series = RecurringBooking.objects.get(id=request.data.get('id'), userid=request.user, active=True)
+    except (RecurringBooking.DoesNotExist, ValueError, TypeError):
+        return Response({"error": "Recurring booking not found"}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        day = datetime.strptime(request.data.get('date', ''), "%Y-%m-%d").date()
+    except (ValueError, TypeError):
+        return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+    if day not in series.exceptions:
+        series.exceptions.append(day)
+        series.save()
+    return Response(status=status.HTTP_200_OK)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BookerEngineConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'booker_engine'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,108 @@
+"""
+Archive of past and soft deleted bookings.
+
+Years of past meetings and soft deleted rows would otherwise stay in
+booker_engine_booking, and every index and range scan of the current bookings
+would carry them. The archive_bookings command moves them in batches to
+booker_engine_archivedbooking, which is partitioned by month of start:
+bookings that ended more than BOOKING_ARCHIVE_AFTER_DAYS ago, and soft deleted
+ones not touched for BOOKING_ARCHIVE_INACTIVE_DAYS.
+
+The booking table itself is not partitioned. Postgres does not allow exclusion
+constraints on partitioned tables before version 17, and booking_no_overlap is
+what keeps concurrent writers from double booking a room. Only the current
+bookings need it.
+
+Archived bookings are history. Day and range reads reaching before the cutoff
+read both tables, everything else, lookups by id and edits included, only
+sees current bookings. A sync client (see sync.py) that has not synced for
+BOOKING_ARCHIVE_INACTIVE_DAYS may miss deletions and should start over.
+"""
+import time
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ArchivedBooking, Booking
+
+COLUMNS = '"id", "name", "description", "start", "end", "active", "modified", "change_seq", "room_id", "userid_id"'
+
+
+def cutoff():
+    """Archived active bookings all started before this."""
+    return timezone.now() - timedelta(days=settings.BOOKING_ARCHIVE_AFTER_DAYS)
+
+
+def including_archive(queryset_for, window_start):
+    """
+    queryset_for(Booking), united with queryset_for(ArchivedBooking) when the
+    window starts before the cutoff or is open ended. Order the result after.
+    """
+    bookings = queryset_for(Booking)
+    if window_start is None or window_start < cutoff():
+        bookings = bookings.union(queryset_for(ArchivedBooking), all=True)
+    return bookings
+
+
+def moving_archive(cursor):
+    """Keeps the booking_rollup trigger from counting the moves of this transaction as writes."""
+    cursor.execute("SET LOCAL booker_engine.archiving = on")
+
+
+def partition_name(month):
+    return f'booker_engine_archivedbooking_{month:%Y_%m}'
+
+
+def ensure_partitions(starts):
+    """Creates the monthly partitions, by UTC month, that bookings with these start times go to."""
+    months = sorted({start.astimezone(dt_timezone.utc).date().replace(day=1) for start in starts})
+    with connection.cursor() as cursor:
+        for month in months:
+            following = (month + timedelta(days=32)).replace(day=1)
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS "{partition_name(month)}" '
+                f'PARTITION OF "booker_engine_archivedbooking" FOR VALUES FROM (%s) TO (%s)',
+                [f'{month} 00:00+00', f'{following} 00:00+00'],
+            )
+
+
+def archive_batch(after_id, batch_size, ended_before, inactive_before):
+    """
+    Moves up to batch_size archivable bookings with ids above after_id in one
+    transaction. Returns the last id looked at, None when there are no more, and
+    how many were moved.
+    """
+    with transaction.atomic():
+        rows = list(Booking.objects.filter(id__gt=after_id)
+                    .filter(Q(end__lt=ended_before) | Q(active=False, modified__lt=inactive_before))
+                    .order_by('id').select_for_update(skip_locked=True).values_list('id', 'start')[:batch_size])
+        if not rows:
+            return None, 0
+        ensure_partitions(start for _, start in rows)
+        with connection.cursor() as cursor:
+            moving_archive(cursor)
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM "booker_engine_booking" WHERE "id" = ANY(%s) RETURNING {COLUMNS}) '
+                f'INSERT INTO "booker_engine_archivedbooking" ({COLUMNS}) SELECT {COLUMNS} FROM moved',
+                [[booking_id for booking_id, _ in rows]],
+            )
+    return rows[-1][0], len(rows)
+
+
+def archive(batch_size=10000, inactive_before=None, pause=0, log=None):
+    """Moves every archivable booking, a batch per transaction. Returns how many were moved."""
+    # Reads rely on active bookings being archived only once they ended before the cutoff.
+    ended_before = cutoff()
+    inactive_before = inactive_before or timezone.now() - timedelta(days=settings.BOOKING_ARCHIVE_INACTIVE_DAYS)
+    after_id, total = 0, 0
+    while True:
+        after_id, moved = archive_batch(after_id, batch_size, ended_before, inactive_before)
+        if after_id is None:
+            return total
+        total += moved
+        if log:
+            log(f"Archived {total} bookings, up to id {after_id}")
+        time.sleep(pause)
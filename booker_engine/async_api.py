@@ -0,0 +1,129 @@
+"""
+Async versions of the read-only booking API, routed in place of the DRF views
+in api.py when the app runs under ASGI (see bookersite/asgi.py).
+
+An ASGI worker keeps serving other requests while one of them waits on a slow
+client or on the database, where a sync worker is tied up for the whole
+request. The views answer with the same bytes, status codes and validators
+as their DRF counterparts. Django's cache backends have no native async
+implementation yet, so the cached day reads run in a single thread hop
+instead of one per cache call.
+"""
+from datetime import timedelta
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db.models import F
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
+
+from . import api, compact, day_cache, sync
+from .authentication import CachedTokenAuthentication
+from .conditional import conditional
+from .models import Booking
+from .query_inspector import query_budget
+from .renderers import FastJSONRenderer
+
+renderer = FastJSONRenderer()
+authentication = CachedTokenAuthentication()
+
+
+def render(data, status=200):
+    return HttpResponse(renderer.render(data), status=status, content_type='application/json')
+
+
+def unauthorized(detail):
+    response = render({'detail': detail}, status=401)
+    response['WWW-Authenticate'] = authentication.authenticate_header(None)
+    return response
+
+
+def token_get(view):
+    """Token authentication and GET only, as @api_view(['GET']) with IsAuthenticated does."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            credentials = await sync_to_async(authentication.authenticate)(request)
+        except AuthenticationFailed as exc:
+            return unauthorized(exc.detail)
+        if credentials is None:
+            return unauthorized(NotAuthenticated.default_detail)
+        request.user, request.auth = credentials
+
+        if request.method not in ('GET', 'HEAD'):
+            return render({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def cached_days(request, count):
+    """[(day, rows)] of the room for `count` days from the date parameter, or None for an invalid room."""
+    room_id = api.room_param(request)
+    if not room_id:
+        return None
+    first = api.date_param(request)
+    days = [first + timedelta(days=offset) for offset in range(count)]
+    rows = day_cache.get_days(room_id, days)
+    return [(day, rows[day]) for day in days]
+
+
+async def days_response(request, count):
+    if not request.GET.get('date'):
+        return None, render({"error": "No Date input"}, status=400)
+    if api.date_param(request) is None:
+        return None, render({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
+    days = await sync_to_async(cached_days)(request, count)
+    if days is None:
+        return None, render({"error": "Invalid room"}, status=400)
+    return days, None
+
+
+@query_budget(4)
+@token_get
+@conditional(api.day_versions)
+async def get_day(request):
+    days, error = await days_response(request, 1)
+    if error:
+        return error
+    if compact.requested(request):
+        return render(compact.encode(days))
+    return render(days[0][1])
+
+
+@query_budget(4)
+@token_get
+@conditional(api.week_versions)
+async def get_week(request):
+    days, error = await days_response(request, 9)
+    if error:
+        return error
+    if compact.requested(request):
+        return render(compact.encode(days))
+    return render({str(day): bookings for day, bookings in days if bookings})
+
+
+@query_budget(4)
+@token_get
+@conditional(api.upcoming_versions)
+async def my_bookings(request):
+    if sync.requested(request.GET):
+        try:
+            return render(await sync_to_async(sync.respond)(request.user.id, request.GET))
+        except ValueError:
+            return render({"error": "Invalid cursor, since or limit"}, status=400)
+    bookings = (Booking.objects.filter(start__gt=timezone.now(), userid=request.user.id, active=True)
+                .order_by("start")
+                .values('id', 'name', 'description', 'start', 'end', 'room', username=F('userid__username')))
+    return render([booking async for booking in bookings])
+
+
+@query_budget(2)
+@token_get
+async def get_booking(request):
+    booking = await Booking.objects.filter(id=request.GET.get('id'), userid=request.user, active=True).values(
+        'id', 'name', 'description', 'start', 'end', 'room', username=F('userid__username')
+    ).afirst()
+    if not booking:
+        return render({"error": "Booking not found"}, status=404)
+    return render(booking)
@@ -0,0 +1,62 @@
+"""
+Token authentication that remembers resolved tokens.
+
+A token is looked up in a small per-process map first, then in the shared
+cache, and only then in the database. Deleting a token (logout) or changing
+its user removes it from the shared cache and this process's map right away.
+Other processes can keep using their own copy for up to
+TOKEN_CACHE_LOCAL_TTL seconds, so keep that short. Setting a TTL to 0
+disables that layer.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+LOCAL_MAX_ENTRIES = 10000
+
+local_tokens = {}
+local_lock = threading.Lock()
+
+
+def cache_key(key):
+    return f'auth-token:{key}'
+
+
+def local_ttl():
+    return getattr(settings, 'TOKEN_CACHE_LOCAL_TTL', 10)
+
+
+def shared_ttl():
+    return getattr(settings, 'TOKEN_CACHE_TTL', 300)
+
+
+def forget(key):
+    with local_lock:
+        local_tokens.pop(key, None)
+    cache.delete(cache_key(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        now = time.monotonic()
+        with local_lock:
+            entry = local_tokens.get(key)
+        if entry and entry[1] > now:
+            return entry[0].user, entry[0]
+
+        token = cache.get(cache_key(key)) if shared_ttl() else None
+        if token is None:
+            # Raises AuthenticationFailed for unknown tokens and inactive users.
+            user, token = super().authenticate_credentials(key)
+            if shared_ttl():
+                cache.set(cache_key(key), token, shared_ttl())
+
+        if local_ttl():
+            with local_lock:
+                if len(local_tokens) >= LOCAL_MAX_ENTRIES:
+                    local_tokens.clear()
+                local_tokens[key] = (token, now + local_ttl())
+        return token.user, token
@@ -0,0 +1,179 @@
+"""
+In-process index of active bookings for answering free slot queries.
+
+Active bookings never overlap (see the booking_no_overlap constraint), so
+sorting them by start also sorts them by end. Both are kept as parallel sorted
+lists and a query bisects to the first booking that ends inside the window,
+then walks forward over the gaps: O(log n + k) for k visited bookings. The
+occurrences of recurring bookings are expanded into the same lists.
+
+Every room has an index of its own. They are loaded lazily from the database
+on first use in every worker, kept in sync by the Booking signals in
+signals.py, and reloaded every AVAILABILITY_REFRESH_SECONDS to pick up writes
+made by other workers. They hold what ends after HISTORY ago, a window reaching
+back before that is answered from an index read for just that window.
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import archive, recurrence
+from .models import Booking, RecurringBooking
+
+# Free slots are only asked for around today, so ancient history is not loaded.
+HISTORY = timedelta(days=1)
+
+
+class AvailabilityIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.starts = []
+        self.ends = []
+        self.ids = []
+        self.spans = {}
+
+    def load(self, rows):
+        rows = sorted(rows, key=lambda row: row[1])
+        with self.lock:
+            self.ids = [row[0] for row in rows]
+            self.starts = [row[1] for row in rows]
+            self.ends = [row[2] for row in rows]
+            self.spans = {row[0]: (row[1], row[2]) for row in rows}
+
+    def add(self, booking_id, start, end):
+        with self.lock:
+            self._remove(booking_id)
+            position = bisect_right(self.starts, start)
+            self.starts.insert(position, start)
+            self.ends.insert(position, end)
+            self.ids.insert(position, booking_id)
+            self.spans[booking_id] = (start, end)
+
+    def discard(self, booking_id):
+        with self.lock:
+            self._remove(booking_id)
+
+    def discard_series(self, series_id):
+        with self.lock:
+            for key in [key for key in self.spans if isinstance(key, tuple) and key[1] == series_id]:
+                self._remove(key)
+
+    def _remove(self, booking_id):
+        span = self.spans.pop(booking_id, None)
+        if span is None:
+            return
+        position = bisect_left(self.starts, span[0])
+        while self.ids[position] != booking_id:
+            position += 1
+        del self.starts[position], self.ends[position], self.ids[position]
+
+    def free_slots(self, window_start, window_end, min_duration, limit):
+        """
+        Returns up to `limit` (start, end) gaps of at least `min_duration` between
+        window_start and window_end, in order.
+        """
+        slots = []
+        with self.lock:
+            position = bisect_right(self.ends, window_start)
+            cursor = window_start
+            while len(slots) < limit and cursor < window_end:
+                if position < len(self.starts) and self.starts[position] < window_end:
+                    gap_end, next_cursor = self.starts[position], self.ends[position]
+                else:
+                    gap_end, next_cursor = window_end, window_end
+                if gap_end - cursor >= min_duration:
+                    slots.append((cursor, gap_end))
+                cursor = max(cursor, next_cursor)
+                position += 1
+        return slots
+
+
+# One index per room, all of them (re)loaded together.
+indexes = defaultdict(AvailabilityIndex)
+loaded_at = None
+# The indexes hold every booking and occurrence ending after this.
+horizon = None
+
+
+def series_rows(series):
+    # Occurrences are keyed apart from booking ids by their series and start.
+    return [(('series', series.id, start), start, end)
+            for start, end in recurrence.occurrences(series, timezone.now() - HISTORY)]
+
+
+def rebuild():
+    """Reloads the indexes from the database, e.g. when a worker boots."""
+    global indexes, loaded_at, horizon
+    since = timezone.now() - HISTORY
+    rooms = defaultdict(list)
+    for booking_id, room_id, start, end in (Booking.objects.filter(active=True, end__gt=since)
+                                            .values_list('id', 'room', 'start', 'end')):
+        rooms[room_id].append((booking_id, start, end))
+    for series in RecurringBooking.objects.filter(active=True, last_start__gt=since - recurrence.MAX_DURATION):
+        rooms[series.room_id].extend(series_rows(series))
+    loaded = defaultdict(AvailabilityIndex)
+    for room_id, rows in rooms.items():
+        loaded[room_id].load(rows)
+    indexes, loaded_at, horizon = loaded, time.monotonic(), since
+
+
+def get_index(room_id):
+    max_age = getattr(settings, 'AVAILABILITY_REFRESH_SECONDS', 60)
+    if loaded_at is None or time.monotonic() - loaded_at > max_age:
+        rebuild()
+    return indexes[room_id]
+
+
+def window_index(room_id, window_start, window_end):
+    """An index of the room's bookings and occurrences overlapping the window, read from the database."""
+    def in_window(model):
+        # Bookings last at most MAX_DURATION, the bound on start keeps the scan on the index.
+        return (model.objects.filter(room=room_id, active=True, start__lt=window_end, end__gt=window_start,
+                                     start__gt=window_start - recurrence.MAX_DURATION)
+                .values_list('id', 'start', 'end'))
+
+    rows = list(archive.including_archive(in_window, window_start - recurrence.MAX_DURATION))
+    rows += [(('series', None, start), start, end)
+             for start, end in recurrence.occurrences_between(room_id, window_start, window_end)]
+    index = AvailabilityIndex()
+    index.load(rows)
+    return index
+
+
+def free_slots(room_id, window_start, window_end, min_duration, limit):
+    """AvailabilityIndex.free_slots() of the room, whether or not the window reaches back before the horizon."""
+    index = get_index(room_id)
+    if window_start < horizon:
+        index = window_index(room_id, window_start, window_end)
+    return index.free_slots(window_start, window_end, min_duration, limit)
+
+
+def booking_saved(booking):
+    if loaded_at is None:
+        return
+    moved_from = getattr(booking, 'loaded_room', None)
+    if moved_from is not None and moved_from != booking.room_id:
+        indexes[moved_from].discard(booking.id)
+    if booking.active:
+        indexes[booking.room_id].add(booking.id, booking.start, booking.end)
+    else:
+        indexes[booking.room_id].discard(booking.id)
+
+
+def booking_deleted(booking):
+    if loaded_at is not None:
+        indexes[booking.room_id].discard(booking.id)
+
+
+def series_changed(series):
+    if loaded_at is None:
+        return
+    indexes[series.room_id].discard_series(series.id)
+    if series.active:
+        for key, start, end in series_rows(series):
+            indexes[series.room_id].add(key, start, end)
@@ -0,0 +1,165 @@
+"""
+Bulk booking import, update and soft delete.
+
+The items are checked, room by room, against the active bookings and recurring
+occurrences they could collide with, fetched with one range query each for all
+their rooms, and against each other by sorting them by start and sweeping over
+them. Whatever is left is written with one bulk_create, or one bulk_update of
+the changed columns. A batch soft delete is a single UPDATE. These skip the
+Booking signals, so the live feed, the change versions and the availability
+index are updated here instead.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from . import availability, live, recurrence, versions
+from .forms import OVERLAP_ERROR, is_overlap_violation
+from .models import Booking
+
+MAX_BOOKINGS = 1000
+BATCH_SIZE = 500
+# What an edit may change, room by its column.
+UPDATE_FIELDS = ('name', 'description', 'start', 'end', 'room_id')
+
+BATCH_OVERLAP_ERROR = "This booking overlaps with another booking in the same request."
+
+
+def find_overlaps(bookings, moving=()):
+    """
+    Returns {position: error} for the bookings that cannot be written. moving
+    holds the ids of saved bookings among them, whose current rows are left out.
+    """
+    rooms = defaultdict(list)
+    for position, booking in enumerate(bookings):
+        rooms[booking.room_id].append(position)
+    window_start = min(booking.start for booking in bookings)
+    window_end = max(booking.end for booking in bookings)
+    existing = defaultdict(list)
+    series = recurrence.occurrences_by_room(rooms, window_start, window_end)
+    for room_id, start, end in (Booking.objects
+                                .filter(room__in=rooms, active=True, start__lt=window_end, end__gt=window_start)
+                                .exclude(id__in=moving)
+                                .order_by('start')
+                                .values_list('room', 'start', 'end')):
+        existing[room_id].append((start, end))
+
+    errors = {}
+    for room_id, positions in rooms.items():
+        # Neither bookings nor occurrences overlap each other, so the merge is sorted by end too.
+        others = sorted(existing[room_id] + series[room_id])
+        clashes = recurrence.overlapping([(bookings[position].start, bookings[position].end) for position in positions],
+                                         others)
+        last_end = None
+        for index in sorted(range(len(positions)), key=lambda index: bookings[positions[index]].start):
+            booking = bookings[positions[index]]
+            if index in clashes:
+                errors[positions[index]] = OVERLAP_ERROR
+            elif last_end is not None and booking.start < last_end:
+                errors[positions[index]] = BATCH_OVERLAP_ERROR
+            else:
+                last_end = booking.end
+    return errors
+
+
+def bookings_written(bookings):
+    room_days = {(booking.room_id, timezone.localdate(booking.start)) for booking in bookings}
+    room_days.update((booking.loaded_room, timezone.localdate(booking.loaded_start))
+                     for booking in bookings if getattr(booking, 'loaded_start', None) is not None)
+    versions.bump(room_days, {booking.userid_id for booking in bookings})
+    for booking in bookings:
+        availability.booking_saved(booking)
+
+
+def create_bookings(bookings):
+    """
+    Writes the unsaved bookings that overlap nothing and returns {position: error}
+    for the rest. A concurrent write can still slip in between the range query
+    and the insert, in which case the exclusion constraint rejects the batch and
+    it is checked once more.
+    """
+    if not bookings:
+        return {}
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                recurrence.lock_for_bookings({booking.room_id for booking in bookings})
+                errors = find_overlaps(bookings)
+                created = Booking.objects.bulk_create(
+                    [booking for position, booking in enumerate(bookings) if position not in errors],
+                    batch_size=BATCH_SIZE,
+                )
+                live.notify_many(created)
+            break
+        except IntegrityError as e:
+            if attempt or not is_overlap_violation(e):
+                raise
+            for booking in bookings:
+                booking.pk = None
+                booking._state.adding = True
+    transaction.on_commit(lambda: bookings_written(created))
+    return errors
+
+
+def find_update_overlaps(bookings):
+    """
+    find_overlaps for edited bookings. A rejected booking keeps its current row,
+    which the others are then checked against, until no more are rejected.
+    """
+    errors = {}
+    while True:
+        moving = [booking.id for position, booking in enumerate(bookings) if position not in errors]
+        found = find_overlaps(bookings, moving)
+        if found.keys() <= errors.keys():
+            return errors
+        errors.update(found)
+
+
+def update_bookings(bookings, fields):
+    """
+    Writes the edited bookings, loaded from the database, that overlap nothing,
+    setting only the given fields, and returns {position: error} for the rest.
+    """
+    if not bookings:
+        return {}
+    now = timezone.now()
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                recurrence.lock_for_bookings({booking.room_id for booking in bookings})
+                errors = find_update_overlaps(bookings)
+                updated = [booking for position, booking in enumerate(bookings) if position not in errors]
+                for booking in updated:
+                    booking.modified = now
+                written = [*fields, 'modified']
+                if {'start', 'end', 'room'} & set(fields):
+                    # The constraint is checked row by row, so a booking moving into the
+                    # slot another one leaves would clash with its old row. Taking them
+                    # all out of it first leaves only clashes with the final rows.
+                    Booking.objects.filter(id__in=[booking.id for booking in updated]).update(active=False)
+                    written.append('active')
+                Booking.objects.bulk_update(updated, written, batch_size=BATCH_SIZE)
+                live.notify_many(updated)
+            break
+        except IntegrityError as e:
+            if attempt or not is_overlap_violation(e):
+                raise
+    transaction.on_commit(lambda: bookings_written(updated))
+    return errors
+
+
+def delete_bookings(user_id, ids):
+    """Soft deletes the user's active bookings among ids with one UPDATE. Returns the ids deleted."""
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE "booker_engine_booking" SET "active" = false, "modified" = %s '
+                'WHERE "id" = ANY(%s) AND "userid_id" = %s AND "active" RETURNING "id", "room_id", "start"',
+                [timezone.now(), list(ids), user_id],
+            )
+            deleted = [Booking(id=booking_id, room_id=room_id, start=start, userid_id=user_id, active=False)
+                       for booking_id, room_id, start in cursor.fetchall()]
+        live.notify_many(deleted)
+    transaction.on_commit(lambda: bookings_written(deleted))
+    return {booking.id for booking in deleted}
@@ -0,0 +1,51 @@
+"""
+Compact columnar encoding of booking rows, served by the day/week/range
+endpoints when asked for with `compact=1`.
+
+Instead of a list of objects repeating every key, the response lists the days
+with the number of rows on each, then one array per field in the same row
+order. start/end are Unix seconds and usernames are indexes into `users`:
+
+    {"days": ["2024-05-06"], "counts": [2], "users": ["ann"],
+     "id": [4, 9], "name": [...], "start": [...], "end": [...], "user": [0, 0]}
+"""
+from itertools import groupby
+from operator import itemgetter
+
+# Rows of the day cache, occurrences of recurring bookings have `id` None and a `series`.
+FIELDS = ('id', 'name', 'description', 'start', 'end', 'username', 'series')
+
+
+def requested(request):
+    return request.GET.get('compact') == '1'
+
+
+def timestamp(value):
+    seconds = value.timestamp()
+    return int(seconds) if seconds.is_integer() else seconds
+
+
+def encode(days, fields=FIELDS):
+    """Columnar form of [(day, rows)], rows ordered by start within their day."""
+    result = {'days': [], 'counts': []}
+    columns = {field: [] for field in fields}
+    for day, rows in days:
+        result['days'].append(day.isoformat())
+        result['counts'].append(len(rows))
+        for field, column in columns.items():
+            column.extend(row.get(field) for row in rows)
+
+    for field in ('start', 'end'):
+        if field in columns:
+            columns[field] = [timestamp(value) for value in columns[field]]
+    if 'username' in columns:
+        users = {}
+        columns['user'] = [users.setdefault(name, len(users)) for name in columns.pop('username')]
+        result['users'] = list(users)
+    result.update(columns)
+    return result
+
+
+def encode_rows(rows, fields):
+    """Columnar form of rows ordered by start that carry their local `day`."""
+    return encode(((day, list(day_rows)) for day, day_rows in groupby(rows, key=itemgetter('day'))), fields)
@@ -0,0 +1,63 @@
+"""
+Conditional GET support (ETag / Last-Modified) for the booking read endpoints.
+
+The validators are derived from the change versions in versions.py only, so
+a request answered with 304 Not Modified never runs the booking query.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+def validators(request, versions):
+    tag = hashlib.sha1(f"{request.path}?{request.GET.urlencode()}:{versions}".encode()).hexdigest()
+    return f'"{tag}"', max(versions) // 10**9
+
+
+def add_validators(response, etag, last_modified):
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        # Always revalidate, never serve from a heuristic freshness window.
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def conditional(versions_func):
+    """
+    `versions_func(request)` returns the list of versions the response depends
+    on, or None when the request is invalid and the view should answer it.
+    Place the decorator below the authentication/login decorators. Works on
+    async views too, running `versions_func` in a thread.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                versions = await sync_to_async(versions_func)(request)
+                if versions is None:
+                    return await view(request, *args, **kwargs)
+
+                etag, last_modified = validators(request, versions)
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return add_validators(response, etag, last_modified)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            versions = versions_func(request)
+            if versions is None:
+                return view(request, *args, **kwargs)
+
+            etag, last_modified = validators(request, versions)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return add_validators(response, etag, last_modified)
+        return wrapper
+    return decorator
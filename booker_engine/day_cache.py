@@ -0,0 +1,79 @@
+"""
+Per calendar day cache of the active bookings served by the day/week endpoints,
+including the occurrences of recurring bookings (with `id` None and `series`).
+
+Rows are stored under (room, day, version), see versions.py. A booking write bumps
+the version of the days it touched, so a reader that raced the write can only
+ever store its stale rows under a version nobody asks for anymore. This works
+the same with the local memory backend and with a shared backend
+(redis/memcached) across gunicorn workers.
+"""
+import threading
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.functions import TruncDate
+
+from . import archive, recurrence, versions
+from .days import bucket_by_day, day_bounds
+
+FIELDS = ('id', 'name', 'description', 'start', 'end')
+
+counters = {'hits': 0, 'misses': 0}
+counters_lock = threading.Lock()
+
+
+def rows_key(room_id, day, version):
+    return f'booking-day:{room_id}:{day.isoformat()}:{version}'
+
+
+def fetch_rows(room_id, days):
+    """Loads {day: rows} of a room for the given days with a single range query, bucketed by the database."""
+    start, end = day_bounds(min(days))[0], day_bounds(max(days))[1]
+    buckets = {day: [] for day in days}
+    # TruncDate converts to the current time zone, TIME_ZONE, in Postgres.
+    rows = archive.including_archive(
+        lambda model: (model.objects.filter(room=room_id, start__gte=start, start__lt=end, active=True)
+                       .values(*FIELDS, username=F('userid__username'), day=TruncDate('start'))),
+        start,
+    ).order_by("start")
+    for row in rows:
+        bucket = buckets.get(row.pop('day'))
+        if bucket is not None:
+            bucket.append(row)
+
+    occurrences = recurrence.occurrence_rows(room_id, start, end)
+    if occurrences:
+        for day, day_occurrences in bucket_by_day(occurrences, days, start=itemgetter('start')).items():
+            if day_occurrences:
+                buckets[day] = sorted(buckets[day] + day_occurrences, key=itemgetter('start'))
+    return buckets
+
+
+def get_days(room_id, days):
+    """Returns {day: rows} of a room for the given days, querying the database only for the misses."""
+    day_versions = versions.day_versions(room_id, days)
+    keys = {day: rows_key(room_id, day, day_versions[day]) for day in days}
+    cached = cache.get_many(keys.values())
+    result = {day: cached[key] for day, key in keys.items() if key in cached}
+    missing = [day for day in days if day not in result]
+    if missing:
+        fetched = fetch_rows(room_id, missing)
+        cache.set_many({keys[day]: fetched[day] for day in missing}, getattr(settings, 'DAY_CACHE_TIMEOUT', 86400))
+        result.update(fetched)
+
+    with counters_lock:
+        counters['hits'] += len(cached)
+        counters['misses'] += len(days) - len(cached)
+    return result
+
+
+def get_day(room_id, day):
+    return get_days(room_id, [day])[day]
+
+
+def stats():
+    with counters_lock:
+        return dict(counters)
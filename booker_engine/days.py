@@ -0,0 +1,35 @@
+"""
+Calendar day helpers. Days are dates in the configured TIME_ZONE and a day
+covers the half-open range [midnight, next midnight).
+"""
+from datetime import datetime, timedelta
+from operator import attrgetter
+
+from django.utils import timezone
+
+
+def midnight(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def day_bounds(day):
+    return midnight(day), midnight(day + timedelta(days=1))
+
+
+def window_bounds(first_day, count):
+    """The range covering `count` consecutive days from `first_day`."""
+    return midnight(first_day), midnight(first_day + timedelta(days=count))
+
+
+def bucket_by_day(bookings, days, start=attrgetter('start')):
+    """
+    Groups bookings (already ordered by start) into {day: [bookings]} for the
+    given days, by the local day they start on. Bookings outside them are dropped.
+    """
+    buckets = {day: [] for day in days}
+    tz = timezone.get_current_timezone()
+    for booking in bookings:
+        bucket = buckets.get(start(booking).astimezone(tz).date())
+        if bucket is not None:
+            bucket.append(booking)
+    return buckets
@@ -0,0 +1,149 @@
+"""
+Streaming booking export as CSV, NDJSON or iCalendar.
+
+The bookings are read through a server-side cursor, CHUNK_SIZE rows at a
+time, and written out a chunk at a time, so memory stays flat however many
+rows the range holds. ASGI servers buffer a sync iterator whole, so there the
+chunks are handed out through aiterate(). Archived bookings are included when the range reaches
+back before the archive cutoff, like the range reads (see archive.py).
+"""
+import csv
+import io
+import json
+from datetime import timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.db.models import F
+
+from . import archive, recurrence
+
+CHUNK_SIZE = 2000
+FIELDS = ('id', 'name', 'description', 'start', 'end', 'active', 'room', 'username')
+
+
+def bookings(range_start=None, range_end=None, room_id=None, cancelled=False):
+    """The bookings overlapping the range, ordered by start, as value dicts read CHUNK_SIZE rows at a time."""
+    def in_range(model):
+        rows = model.objects.all()
+        if not cancelled:
+            rows = rows.filter(active=True)
+        if room_id:
+            rows = rows.filter(room=room_id)
+        if range_end:
+            rows = rows.filter(start__lt=range_end)
+        if range_start:
+            # Bookings last at most MAX_DURATION, the bound on start keeps the scan on the index.
+            rows = rows.filter(end__gt=range_start, start__gt=range_start - recurrence.MAX_DURATION)
+        return rows.values('id', 'name', 'description', 'start', 'end', 'active', 'modified',
+                           room_name=F('room__name'), username=F('userid__username'))
+
+    rows = archive.including_archive(in_range, range_start and range_start - recurrence.MAX_DURATION)
+    return rows.order_by('start', 'id').iterator(chunk_size=CHUNK_SIZE)
+
+
+async def aiterate(chunks):
+    """
+    The chunks of a writer as an async iterator. Each one is pulled in the
+    request's database thread, where the cursor was opened.
+    """
+    chunks = iter(chunks)
+    pull = sync_to_async(next)
+    while (chunk := await pull(chunks, None)) is not None:
+        yield chunk
+
+
+def chunks(rows):
+    """Lists of up to CHUNK_SIZE rows."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def to_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    for chunk in chunks(rows):
+        writer.writerows([row['id'], row['name'], row['description'], row['start'].isoformat(),
+                          row['end'].isoformat(), row['active'], row['room_name'], row['username']]
+                         for row in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def to_ndjson(rows):
+    for chunk in chunks(rows):
+        yield ''.join(json.dumps({
+            'id': row['id'], 'name': row['name'], 'description': row['description'],
+            'start': row['start'].isoformat(), 'end': row['end'].isoformat(), 'active': row['active'],
+            'room': row['room_name'], 'username': row['username'],
+        }) + '\n' for row in chunk)
+
+
+def ics_text(value):
+    # RFC 5545 TEXT: backslashes, semicolons and commas escaped, newlines as \n.
+    for raw, escaped in (('\\', '\\\\'), (';', '\\;'), (',', '\\,'), ('\r\n', '\\n'), ('\n', '\\n')):
+        value = value.replace(raw, escaped)
+    return value
+
+
+def ics_time(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def ics_line(line):
+    """Folds a content line to 75 octets, as RFC 5545 asks."""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts, start = [], 0
+    while start < len(encoded):
+        end = min(start + (75 if not parts else 74), len(encoded))
+        # Never split a UTF-8 sequence.
+        while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode())
+        start = end
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def ics_event(row):
+    lines = [
+        'BEGIN:VEVENT',
+        f"UID:booking-{row['id']}@booker",
+        f"DTSTAMP:{ics_time(row['modified'])}",
+        f"DTSTART:{ics_time(row['start'])}",
+        f"DTEND:{ics_time(row['end'])}",
+        f"SUMMARY:{ics_text(row['name'])}",
+        f"LOCATION:{ics_text(row['room_name'])}",
+        f"CONTACT:{ics_text(row['username'])}",
+    ]
+    if row['description']:
+        lines.append(f"DESCRIPTION:{ics_text(row['description'])}")
+    if not row['active']:
+        lines.append('STATUS:CANCELLED')
+    lines.append('END:VEVENT')
+    return ''.join(ics_line(line) for line in lines)
+
+
+def to_ics(rows):
+    yield 'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//booker//bookings//EN\r\nCALSCALE:GREGORIAN\r\n'
+    for chunk in chunks(rows):
+        yield ''.join(ics_event(row) for row in chunk)
+    yield 'END:VCALENDAR\r\n'
+
+
+# format: (content type, file extension, writer)
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv', to_csv),
+    'ndjson': ('application/x-ndjson', 'ndjson', to_ndjson),
+    'ics': ('text/calendar; charset=utf-8', 'ics', to_ics),
+}
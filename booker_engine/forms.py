@@ -1,19 +1,75 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 
 from datetime import datetime, timedelta
-from .models import Booking
+from . import insert, recurrence
+from .models import Booking, RecurringBooking, Room
 
-class BookingForm(forms.ModelForm):
+OVERLAP_ERROR = "This booking overlaps with an existing booking."
+
+
+def is_overlap_violation(error):
+    diag = getattr(error.__cause__, 'diag', None)
+    return getattr(diag, 'constraint_name', None) == 'booking_no_overlap'
+
+
+class NoOverlapSaveMixin:
+    """
+    Overlaps are rejected by the booking_no_overlap exclusion constraint when the
+    row is written, instead of being looked up beforehand. save() turns the
+    violation into a form error and returns None. The constraint cannot see
+    recurring bookings, so their occurrences are checked under the series lock,
+    or for new bookings against the process's copy of the series (insert.py).
+    """
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # Without a room the instance keeps its own, the default room for new bookings.
+        if cleaned_data.get('room') is None:
+            cleaned_data.pop('room', None)
+        return cleaned_data
+
+    def _get_validation_exclusions(self):
+        # Keep full_clean() from running the constraint as a separate query.
+        exclude = super()._get_validation_exclusions()
+        exclude.update({'start', 'end'})
+        return exclude
+
+    def save(self, commit=True):
+        instance = super().save(commit=False)
+        if commit:
+            try:
+                # New bookings take a single statement, unless a series may be in the way.
+                saved = instance._state.adding and instance.active and insert.insert_booking(instance)
+                if saved:
+                    return instance
+                with transaction.atomic():
+                    recurrence.lock_for_booking(instance.room_id)
+                    clash = instance.active and recurrence.occurrences_between(instance.room_id, instance.start, instance.end)
+                    if not clash:
+                        instance.save()
+            except IntegrityError as e:
+                if not is_overlap_violation(e):
+                    raise
+                clash = True
+            if clash:
+                self.add_error(None, OVERLAP_ERROR)
+                return None
+        return instance
+
+
+class BookingForm(NoOverlapSaveMixin, forms.ModelForm):
     date = forms.DateField(widget=forms.NumberInput(attrs={"type": "date"}))
     time = forms.TimeField(widget=forms.TimeInput(format="%H:%M", attrs={"type": "time"}))
     duration = forms.IntegerField(help_text="Enter duration in minutes", min_value=15, max_value=300)
+    room = forms.ModelChoiceField(queryset=Room.objects.order_by('name'), required=False)
 
     class Meta:
         model = Booking
-        fields = ['name', 'description', 'date', 'time', 'duration']
+        fields = ['name', 'description', 'room', 'date', 'time', 'duration']
 
     def __init__(self, *args, **kwargs):
         super(BookingForm, self).__init__(*args, **kwargs)
@@ -35,16 +91,6 @@ class BookingForm(forms.ModelForm):
             
             start_datetime = datetime.combine(date, time, timezone.get_current_timezone())
             end_datetime = start_datetime + timedelta(minutes=duration)
-            
-
-            # Check for overlapping bookings
-            overlapping_bookings = Booking.objects.filter(
-                start__lt=end_datetime, end__gt=start_datetime, active=True
-            ).exclude(id=self.instance.id)  # Exclude the current instance from the check
-            if overlapping_bookings.exists():
-                raise forms.ValidationError(
-                    "This booking overlaps with an existing booking."
-                )
 
             cleaned_data["start"] = start_datetime
             cleaned_data["end"] = end_datetime
@@ -52,13 +98,9 @@ class BookingForm(forms.ModelForm):
         return cleaned_data
 
     def save(self, commit=True):
-        instance = super(BookingForm, self).save(commit=False)
-        instance.start = self.cleaned_data['start']
-        instance.end = self.cleaned_data['end']
-        
-        if commit:
-            instance.save()
-        return instance
+        self.instance.start = self.cleaned_data['start']
+        self.instance.end = self.cleaned_data['end']
+        return super(BookingForm, self).save(commit=commit)
     
 class SignUpForm(UserCreationForm):
     email = forms.EmailField(max_length=200, help_text='Required')
@@ -84,19 +126,47 @@ class DateForm(forms.Form):
     })
 
 
-class BookingAPIForm(forms.ModelForm):
+class PrefetchedRoomField(forms.ModelChoiceField):
+    """A room looked up in {id: room}, fetched once for a whole batch of forms."""
+
+    def __init__(self, rooms, **kwargs):
+        super().__init__(queryset=Room.objects.all(), **kwargs)
+        self.rooms = rooms
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            return self.rooms[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+
+
+class BookingAPIForm(NoOverlapSaveMixin, forms.ModelForm):
     start = forms.DateTimeField()
     end = forms.DateTimeField()
+    room = forms.ModelChoiceField(queryset=Room.objects.all(), required=False)
 
     class Meta:
         model = Booking
-        fields = ['name', 'description', 'start', 'end']
+        fields = ['name', 'description', 'start', 'end', 'room']
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, rooms=None, **kwargs):
+        """rooms, {id: room} of the rooms a batch names, saves the room queries of every form."""
         super(BookingAPIForm, self).__init__(*args, **kwargs)
+        self.rooms = rooms
+        if rooms is not None:
+            self.fields['room'] = PrefetchedRoomField(rooms, required=False)
         for field_name, field in self.fields.items():
             field.widget.attrs['class'] = 'form-control'
 
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        if self.rooms is not None:
+            # Already found among the prefetched rooms, not looked up again by its foreign key.
+            exclude.add('room')
+        return exclude
+
     def clean(self):
         cleaned_data = super().clean()
         start = cleaned_data.get("start")
@@ -114,14 +184,59 @@ class BookingAPIForm(forms.ModelForm):
                     "The duration must be less than 6 hours"
                 )
 
+        return cleaned_data
 
-            # Check for overlapping bookings
-            overlapping_bookings = Booking.objects.filter(
-                start__lt=end, end__gt=start, active=True
-            ).exclude(id=self.instance.id)  # Exclude the current instance from the check
-            if overlapping_bookings.exists():
-                raise forms.ValidationError(
-                    "This booking overlaps with an existing booking."
-                )
 
-        return cleaned_data
\ No newline at end of file
+class RecurringBookingAPIForm(forms.ModelForm):
+    start = forms.DateTimeField()
+    end = forms.DateTimeField()
+    interval = forms.IntegerField(min_value=1, required=False)
+    room = forms.ModelChoiceField(queryset=Room.objects.all(), required=False)
+
+    class Meta:
+        model = RecurringBooking
+        fields = ['name', 'description', 'start', 'end', 'room', 'frequency', 'interval', 'until', 'count', 'exceptions']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start = cleaned_data.get("start")
+        end = cleaned_data.get("end")
+        frequency = cleaned_data.get("frequency")
+        if cleaned_data.get("interval") is None and "interval" not in self.errors:
+            cleaned_data["interval"] = 1
+        if cleaned_data.get("room") is None:
+            cleaned_data.pop("room", None)
+        interval = cleaned_data.get("interval")
+
+        if start and end:
+            if end < start + timedelta(minutes=15):
+                raise forms.ValidationError("The duration must be atleast 15 minutes")
+            if end > start + recurrence.MAX_DURATION:
+                raise forms.ValidationError("The duration must be less than 6 hours")
+        if not cleaned_data.get("until") and not cleaned_data.get("count"):
+            raise forms.ValidationError("Set until or count to end the series")
+
+        if start and end and frequency and interval:
+            series = RecurringBooking(start=start, end=end, frequency=frequency, interval=interval,
+                                      until=cleaned_data.get("until"), count=cleaned_data.get("count"))
+            found, last_start = recurrence.span(series)
+            if found is None:
+                raise forms.ValidationError(f"A series can have at most {recurrence.MAX_OCCURRENCES} occurrences")
+            if not found:
+                raise forms.ValidationError("The series has no occurrences")
+            self.instance.last_start = last_start
+
+        return cleaned_data
+
+    def save(self, commit=True):
+        instance = super().save(commit=False)
+        if commit:
+            with transaction.atomic():
+                recurrence.lock_for_series(instance.room_id)
+                clash = recurrence.series_conflicts(instance)
+                if not clash:
+                    instance.save()
+            if clash:
+                self.add_error(None, OVERLAP_ERROR)
+                return None
+        return instance
@@ -0,0 +1,118 @@
+"""
+Booking change feed for the live view stream.
+
+Writes run NOTIFY booking_changes inside their own transaction (see
+signals.py), so Postgres delivers a notification to every process only once
+the write commits. Each ASGI worker runs a single listener thread on a
+dedicated connection and fans the changes out to the asyncio queues of its
+subscribers, grouped by the room and calendar day they are watching.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+from datetime import date
+
+from django.db import connection, connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Booking
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'booking_changes'
+FIELDS = ('id', 'name', 'description', 'start', 'end', 'active', 'room')
+
+
+def watched(booking):
+    """The (room, day) pairs whose screens a write to the booking concerns."""
+    days = {(booking.room_id, timezone.localdate(booking.start).isoformat())}
+    if getattr(booking, 'loaded_start', None) is not None:
+        days.add((booking.loaded_room, timezone.localdate(booking.loaded_start).isoformat()))
+    return sorted(days)
+
+
+def payload(booking):
+    return json.dumps({'id': booking.id, 'watched': watched(booking)})
+
+
+def notify(booking):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, payload(booking)])
+
+
+def notify_many(bookings):
+    if not bookings:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, change) FROM unnest(%s::text[]) AS change",
+                       [CHANNEL, [payload(booking) for booking in bookings]])
+
+
+class Feed:
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.loop = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def subscribe(self, room_id, day):
+        self.loop = asyncio.get_running_loop()
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.listen, name='booking-feed', daemon=True)
+                self.thread.start()
+        queue = asyncio.Queue()
+        self.subscribers[room_id, day].add(queue)
+        return queue
+
+    def unsubscribe(self, room_id, day, queue):
+        self.subscribers[room_id, day].discard(queue)
+        if not self.subscribers[room_id, day]:
+            del self.subscribers[room_id, day]
+
+    def listen(self):
+        database = connections['default']
+        while True:
+            try:
+                listener = database.get_new_connection(database.get_connection_params())
+                listener.autocommit = True
+                with listener.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                while True:
+                    select.select([listener], [], [], 60)
+                    listener.poll()
+                    while listener.notifies:
+                        notification = listener.notifies.pop(0)
+                        self.loop.call_soon_threadsafe(self.dispatch, notification.payload)
+            except Exception:
+                logger.exception("Booking change feed lost its connection, reconnecting")
+                time.sleep(5)
+
+    def dispatch(self, payload):
+        change = json.loads(payload)
+        watched = [key for key in ((room_id, date.fromisoformat(day)) for room_id, day in change['watched'])
+                   if key in self.subscribers]
+        if watched:
+            self.loop.create_task(self.publish(change['id'], watched))
+
+    async def publish(self, booking_id, watched):
+        # One query per change and process, however many screens are watching.
+        booking = await (Booking.objects.filter(id=booking_id)
+                         .values(*FIELDS, username=F('userid__username')).afirst())
+        active = booking is not None and booking.pop('active')
+        room_id = booking and booking.pop('room')
+        for key in watched:
+            if active and (room_id, timezone.localdate(booking['start'])) == key:
+                event = ('upsert', booking)
+            else:
+                event = ('delete', {'id': booking_id})
+            for queue in list(self.subscribers.get(key, ())):
+                queue.put_nowait(event)
+
+
+feed = Feed()
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from booker_engine import archive
+
+
+class Command(BaseCommand):
+    help = ("Moves bookings that ended BOOKING_ARCHIVE_AFTER_DAYS ago, and soft deleted ones untouched for "
+            "BOOKING_ARCHIVE_INACTIVE_DAYS, to the partitioned archive table.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help="Bookings moved per transaction")
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help="Seconds to wait between batches, to leave the database to the application")
+
+    def handle(self, *args, **options):
+        log = (lambda message: self.stderr.write(message)) if options['verbosity'] > 1 else None
+        moved = archive.archive(options['batch_size'], pause=options['pause'], log=log)
+        self.stdout.write(f"Archived {moved} bookings")
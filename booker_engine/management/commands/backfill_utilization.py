@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from booker_engine import utilization
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the hourly utilization rollups from the booking and archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-days', type=int, default=7, help="Days rebuilt per transaction")
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help="Seconds to wait between batches, to leave the database to the application")
+
+    def handle(self, *args, **options):
+        log = (lambda message: self.stderr.write(message)) if options['verbosity'] > 1 else None
+        days = utilization.backfill(options['batch_days'], pause=options['pause'], log=log)
+        self.stdout.write(f"Rebuilt {days} days of utilization rollups")
@@ -0,0 +1,108 @@
+import importlib
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from benchmarks import SUITES
+from benchmarks.seed import seed_bookings, seed_rooms, seed_users
+from booker_engine.models import Booking
+
+
+class Command(BaseCommand):
+    help = "Seeds a throwaway database and benchmarks the booking endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument('suites', nargs='*', help=f"Suites to run, any of {', '.join(sorted(SUITES))} (default: all)")
+        parser.add_argument('--rows', type=int, default=1000000, help="Bookings to seed")
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--years', type=int, default=5, help="Years of history to spread the bookings over")
+        parser.add_argument('--rooms', type=int, default=1, help="Rooms to spread the bookings over")
+        parser.add_argument('--inactive-ratio', type=float, default=0.9, help="Share of soft deleted bookings")
+        parser.add_argument('--iterations', type=int, default=200, help="Requests per endpoint")
+        parser.add_argument('--subscribers', type=int, default=500, help="Idle live view streams to hold open")
+        parser.add_argument('--workers', type=int, default=2, help="gunicorn workers per deployment")
+        parser.add_argument('--concurrency', type=int, default=32, help="Concurrent load test clients")
+        parser.add_argument('--slow-clients', type=int, default=8, help="Connections trickling their headers in")
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds per load test run")
+        parser.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi',
+                            help="gunicorn deployment the endpoints suite drives")
+        parser.add_argument('--output', help="Also write the results to this JSON file")
+        parser.add_argument('--compare', help="Results JSON of an earlier run to check this one against")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Allowed p95 growth against --compare, as a fraction")
+        parser.add_argument('--budget-ms', type=float, default=50.0, help="Maximum allowed p95 latency per endpoint")
+        parser.add_argument('--keepdb', action='store_true', help="Reuse the seeded benchmark database between runs")
+
+    def handle(self, *args, **options):
+        suites = options['suites'] or sorted(SUITES)
+        unknown = set(suites) - set(SUITES)
+        if unknown:
+            raise CommandError(f"Unknown suites: {', '.join(sorted(unknown))}")
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            results = self.run_suites(suites, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self.stdout.write(json.dumps(results, indent=2))
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                self.compare(json.load(baseline), results, options['tolerance'])
+
+        # Suites may set their own budget_ms for measurements that are not request latencies.
+        over_budget = [
+            f"{suite}.{endpoint} (p95 {stats['p95_ms']}ms, budget {stats.get('budget_ms', options['budget_ms'])}ms)"
+            for suite, endpoints in results.items()
+            for endpoint, stats in endpoints.items()
+            if stats.get('p95_ms', 0) > stats.get('budget_ms', options['budget_ms'])
+        ]
+        if over_budget:
+            raise CommandError("Over budget: " + ", ".join(over_budget))
+
+    def compare(self, baseline, results, tolerance):
+        """Fails on endpoints that got slower than the tolerance allows or run more queries."""
+        regressions = []
+        for suite, endpoints in results.items():
+            for endpoint, stats in endpoints.items():
+                before = baseline.get(suite, {}).get(endpoint)
+                if not before or 'p95_ms' not in stats:
+                    continue
+                change = stats['p95_ms'] / before['p95_ms'] - 1 if before['p95_ms'] else 0
+                self.stderr.write(f"{suite}.{endpoint}: p95 {before['p95_ms']} -> {stats['p95_ms']}ms ({change:+.0%})")
+                if change > tolerance:
+                    regressions.append(f"{suite}.{endpoint} p95 {change:+.0%}")
+                queries = stats.get('queries_per_request'), before.get('queries_per_request')
+                if None not in queries and queries[0] > queries[1]:
+                    regressions.append(f"{suite}.{endpoint} queries {queries[1]} -> {queries[0]}")
+        if regressions:
+            raise CommandError("Regressions: " + ", ".join(regressions))
+
+    def run_suites(self, suites, options):
+        log = lambda message: self.stderr.write(str(message))
+
+        if options['keepdb'] and Booking.objects.exists():
+            owners = seed_users(options['users'])
+            seed_rooms(options['rooms'])
+            log(f"Reusing {Booking.objects.count()} seeded bookings")
+        else:
+            started = time.perf_counter()
+            owners = seed_bookings(options['rows'], options['users'], options['years'], options['inactive_ratio'],
+                                   options['rooms'])
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE booker_engine_booking")
+            log(f"Seeded {options['rows']} bookings in {time.perf_counter() - started:.1f}s")
+
+        results = {}
+        for suite in suites:
+            module = importlib.import_module(SUITES[suite])
+            results[suite] = module.run(owners, options, log)
+        return results
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from booker_engine import export
+
+
+class Command(BaseCommand):
+    help = "Streams the bookings of a date range as CSV, NDJSON or iCalendar."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(export.FORMATS), default='csv')
+        parser.add_argument('--start', help="ISO 8601 date or datetime, in TIME_ZONE when naive")
+        parser.add_argument('--end', help="ISO 8601 date or datetime, in TIME_ZONE when naive")
+        parser.add_argument('--room', type=int, help="Only this room's bookings (default: every room)")
+        parser.add_argument('--cancelled', action='store_true', help="Include soft deleted bookings")
+        parser.add_argument('--output', help="File to write to (default: stdout)")
+
+    def handle(self, *args, **options):
+        try:
+            range_start, range_end = (self.parse(options[name]) for name in ('start', 'end'))
+        except ValueError as e:
+            raise CommandError(e)
+        _, _, write = export.FORMATS[options['format']]
+        chunks = write(export.bookings(range_start, range_end, options['room'], cancelled=options['cancelled']))
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        # newline='' keeps the CRLFs of CSV and iCalendar as they are.
+        with open(options['output'], 'w', newline='') as output:
+            for chunk in chunks:
+                output.write(chunk)
+
+    def parse(self, value):
+        if not value:
+            return None
+        parsed = datetime.fromisoformat(value)
+        return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
@@ -0,0 +1,176 @@
+"""
+Per request timing, query count and response size, reported in a
+Server-Timing header and aggregated per URL name for the Prometheus text
+endpoint at /metrics.
+
+Turn it on with REQUEST_METRICS=1, which puts RequestMetricsMiddleware first
+in MIDDLEWARE. Queries are counted by an execute wrapper installed on every
+database connection, which adds one Python call per query and nothing when no
+request is being measured. The numbers of the current request live in a
+context variable, so they follow a request into the threads sync_to_async runs
+its queries in. Aggregates are per worker process, like cache_stats.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+current = ContextVar('request_metrics', default=None)
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+def record(execute, sql, params, many, context):
+    stats = current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += time.perf_counter() - started
+        stats.queries += 1
+
+
+def install(connection, **kwargs):
+    if record not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # One count per bucket plus +Inf, cumulated when rendered.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_time = 0.0
+        self.response_bytes = 0
+
+
+views = {}
+views_lock = threading.Lock()
+
+
+def observe(view, stats, duration, size):
+    with views_lock:
+        metrics = views.get(view)
+        if metrics is None:
+            metrics = views[view] = ViewMetrics()
+        metrics.duration.observe(duration)
+        metrics.queries.observe(stats.queries)
+        metrics.db_time += stats.db_time
+        metrics.response_bytes += size
+
+
+def reset():
+    with views_lock:
+        views.clear()
+
+
+def histogram_lines(name, view, histogram):
+    cumulated = 0
+    for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+        cumulated += count
+        yield f'{name}_bucket{{view="{view}",le="{bound}"}} {cumulated}'
+    yield f'{name}_sum{{view="{view}"}} {histogram.sum}'
+    yield f'{name}_count{{view="{view}"}} {cumulated}'
+
+
+def render():
+    """The aggregates in the Prometheus text exposition format."""
+    with views_lock:
+        snapshot = sorted(views.items())
+        lines = [
+            '# HELP booker_request_duration_seconds Time spent answering a request.',
+            '# TYPE booker_request_duration_seconds histogram',
+        ]
+        for view, metrics in snapshot:
+            lines.extend(histogram_lines('booker_request_duration_seconds', view, metrics.duration))
+        lines += [
+            '# HELP booker_request_queries Database queries run by a request.',
+            '# TYPE booker_request_queries histogram',
+        ]
+        for view, metrics in snapshot:
+            lines.extend(histogram_lines('booker_request_queries', view, metrics.queries))
+        lines += [
+            '# HELP booker_request_db_seconds_total Time spent in database queries.',
+            '# TYPE booker_request_db_seconds_total counter',
+        ]
+        lines += [f'booker_request_db_seconds_total{{view="{view}"}} {metrics.db_time}' for view, metrics in snapshot]
+        lines += [
+            '# HELP booker_response_bytes_total Size of the response bodies, streamed ones excluded.',
+            '# TYPE booker_response_bytes_total counter',
+        ]
+        lines += [f'booker_response_bytes_total{{view="{view}"}} {metrics.response_bytes}'
+                  for view, metrics in snapshot]
+    return '\n'.join(lines) + '\n'
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.url_name or match.view_name if match else 'unmatched'
+
+
+class RequestMetricsMiddleware:
+    """Place first in MIDDLEWARE so the total covers every other middleware."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(install)
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, started = RequestStats(), time.perf_counter()
+        token = current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, stats, started)
+
+    async def __acall__(self, request):
+        stats, started = RequestStats(), time.perf_counter()
+        token = current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, stats, started)
+
+    def finish(self, request, response, stats, started):
+        duration = time.perf_counter() - started
+        # Streamed bodies are produced after this returns, their queries and size are not counted.
+        size = 0 if response.streaming else len(response.content)
+        response['Server-Timing'] = (
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", total;dur={duration * 1000:.1f}'
+        )
+        observe(view_name(request), stats, duration, size)
+        return response
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-18 13:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booker_engine', '0005_alter_booking_userid'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('active', True)), fields=['start'], name='booking_active_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('active', True)), fields=['userid', 'start'], name='booking_active_user_start_idx'),
+        ),
+    ]
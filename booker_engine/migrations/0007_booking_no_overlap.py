@@ -0,0 +1,21 @@
+# Generated by Django 5.0.7 on 2026-10-18 13:25
+
+import booker_engine.models
+import django.contrib.postgres.constraints
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booker_engine', '0006_booking_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('active', True)), expressions=[(booker_engine.models.TsTzRange('start', 'end'), '&&')], name='booking_no_overlap', violation_error_message='This booking overlaps with an existing booking.'),
+        ),
+    ]
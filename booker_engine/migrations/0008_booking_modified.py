@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 13:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booker_engine', '0007_booking_no_overlap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='modified',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
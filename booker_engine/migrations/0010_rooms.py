@@ -0,0 +1,91 @@
+# Generated by Django 5.0.7 on 2026-10-18 14:19
+
+import booker_engine.models
+import django.contrib.postgres.constraints
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# models.DEFAULT_ROOM_NAME when the rooms were added.
+DEFAULT_ROOM_NAME = 'Main room'
+
+
+def move_into_default_room(apps, schema_editor):
+    Room = apps.get_model('booker_engine', 'Room')
+    room, _ = Room.objects.get_or_create(name=DEFAULT_ROOM_NAME)
+    for model in ('Booking', 'RecurringBooking'):
+        apps.get_model('booker_engine', model).objects.filter(room=None).update(room=room)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booker_engine', '0009_recurringbooking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Room',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('description', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name='booking',
+            name='booking_no_overlap',
+        ),
+        migrations.RemoveIndex(
+            model_name='recurringbooking',
+            name='series_active_span_idx',
+        ),
+        # Added nullable and filled in with the default room here, as
+        # models.default_room() would query the current Room model.
+        migrations.AddField(
+            model_name='booking',
+            name='room',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='booker_engine.room'),
+        ),
+        migrations.AddField(
+            model_name='recurringbooking',
+            name='room',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='booker_engine.room'),
+        ),
+        migrations.RunPython(move_into_default_room, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='booking',
+            name='room',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='booker_engine.room'),
+        ),
+        migrations.AlterField(
+            model_name='recurringbooking',
+            name='room',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='booker_engine.room'),
+        ),
+        # The default only lives in Python, so adding it once the columns are
+        # NOT NULL changes nothing in the database.
+        migrations.AlterField(
+            model_name='booking',
+            name='room',
+            field=models.ForeignKey(default=booker_engine.models.default_room, on_delete=django.db.models.deletion.PROTECT, to='booker_engine.room'),
+        ),
+        migrations.AlterField(
+            model_name='recurringbooking',
+            name='room',
+            field=models.ForeignKey(default=booker_engine.models.default_room, on_delete=django.db.models.deletion.PROTECT, to='booker_engine.room'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('active', True)), fields=['room', 'start'], name='booking_active_room_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringbooking',
+            index=models.Index(condition=models.Q(('active', True)), fields=['room', 'start', 'last_start'], name='series_active_span_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('active', True)), expressions=[(booker_engine.models.RoomRange('room'), '='), (booker_engine.models.TsTzRange('start', 'end'), '&&')], name='booking_no_overlap', violation_error_message='This booking overlaps with an existing booking.'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.7 on 2026-10-18 15:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+CREATE_TRIGGER = '''
+CREATE FUNCTION booking_change_seq() RETURNS trigger AS $$
+BEGIN
+    NEW.change_seq := pg_current_xact_id()::text::bigint;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER booking_change_seq BEFORE INSERT OR UPDATE ON booker_engine_booking
+    FOR EACH ROW EXECUTE FUNCTION booking_change_seq();
+'''
+
+DROP_TRIGGER = '''
+DROP TRIGGER booking_change_seq ON booker_engine_booking;
+DROP FUNCTION booking_change_seq();
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booker_engine', '0010_rooms'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['userid', 'change_seq', 'id'], name='booking_user_change_idx'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.0.7 on 2026-10-18 15:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Django cannot create a partitioned table, the model state below describes it.
+# Primary and unique keys of a partitioned table must include the partition
+# key, hence (id, start). Partitions are added by archive.ensure_partitions().
+CREATE_TABLE = '''
+CREATE TABLE "booker_engine_archivedbooking" (
+    "id" bigint NOT NULL,
+    "name" varchar(255) NOT NULL,
+    "description" text NOT NULL,
+    "start" timestamp with time zone NOT NULL,
+    "end" timestamp with time zone NOT NULL,
+    "active" boolean NOT NULL,
+    "modified" timestamp with time zone NOT NULL,
+    "change_seq" bigint NOT NULL,
+    "room_id" bigint NOT NULL REFERENCES "booker_engine_room" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "userid_id" integer NOT NULL REFERENCES "auth_user" ("id") DEFERRABLE INITIALLY DEFERRED,
+    PRIMARY KEY ("id", "start")
+) PARTITION BY RANGE ("start");
+CREATE INDEX "booker_engine_archivedbooking_room_id_4c01db99" ON "booker_engine_archivedbooking" ("room_id");
+CREATE INDEX "booker_engine_archivedbooking_userid_id_8a02d80b" ON "booker_engine_archivedbooking" ("userid_id");
+CREATE INDEX "archive_active_room_start_idx" ON "booker_engine_archivedbooking" ("room_id", "start") WHERE "active";
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booker_engine', '0011_booking_change_seq'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(CREATE_TABLE, 'DROP TABLE "booker_engine_archivedbooking"'),
+            ],
+            state_operations=[
+                migrations.CreateModel(
+                    name='ArchivedBooking',
+                    fields=[
+                        ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                        ('name', models.CharField(max_length=255)),
+                        ('description', models.TextField(blank=True)),
+                        ('start', models.DateTimeField()),
+                        ('end', models.DateTimeField()),
+                        ('active', models.BooleanField()),
+                        ('modified', models.DateTimeField()),
+                        ('change_seq', models.BigIntegerField()),
+                        ('room', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='booker_engine.room')),
+                        ('userid', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'indexes': [models.Index(condition=models.Q(('active', True)), fields=['room', 'start'], name='archive_active_room_start_idx')],
+                    },
+                ),
+            ],
+        ),
+    ]
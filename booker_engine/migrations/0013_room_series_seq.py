@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booker_engine', '0012_archivedbooking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='series_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.0.7 on 2026-10-18 16:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# The hours a booking adds to, by UTC hour: its time within each hour while
+# active and a booking in its first hour, or a cancellation when soft deleted.
+CREATE_TRIGGER = '''
+CREATE FUNCTION booking_rollup_hours(b_start timestamptz, b_end timestamptz, b_active boolean)
+RETURNS TABLE (hour timestamptz, booked_seconds integer, bookings integer, cancellations integer) AS $$
+    SELECT h,
+           CASE WHEN b_active THEN extract(epoch FROM least(b_end, h + interval '1 hour') - greatest(b_start, h))::integer
+                ELSE 0 END,
+           (b_active AND h = date_trunc('hour', b_start, 'UTC'))::integer,
+           (NOT b_active)::integer
+    FROM generate_series(date_trunc('hour', b_start, 'UTC'),
+                         CASE WHEN b_active THEN b_end - interval '1 microsecond' ELSE b_start END,
+                         interval '1 hour') AS h
+$$ LANGUAGE sql STABLE;
+
+CREATE FUNCTION booking_rollup_add(b_room bigint, b_start timestamptz, b_end timestamptz, b_active boolean,
+                                   sign integer) RETURNS void AS $$
+    INSERT INTO booker_engine_utilizationrollup AS r (room_id, hour, booked_seconds, bookings, cancellations)
+    SELECT b_room, hour, booked_seconds * sign, bookings * sign, cancellations * sign
+    FROM booking_rollup_hours(b_start, b_end, b_active)
+    ON CONFLICT (room_id, hour) DO UPDATE SET
+        booked_seconds = r.booked_seconds + EXCLUDED.booked_seconds,
+        bookings = r.bookings + EXCLUDED.bookings,
+        cancellations = r.cancellations + EXCLUDED.cancellations
+$$ LANGUAGE sql;
+
+CREATE FUNCTION booking_rollup() RETURNS trigger AS $$
+BEGIN
+    -- Moves to and from the archive change no statistics, see archive.py.
+    IF current_setting('booker_engine.archiving', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'UPDATE' THEN
+        IF (OLD.start, OLD."end", OLD.active, OLD.room_id)
+                IS NOT DISTINCT FROM (NEW.start, NEW."end", NEW.active, NEW.room_id) THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM booking_rollup_add(OLD.room_id, OLD.start, OLD."end", OLD.active, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM booking_rollup_add(NEW.room_id, NEW.start, NEW."end", NEW.active, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER booking_rollup AFTER INSERT OR UPDATE OR DELETE ON booker_engine_booking
+    FOR EACH ROW EXECUTE FUNCTION booking_rollup();
+'''
+
+DROP_TRIGGER = '''
+DROP TRIGGER booking_rollup ON booker_engine_booking;
+DROP FUNCTION booking_rollup();
+DROP FUNCTION booking_rollup_add(bigint, timestamptz, timestamptz, boolean, integer);
+DROP FUNCTION booking_rollup_hours(timestamptz, timestamptz, boolean);
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booker_engine', '0013_room_series_seq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UtilizationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('booked_seconds', models.IntegerField(default=0)),
+                ('bookings', models.IntegerField(default=0)),
+                ('cancellations', models.IntegerField(default=0)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='booker_engine.room')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('room', 'hour'), name='rollup_room_hour_unique')],
+            },
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+    ]
@@ -1,5 +1,50 @@
 from django.db import models
+from django.db.models import Func, Q
 from django.contrib.auth.models import User
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.fields import BigIntegerRangeField, DateTimeRangeField, RangeOperators
+
+
+class TsTzRange(Func):
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
+
+
+class RoomRange(Func):
+    # [room, room + 1): comparing rooms as ranges lets the GiST exclusion
+    # constraint cover them without the btree_gist extension.
+    template = '%(function)s(%(expressions)s, %(expressions)s + 1)'
+    function = 'INT8RANGE'
+    output_field = BigIntegerRangeField()
+
+
+DEFAULT_ROOM_NAME = 'Main room'
+default_room_id = None
+
+
+def default_room():
+    """The room of bookings made without choosing one, as before rooms existed."""
+    global default_room_id
+    if default_room_id is None:
+        default_room_id = Room.objects.get_or_create(name=DEFAULT_ROOM_NAME)[0].pk
+    return default_room_id
+
+
+class Room(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    description = models.TextField(blank=True)
+    # Bumped by every series write in the room, see insert.py.
+    series_seq = models.BigIntegerField(default=0, editable=False)
+
+    @staticmethod
+    def id_param(value):
+        """A room id from a query parameter, the default room when there is none. Raises ValueError."""
+        return int(value) if value else default_room()
+
+    def __str__(self):
+        return self.name
+
 
 class  Booking(models.Model):
     id = models.AutoField(primary_key=True, null=False)
@@ -9,7 +54,135 @@ class  Booking(models.Model):
     end = models.DateTimeField()
     active = models.BooleanField(default=True)
     userid = models.ForeignKey(User, on_delete=models.CASCADE)
+    room = models.ForeignKey(Room, on_delete=models.PROTECT, default=default_room)
+    modified = models.DateTimeField(auto_now=True)
+    # Id of the transaction that last wrote the row, set by a trigger on every
+    # INSERT/UPDATE (migration 0011) so bulk writes and QuerySet.update() are
+    # covered too. It only grows, see sync.py for how clients page through it.
+    change_seq = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        # Soft deleted rows never show up in the day/week/upcoming lookups, so
+        # the indexes only cover active bookings. Day/week/live lookups are per
+        # room and lead with it, so they only ever walk that room's bookings.
+        indexes = [
+            models.Index(fields=['start'], condition=Q(active=True), name='booking_active_start_idx'),
+            models.Index(fields=['userid', 'start'], condition=Q(active=True), name='booking_active_user_start_idx'),
+            models.Index(fields=['room', 'start'], condition=Q(active=True), name='booking_active_room_start_idx'),
+            # Soft deletes are changes too, so this one covers inactive rows.
+            models.Index(fields=['userid', 'change_seq', 'id'], name='booking_user_change_idx'),
+        ]
+        # Two active bookings can never share a moment in the same room. The
+        # database enforces this on INSERT/UPDATE, so concurrent writers cannot
+        # race past it.
+        constraints = [
+            ExclusionConstraint(
+                name='booking_no_overlap',
+                expressions=[
+                    (RoomRange('room'), RangeOperators.EQUAL),
+                    (TsTzRange('start', 'end'), RangeOperators.OVERLAPS),
+                ],
+                condition=Q(active=True),
+                violation_error_message="This booking overlaps with an existing booking.",
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so a write also invalidates the day a booking moved away from.
+        instance.loaded_start = instance.__dict__.get('start')
+        instance.loaded_room = instance.__dict__.get('room_id')
+        return instance
 
     def __str__(self):
         return f'ID:{self.id}, {self.name}, Date:{self.start.strftime("%d/%m/%Y")}, Start:{self.start.strftime("%H:%M")}, End:{self.end.strftime("%H:%M")}'
 
+
+class ArchivedBooking(models.Model):
+    """
+    A booking moved out of Booking by the archive_bookings command, see
+    archive.py. The table is partitioned by month of start, with (id, start)
+    as its primary key in the database.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    name = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    active = models.BooleanField()
+    userid = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    room = models.ForeignKey(Room, on_delete=models.PROTECT, related_name='+')
+    modified = models.DateTimeField()
+    change_seq = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['room', 'start'], condition=Q(active=True), name='archive_active_room_start_idx'),
+        ]
+
+
+class UtilizationRollup(models.Model):
+    """
+    Booked time, bookings and cancellations of a room per UTC hour, for the
+    utilization stats. The booking_rollup trigger (migration 0014) adds every
+    write to Booking as it happens, see utilization.py.
+    """
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='+')
+    hour = models.DateTimeField()
+    # Active bookings' time within the hour, and the bookings starting in it.
+    booked_seconds = models.IntegerField(default=0)
+    bookings = models.IntegerField(default=0)
+    # Soft deleted bookings starting in the hour.
+    cancellations = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'hour'], name='rollup_room_hour_unique'),
+        ]
+
+
+class RecurringBooking(models.Model):
+    """
+    A series of bookings repeating on a daily, weekly or monthly rule, stored as
+    a single row. `start`/`end` are the first occurrence, the others repeat it
+    at the same local time. Occurrences are only ever expanded for the window
+    being read or checked, see recurrence.py.
+    """
+    DAILY = 'daily'
+    WEEKLY = 'weekly'
+    MONTHLY = 'monthly'
+    FREQUENCIES = [(DAILY, 'Daily'), (WEEKLY, 'Weekly'), (MONTHLY, 'Monthly')]
+
+    name = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    frequency = models.CharField(max_length=7, choices=FREQUENCIES)
+    interval = models.PositiveIntegerField(default=1)
+    until = models.DateField(null=True, blank=True)
+    count = models.PositiveIntegerField(null=True, blank=True)
+    # Local dates of occurrences that were called off.
+    exceptions = ArrayField(models.DateField(), default=list, blank=True)
+    # Start of the last occurrence, derived from until/count when saved.
+    last_start = models.DateTimeField()
+    active = models.BooleanField(default=True)
+    userid = models.ForeignKey(User, on_delete=models.CASCADE)
+    room = models.ForeignKey(Room, on_delete=models.PROTECT, default=default_room)
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['room', 'start', 'last_start'], condition=Q(active=True), name='series_active_span_idx'),
+        ]
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    @property
+    def last_end(self):
+        return self.last_start + self.duration
+
+    def __str__(self):
+        return f'ID:{self.id}, {self.name}, {self.get_frequency_display()} from {self.start.strftime("%d/%m/%Y")}'
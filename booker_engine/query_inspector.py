@@ -0,0 +1,139 @@
+"""
+Development and test check of the SQL each request runs.
+
+QueryInspectorMiddleware captures the statements of a request and logs the
+ones repeated REPEATED_QUERY_THRESHOLD times or more with the same shape, the
+N+1 pattern of reading a relation per row, and the ones slower than
+SLOW_QUERY_MS. Views declare the most queries they may run with @query_budget
+next to their definition. Going over it is logged, or raised as
+QueryBudgetExceeded when QUERY_INSPECTOR is 'raise', which the test suite
+runs with so a regression fails the test that made the request.
+
+Queries run while a streamed response body is produced, after the view has
+returned, are not seen.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+REPEATED_QUERY_THRESHOLD = 5
+
+current = ContextVar('captured_queries', default=None)
+
+# Only seen in tests and nested atomic blocks, not counted against the budgets.
+SAVEPOINTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(queries):
+    """Declares the most queries a request to the view may run."""
+    def decorator(view):
+        view.query_budget = queries
+        return view
+    return decorator
+
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s")
+LISTS = re.compile(r"\(\?(?:, \?)+\)")
+SPACES = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """The statement with its values and the length of its IN lists left out."""
+    return LISTS.sub('(...)', LITERALS.sub('?', SPACES.sub(' ', sql).strip()))
+
+
+def capture(execute, sql, params, many, context):
+    queries = current.get()
+    if queries is None or sql.startswith(SAVEPOINTS):
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries.append((sql, time.perf_counter() - started))
+
+
+def install(connection, **kwargs):
+    if capture not in connection.execute_wrappers:
+        connection.execute_wrappers.append(capture)
+
+
+def problems(queries):
+    """Messages about the repeated and the slow statements of a request."""
+    messages = []
+    repeated = Counter(fingerprint(sql) for sql, _ in queries)
+    for statement, count in repeated.most_common():
+        if count < REPEATED_QUERY_THRESHOLD:
+            break
+        messages.append(f'{count} times, likely N+1: {statement}')
+    for sql, duration in queries:
+        if duration * 1000 > settings.SLOW_QUERY_MS:
+            messages.append(f'slow, {duration * 1000:.0f}ms: {sql}')
+    return messages
+
+
+def summary(queries):
+    return '\n'.join(f'  {count} x {statement}'
+                     for statement, count in Counter(fingerprint(sql) for sql, _ in queries).most_common())
+
+
+class QueryInspectorMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(install)
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        queries = []
+        token = current.set(queries)
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        self.check(request, queries)
+        return response
+
+    async def __acall__(self, request):
+        queries = []
+        token = current.set(queries)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        self.check(request, queries)
+        return response
+
+    def check(self, request, queries):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return
+        for message in problems(queries):
+            logger.warning('%s %s', match.view_name, message)
+        budget = getattr(match.func, 'query_budget', None)
+        if budget is not None and len(queries) > budget:
+            message = (f'{match.view_name} ran {len(queries)} queries, over its budget of {budget}:\n'
+                       + summary(queries))
+            if settings.QUERY_INSPECTOR == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
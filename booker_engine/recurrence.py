@@ -0,0 +1,225 @@
+"""
+Lazy expansion of recurring bookings.
+
+A series is stored as one RecurringBooking row and its occurrences are only
+computed for the window being read or checked, so storage and range scans stay
+O(series) however long a series runs. Occurrences repeat the first one at the
+same local wall clock time, like an RRULE with its DTSTART in TIME_ZONE, and
+keep its duration. A monthly series started on the 31st skips the shorter
+months, as RRULE does. until/count bound the series, exceptions only hide
+occurrences without extending it.
+
+Single bookings are kept apart by the booking_no_overlap constraint, which
+cannot see occurrences. Booking writes therefore take a shared advisory lock on
+their room and check its series, series writes take it exclusively and check
+both. Series writes also bump the room's series_seq, which new bookings written
+in a single statement check instead (see insert.py).
+"""
+import calendar
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from . import versions
+from .models import Booking, RecurringBooking, Room
+
+MAX_OCCURRENCES = 1000
+# Occurrences are at most as long as a single booking.
+MAX_DURATION = timedelta(hours=6)
+LOCK_ID = 7_423
+SERIES_FIELDS = ('name', 'description', 'start', 'end', 'frequency', 'interval', 'exceptions', 'last_start', 'room')
+
+
+def nth_date(series, first, n):
+    """Local date of the n-th period, or None when a monthly series skips it."""
+    step = n * series.interval
+    if series.frequency == RecurringBooking.DAILY:
+        return first + timedelta(days=step)
+    if series.frequency == RecurringBooking.WEEKLY:
+        return first + timedelta(weeks=step)
+    months = first.month - 1 + step
+    year, month = first.year + months // 12, months % 12 + 1
+    if first.day > calendar.monthrange(year, month)[1]:
+        return None
+    return first.replace(year=year, month=month)
+
+
+def period_before(series, first, day):
+    """A period that starts no later than `day`, to begin a walk from."""
+    if series.frequency == RecurringBooking.MONTHLY:
+        months = (day.year - first.year) * 12 + day.month - first.month
+        return max(0, months // series.interval - 1)
+    days = 7 if series.frequency == RecurringBooking.WEEKLY else 1
+    return max(0, (day - first).days // (days * series.interval) - 1)
+
+
+def span(series):
+    """
+    Returns (number of occurrences, start of the last one) allowed by until and
+    count, with (0, None) for an empty series and (None, None) for one longer
+    than MAX_OCCURRENCES.
+    """
+    local = timezone.localtime(series.start)
+    first, at = local.date(), local.time()
+    found, last, n = 0, None, 0
+    while found < (series.count or MAX_OCCURRENCES + 1):
+        day = nth_date(series, first, n)
+        n += 1
+        if day is None:
+            continue
+        if series.until and day > series.until:
+            break
+        found, last = found + 1, day
+    if found > MAX_OCCURRENCES:
+        return None, None
+    return found, last and timezone.make_aware(datetime.combine(last, at))
+
+
+def occurrences(series, window_start=None, window_end=None):
+    """Yields (start, end) of the occurrences overlapping [window_start, window_end), in order."""
+    # Looked up once, get_current_timezone() is slow enough to show up per occurrence.
+    tz = timezone.get_current_timezone()
+    local = series.start.astimezone(tz)
+    first, at = local.date(), local.time()
+    duration = series.duration
+    exceptions = set(series.exceptions)
+    n = 0
+    if window_start is not None:
+        n = period_before(series, first, (window_start - duration).astimezone(tz).date())
+    while True:
+        day = nth_date(series, first, n)
+        n += 1
+        if day is None:
+            continue
+        start = datetime.combine(day, at, tzinfo=tz)
+        if start > series.last_start or (window_end is not None and start >= window_end):
+            return
+        if day in exceptions or (window_start is not None and start + duration <= window_start):
+            continue
+        yield start, start + duration
+
+
+# (series version, active series, series_seq by room) of this process,
+# reloaded when the version moves.
+loaded = (None, [], {})
+
+
+def load():
+    global loaded
+    version = versions.series_version()
+    if loaded[0] != version:
+        # Rooms first, so a series written in between makes the list look stale rather than current.
+        seqs = dict(Room.objects.values_list('id', 'series_seq'))
+        loaded = (version, list(RecurringBooking.objects.filter(active=True).select_related('userid')
+                                .only(*SERIES_FIELDS, 'userid__username')), seqs)
+    return loaded
+
+
+def active_series():
+    """All active series, for the read paths."""
+    return load()[1]
+
+
+def cached_room_series(room_id):
+    """
+    (series_seq, active series) of a room as this process last loaded them. The
+    series are current as long as the room's series_seq still is.
+    """
+    _, series, seqs = load()
+    # A room created since has no series, unless its series_seq moved on from 0.
+    return seqs.get(room_id, 0), [one for one in series if one.room_id == room_id]
+
+
+def occurrence_rows(room_id, window_start, window_end, overlapping=False):
+    """
+    Rows shaped like day_cache's for the occurrences in a room, every room for
+    None, starting in the window. With overlapping, those overlapping it, and
+    either end of the window may be None.
+    """
+    rows = []
+    for series in active_series():
+        if room_id is not None and series.room_id != room_id:
+            continue
+        if (window_end is not None and series.start >= window_end
+                or window_start is not None and series.last_end <= window_start):
+            continue
+        for start, end in occurrences(series, window_start, window_end):
+            if overlapping or start >= window_start:
+                rows.append({
+                    'id': None, 'name': series.name, 'description': series.description,
+                    'start': start, 'end': end, 'username': series.userid.username, 'series': series.id,
+                })
+    return rows
+
+
+def lock_for_booking(room_id):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock_shared(%s, %s)", [LOCK_ID, room_id])
+
+
+def lock_for_bookings(room_ids):
+    """lock_for_booking() for several rooms, in room order and one statement."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock_shared(%s, room_id) FROM unnest(%s::integer[]) AS room_id",
+                       [LOCK_ID, sorted(room_ids)])
+
+
+def lock_for_series(room_id):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [LOCK_ID, room_id])
+    # Also waits for the single statement inserts holding the room row, see insert.py.
+    Room.objects.filter(id=room_id).update(series_seq=F('series_seq') + 1)
+
+
+def occurrences_between(room_id, window_start, window_end, exclude=None):
+    """Sorted occurrences of a room's active series overlapping the window, read from the database."""
+    series = RecurringBooking.objects.filter(
+        room=room_id, active=True, start__lt=window_end, last_start__gt=window_start - MAX_DURATION
+    )
+    if exclude is not None:
+        series = series.exclude(id=exclude)
+    return sorted(occurrence for one in series for occurrence in occurrences(one, window_start, window_end))
+
+
+def occurrences_by_room(room_ids, window_start, window_end):
+    """{room id: sorted occurrences} of the rooms' active series overlapping the window, read with one query."""
+    series = RecurringBooking.objects.filter(
+        room__in=room_ids, active=True, start__lt=window_end, last_start__gt=window_start - MAX_DURATION
+    )
+    found = defaultdict(list)
+    for one in series:
+        found[one.room_id].extend(occurrences(one, window_start, window_end))
+    for spans in found.values():
+        spans.sort()
+    return found
+
+
+def overlapping(spans, others):
+    """
+    Positions of the (start, end) spans that overlap any of `others`, which must
+    be sorted and not overlap each other, so their ends are sorted as well.
+    """
+    starts = [start for start, _ in others]
+    ends = [end for _, end in others]
+    positions = set()
+    for position, (start, end) in enumerate(spans):
+        following = bisect_right(ends, start)
+        if following < len(starts) and starts[following] < end:
+            positions.add(position)
+    return positions
+
+
+def series_conflicts(series):
+    """Whether an occurrence overlaps an active booking or another series in its room. Call under lock_for_series()."""
+    spans = list(occurrences(series))
+    if not spans:
+        return False
+    window_start, window_end = spans[0][0], spans[-1][1]
+    bookings = (Booking.objects.filter(room=series.room_id, active=True, start__lt=window_end, end__gt=window_start)
+                .order_by('start').values_list('start', 'end'))
+    others = sorted(list(bookings) + occurrences_between(series.room_id, window_start, window_end, exclude=series.id))
+    return bool(overlapping(spans, others))
@@ -0,0 +1,43 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import authentication, availability, live, versions
+from .models import Booking, RecurringBooking
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, **kwargs):
+    live.notify(instance)
+    transaction.on_commit(lambda: availability.booking_saved(instance))
+    transaction.on_commit(lambda: versions.booking_changed(instance))
+
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted(sender, instance, **kwargs):
+    live.notify(instance)
+    transaction.on_commit(lambda: availability.booking_deleted(instance))
+    transaction.on_commit(lambda: versions.booking_changed(instance))
+
+
+@receiver(post_save, sender=RecurringBooking)
+@receiver(post_delete, sender=RecurringBooking)
+def series_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: availability.series_changed(instance))
+    transaction.on_commit(lambda: versions.series_changed(instance))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    authentication.forget(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    # Logging in only touches last_login, which cached tokens do not depend on.
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    for key in Token.objects.filter(user_id=instance.pk).values_list('key', flat=True):
+        authentication.forget(key)
@@ -1,16 +1,39 @@
-from django.test import TestCase
-from django.urls import reverse
+from django.conf import settings
+from django.test import AsyncClient, AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import resolve, reverse
 from django.utils import timezone
 from django.contrib.auth.models import User
-from datetime import timedelta
-from .models import Booking
-from .forms import BookingForm
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from .models import ArchivedBooking, Booking, RecurringBooking, Room
+from .forms import BookingAPIForm, BookingForm
+from . import async_api, availability, day_cache, recurrence
+from . import metrics as request_metrics
+from . import query_inspector
+from .query_inspector import QueryBudgetExceeded
+from .live import feed
+from .renderers import FastJSONRenderer
+from .views import live_events
+from asgiref.sync import async_to_sync, sync_to_async
+from unittest import mock
 from rest_framework.authtoken.models import Token
-from rest_framework.test import APITestCase
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+from concurrent.futures import ThreadPoolExecutor
+import csv
 import json
+from io import StringIO
+import threading
+import zoneinfo
 
 class BookingTestCase(TestCase):
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(username='testuser', password='12345')
         self.client.login(username='testuser', password='12345')
         
@@ -214,8 +237,135 @@ class BookingTestCase(TestCase):
         self.assertEqual(form.errors['time'], ['This field is required.'])
 
 
+    def test_14_get_bookings_not_modified(self):
+        url = reverse('get_bookings') + f'?date={timezone.localdate(self.start_time)}'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_15_all_bookings_range(self):
+        inactive = Booking.objects.create(
+            name="Cancelled Booking", start=self.start_time + timedelta(hours=2),
+            end=self.start_time + timedelta(hours=3), active=False, userid=self.user
+        )
+        later = Booking.objects.create(
+            name="Later Booking", start=self.start_time + timedelta(days=10),
+            end=self.start_time + timedelta(days=10, minutes=30), userid=self.user
+        )
+        url = reverse('all_bookings')
+        response = self.client.get(url, {
+            'start': (self.start_time - timedelta(minutes=10)).isoformat(),
+            'end': (self.start_time + timedelta(days=1)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(b''.join(response))
+        self.assertEqual([booking['name'] for booking in data], ['Test Booking'])
+        self.assertEqual(data[0]['start'], self.booking.start.isoformat())
+
+        data = json.loads(b''.join(self.client.get(url)))
+        self.assertEqual([booking['name'] for booking in data], ['Test Booking', 'Later Booking'])
+
+        self.assertEqual(self.client.get(url, {'start': 'yesterday'}).status_code, 400)
+
+        data = self.client.get(url, {'compact': '1'}).json()
+        self.assertEqual(data['days'], [timezone.localdate(self.start_time).isoformat(),
+                                        timezone.localdate(later.start).isoformat()])
+        self.assertEqual((data['counts'], data['name']), ([1, 1], ['Test Booking', 'Later Booking']))
+        self.assertEqual(data['start'][0], self.booking.start.timestamp())
+
+    def test_16_home_single_query(self):
+        Booking.objects.create(
+            name="Tomorrow Booking", start=self.start_time + timedelta(days=1),
+            end=self.start_time + timedelta(days=1, minutes=30), userid=self.user
+        )
+        Booking.objects.create(
+            name="Far Booking", start=self.start_time + timedelta(days=3),
+            end=self.start_time + timedelta(days=3, minutes=30), userid=self.user
+        )
+        # Session, user and one query for all three days, once the series are loaded.
+        recurrence.active_series()
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('home'))
+        self.assertEqual([booking.name for booking in response.context['today_list']], ['Test Booking'])
+        self.assertEqual([booking.name for booking in response.context['tomorrow_list']], ['Tomorrow Booking'])
+        self.assertEqual(list(response.context['after_tomorrow_list']), [])
+
+    def test_17_monthly_occurrences(self):
+        start = timezone.make_aware(datetime(2025, 1, 31, 9, 0))
+        series = RecurringBooking(start=start, end=start + timedelta(hours=1), frequency=RecurringBooking.MONTHLY,
+                                  interval=1, count=4, exceptions=[date(2025, 5, 31)], userid=self.user)
+        found, series.last_start = recurrence.span(series)
+        # February, April and June have no 31st and are skipped, not counted.
+        self.assertEqual((found, series.last_start), (4, timezone.make_aware(datetime(2025, 7, 31, 9, 0))))
+        self.assertEqual([timezone.localdate(start) for start, _ in recurrence.occurrences(series)],
+                         [date(2025, 1, 31), date(2025, 3, 31), date(2025, 7, 31)])
+        window = (timezone.make_aware(datetime(2025, 3, 31, 9, 30)), timezone.make_aware(datetime(2025, 8, 1)))
+        self.assertEqual([timezone.localdate(start) for start, _ in recurrence.occurrences(series, *window)],
+                         [date(2025, 3, 31), date(2025, 7, 31)])
+
+    def test_18_archive_bookings(self):
+        def book(name, start, **fields):
+            return Booking.objects.create(name=name, start=start, end=start + timedelta(hours=1), userid=self.user,
+                                          **fields)
+
+        old_start = self.start_time - timedelta(days=400)
+        old = book('Old Booking', old_start)
+        book('Old Cancelled', old_start + timedelta(hours=2), active=False)
+        recently_cancelled = book('Recently Cancelled', self.start_time + timedelta(days=2), active=False)
+        long_cancelled = book('Long Cancelled', self.start_time + timedelta(days=3), active=False)
+        Booking.objects.filter(id=long_cancelled.id).update(modified=self.start_time - timedelta(days=31))
+
+        out = StringIO()
+        call_command('archive_bookings', batch_size=2, stdout=out)
+        self.assertEqual(out.getvalue(), 'Archived 3 bookings\n')
+        self.assertEqual(set(Booking.objects.values_list('name', flat=True)), {'Test Booking', 'Recently Cancelled'})
+        archived = ArchivedBooking.objects.get(id=old.id)
+        self.assertEqual((archived.start, archived.room_id, archived.userid_id), (old.start, old.room_id, self.user.id))
+        self.assertEqual(ArchivedBooking.objects.filter(active=False).count(), 2)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM pg_inherits WHERE inhparent = 'booker_engine_archivedbooking'::regclass")
+            self.assertGreaterEqual(cursor.fetchone()[0], 2)
+
+        # Reads reaching before the cutoff see archived bookings, as if never moved.
+        response = self.client.get(reverse('get_bookings'), {'date': timezone.localdate(old_start).isoformat()})
+        self.assertEqual([booking['name'] for booking in response.json()], ['Old Booking'])
+        data = json.loads(b''.join(self.client.get(reverse('all_bookings'))))
+        self.assertEqual([booking['name'] for booking in data], ['Old Booking', 'Test Booking'])
+        data = self.client.get(reverse('all_bookings'), {'compact': '1'}).json()
+        self.assertEqual(data['name'], ['Old Booking', 'Test Booking'])
+        call_command('archive_bookings', stdout=out)
+        self.assertEqual(recently_cancelled, Booking.objects.get(name='Recently Cancelled'))
+
+    def test_19_all_bookings_occurrences(self):
+        start = self.start_time + timedelta(days=1)
+        series = RecurringBooking(name='Stand-up', start=start, end=start + timedelta(minutes=15),
+                                  frequency=RecurringBooking.DAILY, count=3, userid=self.user)
+        series.last_start = recurrence.span(series)[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            series.save()
+        url = reverse('all_bookings')
+        params = {'start': self.start_time.isoformat(), 'end': (start + timedelta(days=1, hours=1)).isoformat()}
+
+        # Occurrences are merged into the range by start, the one after it left out.
+        data = json.loads(b''.join(self.client.get(url, params)))
+        self.assertEqual([booking['name'] for booking in data], ['Test Booking', 'Stand-up', 'Stand-up'])
+        self.assertEqual(datetime.fromisoformat(data[1]['start']), start)
+        # Under ASGI the same list is streamed by the async iterator.
+        with override_settings(ASYNC_API=True):
+            self.assertEqual(json.loads(b''.join(self.client.get(url, params))), data)
+        data = self.client.get(url, dict(params, compact='1')).json()
+        self.assertEqual(data['name'], ['Test Booking', 'Stand-up', 'Stand-up'])
+        self.assertEqual(data['start'][1], start.timestamp())
+
+        response = self.client.get(reverse('home'))
+        self.assertEqual([booking.name for booking in response.context['tomorrow_list']], ['Stand-up'])
+
+
+
 class BookingAPITestCase(APITestCase):
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(username='testuser', password='12345')
         self.token = Token.objects.create(user=self.user)
         self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
@@ -355,4 +505,729 @@ class BookingAPITestCase(APITestCase):
         }
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, 400)
-        self.assertFalse(Booking.objects.filter(name='API Booking').exists())
\ No newline at end of file
+        self.assertFalse(Booking.objects.filter(name='API Booking').exists())
+
+    def test_12_free_slots(self):
+        availability.rebuild()
+        url = reverse('api_free_slots')
+        response = self.client.get(url, {
+            'start': (self.start_time - timedelta(hours=1)).isoformat(),
+            'end': (self.start_time + timedelta(hours=2)).isoformat(),
+            'duration': 45,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(response.data[0]['start'], self.start_time - timedelta(hours=1))
+        self.assertEqual(response.data[0]['end'], self.start_time)
+        self.assertEqual(response.data[1]['start'], self.end_time)
+
+    def test_13_free_slots_follow_writes(self):
+        availability.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('api_delete_booking') + f"?id={self.booking.id}")
+        url = reverse('api_free_slots')
+        response = self.client.get(url, {
+            'start': self.start_time.isoformat(),
+            'end': (self.start_time + timedelta(hours=1)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['end'] - response.data[0]['start'], timedelta(hours=1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('api_create_booking'), {
+                'name': 'API Booking',
+                'start': timezone.localtime(self.start_time).replace(tzinfo=None).isoformat(),
+                'end': timezone.localtime(self.end_time).replace(tzinfo=None).isoformat(),
+            })
+        response = self.client.get(url, {
+            'start': self.start_time.isoformat(),
+            'end': (self.start_time + timedelta(hours=1)).isoformat(),
+        })
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['start'], self.end_time)
+
+    def test_14_free_slots_missing_range(self):
+        response = self.client.get(reverse('api_free_slots'))
+        self.assertEqual(response.status_code, 400)
+
+    def test_15_day_cache(self):
+        url = reverse('api_get_day_bookings')
+        day = timezone.localdate(self.start_time)
+        before = day_cache.stats()
+        self.client.get(url, {'date': day.isoformat()})
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'date': day.isoformat()})
+        self.assertEqual(response.data[0]['id'], self.booking.id)
+        after = day_cache.stats()
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+
+    def test_16_day_cache_invalidated_on_move(self):
+        url = reverse('api_get_day_bookings')
+        day = timezone.localdate(self.start_time)
+        next_day = day + timedelta(days=1)
+        self.client.get(url, {'date': day.isoformat()})
+        self.client.get(url, {'date': next_day.isoformat()})
+
+        booking = Booking.objects.get(id=self.booking.id)
+        booking.start += timedelta(days=1)
+        booking.end += timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.save()
+
+        self.assertEqual(len(self.client.get(url, {'date': day.isoformat()}).data), 0)
+        self.assertEqual(len(self.client.get(reverse('api_get_week_bookings'), {'date': day.isoformat()}).data), 1)
+        self.assertEqual(len(self.client.get(url, {'date': next_day.isoformat()}).data), 1)
+
+    def test_17_day_not_modified(self):
+        url = reverse('api_get_day_bookings')
+        params = {'date': timezone.localdate(self.start_time).isoformat()}
+        etag = self.client.get(url, params)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('api_delete_booking') + f"?id={self.booking.id}")
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    @mock.patch('booker_engine.api.current_minute', lambda: 0)
+    def test_18_my_bookings_not_modified(self):
+        url = reverse('api_my_bookings')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        other = User.objects.create_user(username='otheruser', password='12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(name="Other", start=self.start_time + timedelta(days=2),
+                                   end=self.start_time + timedelta(days=2, minutes=30), userid=other)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_19_token_cached(self):
+        url = reverse('api_get_booking')
+        self.client.get(url, {'id': self.booking.id})
+        # Only the booking itself, the token is not looked up again.
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'id': self.booking.id})
+        self.assertEqual(response.status_code, 200)
+
+    def test_20_logout_forgets_token(self):
+        self.client.credentials()
+        response = self.client.post(reverse('api_login'), {'username': 'testuser', 'password': '12345'})
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + response.data['token'])
+        self.assertEqual(self.client.get(reverse('api_my_bookings')).status_code, 200)
+        self.assertEqual(self.client.post(reverse('api_logout')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('api_my_bookings')).status_code, 401)
+
+    def test_21_bulk_create(self):
+        start = timezone.localtime(self.start_time).replace(tzinfo=None, microsecond=0)
+        at = lambda minutes: (start + timedelta(minutes=minutes)).isoformat()
+        items = [
+            {'name': 'Later', 'start': at(120), 'end': at(150)},
+            {'name': 'Clashes with setUp', 'start': at(10), 'end': at(40)},
+            {'name': 'Too short', 'start': at(200), 'end': at(205)},
+            {'name': 'Earlier', 'start': at(60), 'end': at(90)},
+            {'name': 'Clashes with Earlier', 'start': at(80), 'end': at(100)},
+            {'name': 'Bad date', 'start': 'tomorrow', 'end': at(100)},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('api_bulk_create_bookings'), {'bookings': items}, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['created', 'error', 'error', 'created', 'error', 'error'])
+        self.assertIn('overlaps with an existing booking', response.data['results'][1]['errors']['__all__'][0])
+        self.assertIn('same request', response.data['results'][4]['errors']['__all__'][0])
+        self.assertEqual(Booking.objects.get(id=response.data['results'][0]['id']).userid, self.user)
+
+        # bulk_create skips the signals, the versions are bumped by hand.
+        day = timezone.localdate(self.start_time).isoformat()
+        names = [booking['name'] for booking in self.client.get(reverse('api_get_day_bookings'), {'date': day}).data]
+        self.assertIn('Earlier', names)
+
+    def test_22_bulk_create_query_count(self):
+        start = timezone.localtime(self.start_time).replace(tzinfo=None, microsecond=0) + timedelta(days=30)
+        rooms = [self.booking.room_id, Room.objects.create(name='Annex').id]
+
+        def import_bookings(offset, count):
+            # Half of them name their room, which is looked up once for the batch.
+            items = [{'name': f'Import {i}',
+                      'start': (start + timedelta(hours=offset + i)).isoformat(),
+                      'end': (start + timedelta(hours=offset + i, minutes=30)).isoformat(),
+                      **({'room': rooms[i // 2 % 2]} if i % 2 else {})}
+                     for i in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(reverse('api_bulk_create_bookings'), {'bookings': items}, format='json')
+            self.assertEqual(response.status_code, 201)
+            return len(queries)
+
+        import_bookings(0, 1)
+        self.assertEqual(import_bookings(10, 10), import_bookings(100, 200))
+        self.assertEqual(Booking.objects.filter(name__startswith='Import').count(), 211)
+
+    def test_23_recurring_booking(self):
+        first = timezone.localtime(self.start_time).replace(tzinfo=None, microsecond=0) + timedelta(days=1)
+        at = lambda days, minutes=0: (first + timedelta(days=days, minutes=minutes)).isoformat()
+        url = reverse('api_create_recurring_booking')
+        payload = {'name': 'Stand-up', 'start': at(0), 'end': at(0, 15), 'frequency': 'weekly', 'count': 10}
+
+        clash = dict(payload, start=at(-1), end=at(-1, 15))
+        response = self.client.post(url, clash, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('overlaps with an existing booking', response.data['__all__'][0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, dict(payload, exceptions=[(first + timedelta(days=14)).date().isoformat()]),
+                                        format='json')
+        self.assertEqual(response.status_code, 201)
+        series = RecurringBooking.objects.get(id=response.data['id'])
+        self.assertEqual(series.last_start, timezone.make_aware(first + timedelta(weeks=9)))
+
+        # Occurrences are expanded into the day and week responses, minus the exceptions.
+        week = self.client.get(reverse('api_get_week_bookings'), {'date': first.date().isoformat()}).data
+        self.assertEqual(week[first.date().isoformat()][0]['series'], series.id)
+        day = lambda days: self.client.get(reverse('api_get_day_bookings'),
+                                           {'date': (first + timedelta(days=days)).date().isoformat()}).data
+        self.assertEqual([row['name'] for row in day(7)], ['Stand-up'])
+        self.assertEqual(day(14), [])
+        self.assertEqual(day(70), [])
+
+        # Single bookings cannot be put on top of an occurrence, whether one by one or in bulk.
+        response = self.client.post(reverse('api_create_booking'),
+                                    {'name': 'Clash', 'start': at(7, 5), 'end': at(7, 30)}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('api_bulk_create_bookings'), {'bookings': [
+            {'name': 'Clash', 'start': at(21, 5), 'end': at(21, 30)},
+            {'name': 'Free', 'start': at(14, 5), 'end': at(14, 30)},
+        ]}, format='json')
+        self.assertEqual([result['status'] for result in response.data['results']], ['error', 'created'])
+
+        response = self.client.post(url, dict(payload, start=at(1), end=at(1, 15), frequency='daily'), format='json')
+        self.assertEqual(response.status_code, 400)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('api_cancel_occurrence'), {'id': series.id, 'date': (first + timedelta(days=7)).date().isoformat()})
+        self.assertEqual(day(7), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('api_delete_recurring_booking') + f'?id={series.id}')
+        self.assertEqual(day(28), [])
+
+    def test_24_rooms(self):
+        other = Room.objects.create(name='Board room')
+        start = timezone.localtime(self.start_time).replace(tzinfo=None, microsecond=0)
+        payload = {'name': 'Elsewhere', 'start': start.isoformat(), 'end': (start + timedelta(minutes=30)).isoformat()}
+
+        # The same slot is free in another room, but not twice in it.
+        self.assertEqual(self.client.post(reverse('api_create_booking'), payload, format='json').status_code, 400)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('api_create_booking'), dict(payload, room=other.id), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.client.post(reverse('api_create_booking'), dict(payload, room=other.id),
+                                          format='json').status_code, 400)
+        response = self.client.post(reverse('api_bulk_create_bookings'), {'bookings': [
+            dict(payload, room=other.id), dict(payload, start=(start + timedelta(hours=1)).isoformat(),
+                                                end=(start + timedelta(hours=2)).isoformat(), room=other.id),
+        ]}, format='json')
+        self.assertEqual([result['status'] for result in response.data['results']], ['error', 'created'])
+
+        url = reverse('api_get_day_bookings')
+        day = timezone.localdate(self.start_time).isoformat()
+        self.assertEqual([row['name'] for row in self.client.get(url, {'date': day}).data], ['Test Booking'])
+        self.assertEqual([row['name'] for row in self.client.get(url, {'date': day, 'room': other.id}).data],
+                         ['Elsewhere', 'Elsewhere'])
+        self.assertEqual(self.client.get(url, {'date': day, 'room': 'board'}).status_code, 400)
+        self.assertIn({'id': other.id, 'name': 'Board room', 'description': ''},
+                      self.client.get(reverse('api_rooms')).data)
+
+    @mock.patch('booker_engine.api.current_minute', lambda: 0)
+    def test_25_async_reads_match(self):
+        # The async views served under ASGI answer exactly like the DRF ones.
+        day = timezone.localdate(self.start_time).isoformat()
+        factory = AsyncRequestFactory()
+        for name, view, params in [
+            ('api_get_day_bookings', async_api.get_day, {'date': day}),
+            ('api_get_day_bookings', async_api.get_day, {'date': 'today'}),
+            ('api_get_day_bookings', async_api.get_day, {'date': day, 'room': 'board'}),
+            ('api_get_week_bookings', async_api.get_week, {'date': day}),
+            ('api_get_week_bookings', async_api.get_week, {'date': day, 'compact': '1'}),
+            ('api_my_bookings', async_api.my_bookings, {}),
+            ('api_get_booking', async_api.get_booking, {'id': self.booking.id}),
+            ('api_get_booking', async_api.get_booking, {'id': 0}),
+        ]:
+            expected = self.client.get(reverse(name), params)
+            request = factory.get(reverse(name), params, headers={'Authorization': 'Token ' + self.token.key})
+            response = async_to_sync(view)(request)
+            self.assertEqual((response.status_code, response.content), (expected.status_code, expected.content))
+            self.assertEqual(response.get('ETag'), expected.get('ETag'))
+
+        etag = self.client.get(reverse('api_my_bookings'))['ETag']
+        request = factory.get(reverse('api_my_bookings'),
+                              headers={'Authorization': 'Token ' + self.token.key, 'If-None-Match': etag})
+        self.assertEqual(async_to_sync(async_api.my_bookings)(request).status_code, 304)
+        for headers in [{}, {'Authorization': 'Token nope'}]:
+            response = async_to_sync(async_api.get_day)(factory.get(reverse('api_get_day_bookings'), headers=headers))
+            self.assertEqual(response.status_code, 401)
+
+    def test_26_compact_week(self):
+        first = timezone.localtime(self.start_time).replace(tzinfo=None, microsecond=0) + timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('api_create_recurring_booking'), {
+                'name': 'Stand-up', 'start': first.isoformat(), 'end': (first + timedelta(minutes=15)).isoformat(),
+                'frequency': 'daily', 'count': 3,
+            }, format='json')
+        url = reverse('api_get_week_bookings')
+        params = {'date': timezone.localdate(self.start_time).isoformat()}
+        week = self.client.get(url, params).data
+        data = self.client.get(url, dict(params, compact='1')).data
+
+        # Decoded, the columns give back the rows of every day.
+        self.assertEqual(len(data['days']), 9)
+        rows = iter(zip(data['id'], data['name'], data['description'], data['start'], data['end'], data['user'],
+                        data['series']))
+        decoded = {}
+        for day, count in zip(data['days'], data['counts']):
+            for _ in range(count):
+                id, name, description, start, end, user, series = next(rows)
+                decoded.setdefault(day, []).append({
+                    'id': id, 'name': name, 'description': description, 'start': start, 'end': end,
+                    'username': data['users'][user], **({'series': series} if series else {}),
+                })
+        expected = {day: [dict(row, start=row['start'].timestamp(), end=row['end'].timestamp()) for row in rows]
+                    for day, rows in week.items()}
+        self.assertEqual(decoded, expected)
+        self.assertEqual(data['users'], ['testuser'])
+
+        day = self.client.get(reverse('api_get_day_bookings'), dict(params, compact='1')).data
+        self.assertEqual((day['days'], day['counts'], day['name']), ([params['date']], [1], ['Test Booking']))
+
+    def test_27_fast_json_renderer(self):
+        london = zoneinfo.ZoneInfo('Europe/London')
+        form = BookingForm(data={})
+        form.is_valid()
+        data = {
+            'bookings': list(Booking.objects.values('id', 'name', 'start', 'end')),
+            'utc': datetime(2024, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc),
+            'local': timezone.localtime(self.start_time),
+            'zero_offset': datetime(2024, 1, 2, 3, 4, 5, 120000, tzinfo=london),
+            'naive': datetime(2024, 1, 2, 3, 4),
+            'day': date(2024, 1, 2),
+            'price': Decimal('1.50'),
+            'errors': form.errors,
+            'detail': ErrorDetail('Invalid token.', code='authentication_failed'),
+            'active': True,
+            'text': 'Çay\u2028ok\u2029 "quoted"',
+            2: None,
+        }
+        expected = JSONRenderer().render(data)
+        self.assertEqual(FastJSONRenderer().render(data), expected)
+        with mock.patch('booker_engine.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(data), expected)
+        self.assertEqual(FastJSONRenderer().render(data, 'application/json; indent=2'),
+                         JSONRenderer().render(data, 'application/json; indent=2'))
+
+        response = self.client.get(reverse('api_get_booking'), {'id': self.booking.id})
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    def test_28_request_metrics(self):
+        request_metrics.reset()
+        url = reverse('api_get_day_bookings')
+        params = {'date': self.start_time.date().isoformat()}
+        with override_settings(MIDDLEWARE=['booker_engine.metrics.RequestMetricsMiddleware', *settings.MIDDLEWARE]):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, params)
+            self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", total;dur=[\d.]+$')
+            self.assertIn(f'desc="{len(queries)} queries"', response['Server-Timing'])
+            async_response = async_to_sync(AsyncClient().get)(
+                url, params, headers={'Authorization': 'Token ' + self.token.key})
+            self.assertEqual(async_response.status_code, 200)
+            self.assertIn('Server-Timing', async_response)
+
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+            self.user.is_staff = True
+            self.user.save()
+            response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        lines = response.content.decode().splitlines()
+        self.assertIn('booker_request_duration_seconds_count{view="api_get_day_bookings"} 2', lines)
+        self.assertIn('booker_request_duration_seconds_bucket{view="api_get_day_bookings",le="+Inf"} 2', lines)
+        self.assertIn(f'booker_response_bytes_total{{view="api_get_day_bookings"}} '
+                      f'{len(async_response.content) * 2}', lines)
+        self.assertIn('booker_request_queries_count{view="metrics"} 1', lines)
+        self.assertNotIn('view="api_get_booking"', response.content.decode())
+
+    def test_29_query_inspector(self):
+        rooms = resolve(reverse('api_rooms')).func
+        self.assertEqual(self.client.get(reverse('api_rooms')).status_code, 200)
+        with mock.patch.object(rooms, 'query_budget', 0):
+            with self.assertRaisesRegex(QueryBudgetExceeded, r'api_rooms ran 1 queries, over its budget of 0'):
+                self.client.get(reverse('api_rooms'))
+            with override_settings(QUERY_INSPECTOR='warn'), self.assertLogs('booker_engine.query_inspector') as logs:
+                self.assertEqual(self.client.get(reverse('api_rooms')).status_code, 200)
+        self.assertIn('over its budget of 0', logs.output[0])
+
+        self.assertEqual(
+            query_inspector.fingerprint('SELECT "name" FROM "booker_engine_room" WHERE "id" IN (%s, %s)'),
+            query_inspector.fingerprint('SELECT "name"  FROM "booker_engine_room"\n WHERE "id" IN (%s, \'7\', 8)'),
+        )
+        queries = [(f'SELECT * FROM "auth_user" WHERE "id" = {user_id}', 0.001) for user_id in range(5)]
+        queries.append(('SELECT pg_sleep(1)', 1.0))
+        self.assertEqual(query_inspector.problems(queries), [
+            '5 times, likely N+1: SELECT * FROM "auth_user" WHERE "id" = ?',
+            'slow, 1000ms: SELECT pg_sleep(1)',
+        ])
+        self.assertEqual(query_inspector.problems(queries[1:5]), [])
+
+    def test_30_my_bookings_pages(self):
+        other_room = Room.objects.create(name='Annex')
+        start = self.start_time + timedelta(days=1)
+        for offset, room in [(0, other_room), (0, None), (1, None), (2, None), (2, other_room)]:
+            Booking.objects.create(name=f'Booking {offset}', start=start + timedelta(hours=offset),
+                                   end=start + timedelta(hours=offset, minutes=30), userid=self.user,
+                                   **({'room': room} if room else {}))
+        expected = list(Booking.objects.filter(start__gt=timezone.now()).order_by('start', 'id')
+                        .values_list('id', flat=True))
+
+        url = reverse('api_my_bookings')
+        ids, params = [], {'limit': 2}
+        while True:
+            data = self.client.get(url, params).data
+            self.assertLessEqual(len(data['results']), 2)
+            ids += [row['id'] for row in data['results']]
+            if not data['next']:
+                break
+            params['cursor'] = data['next']
+        self.assertEqual(ids, expected)
+        self.assertEqual(self.client.get(url, {'limit': 100}).data['results'], self.client.get(url).data)
+        for params in [{'cursor': 'nope'}, {'limit': 0}, {'since': '1.2.3'}]:
+            self.assertEqual(self.client.get(url, params).status_code, 400)
+
+    def test_31_bulk_update(self):
+        start = timezone.localtime(self.start_time).replace(tzinfo=None, microsecond=0)
+        at = lambda minutes: (start + timedelta(minutes=minutes)).isoformat()
+
+        def book(minutes, user=self.user):
+            return Booking.objects.create(name=f'At {minutes}', start=self.start_time + timedelta(minutes=minutes),
+                                          end=self.start_time + timedelta(minutes=minutes + 30), userid=user)
+
+        first, second, held, waiting = book(120), book(180), book(300), book(420)
+        other = book(600, User.objects.create_user(username='otheruser', password='12345'))
+        items = [
+            {'id': first.id, 'name': 'Moved', 'start': at(180), 'end': at(210)},
+            {'id': second.id, 'name': 'At 180', 'start': at(240), 'end': at(270)},
+            {'id': held.id, 'name': 'Clashes with setUp', 'start': at(10), 'end': at(40)},
+            {'id': waiting.id, 'name': 'Into the held slot', 'start': at(300), 'end': at(330)},
+            {'id': other.id, 'name': 'Not mine', 'start': at(600), 'end': at(630)},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('api_bulk_update_bookings'), {'bookings': items}, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['updated', 'updated', 'error', 'error', 'not_found'])
+        first.refresh_from_db()
+        self.assertEqual((first.name, first.start), ('Moved', timezone.make_aware(start + timedelta(minutes=180))))
+        self.assertEqual(Booking.objects.get(id=waiting.id).start, waiting.start)
+        self.assertEqual(Booking.objects.get(id=other.id).name, 'At 600')
+
+        # bulk_update skips the signals, the versions are bumped by hand.
+        day = timezone.localdate(first.start).isoformat()
+        names = [booking['name'] for booking in self.client.get(reverse('api_get_day_bookings'), {'date': day}).data]
+        self.assertIn('Moved', names)
+
+    def test_32_bulk_delete(self):
+        bookings = [Booking.objects.create(name=f'Booking {hours}', start=self.start_time + timedelta(hours=hours),
+                                           end=self.start_time + timedelta(hours=hours, minutes=30), userid=self.user)
+                    for hours in (1, 2)]
+        other_user = User.objects.create_user(username='otheruser', password='12345')
+        other = Booking.objects.create(name='Not mine', start=self.start_time + timedelta(hours=3),
+                                       end=self.start_time + timedelta(hours=3, minutes=30), userid=other_user)
+        ids = [booking.id for booking in bookings] + [other.id]
+
+        url = reverse('api_bulk_delete_bookings')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['deleted'], 2)
+        self.assertEqual([result['status'] for result in response.data['results']], ['deleted', 'deleted', 'not_found'])
+        self.assertEqual(sum(query['sql'].startswith('UPDATE') for query in queries.captured_queries), 1)
+        self.assertFalse(Booking.objects.filter(id__in=ids[:2], active=True).exists())
+        self.assertTrue(Booking.objects.get(id=other.id).active)
+
+        self.assertEqual(self.client.post(url, {'ids': ids}, format='json').status_code, 404)
+        self.assertEqual(self.client.post(url, {'ids': ['1']}, format='json').status_code, 400)
+
+    def test_33_create_booking_single_statement(self):
+        start = timezone.localtime(self.start_time).replace(tzinfo=None, microsecond=0) + timedelta(days=1)
+        at = lambda minutes: (start + timedelta(minutes=minutes)).isoformat()
+
+        def save(name, minutes):
+            form = BookingAPIForm(data={'name': name, 'start': at(minutes), 'end': at(minutes + 30)})
+            form.instance.userid = self.user
+            self.assertTrue(form.is_valid())
+            with CaptureQueriesContext(connection) as queries:
+                saved = form.save()
+            return saved, [query['sql'] for query in queries.captured_queries if 'SAVEPOINT' not in query['sql']]
+
+        recurrence.active_series()
+        booking, queries = save('Single', 0)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(Booking.objects.get(id=booking.id).name, 'Single')
+        self.assertEqual(save('Clash', 15)[0], None)
+
+        # The series commits its versions later, a stale copy of the series is not trusted.
+        response = self.client.post(reverse('api_create_recurring_booking'), {
+            'name': 'Daily', 'start': at(120), 'end': at(150), 'frequency': 'daily', 'count': 5,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(save('On the series', 24 * 60 + 120)[0], None)
+        self.assertIsNotNone(save('Next to the series', 24 * 60 + 150)[0])
+
+    def test_34_utilization(self):
+        def book(name, day, hour, minute, minutes):
+            start = timezone.make_aware(datetime(2025, 3, day, hour, minute))
+            return Booking.objects.create(name=name, start=start, end=start + timedelta(minutes=minutes), userid=self.user)
+
+        book('Two hours', 10, 9, 30, 90)
+        cancelled = book('Cancelled', 10, 14, 0, 60)
+        cancelled.active = False
+        cancelled.save()
+        moved = book('Moved', 11, 13, 0, 60)
+        moved.start, moved.end = moved.start + timedelta(days=1), moved.end + timedelta(days=1)
+        moved.save()
+
+        url = reverse('api_utilization')
+        data = self.client.get(url, {'month': '2025-03'}).json()
+        self.assertEqual((data['booked_minutes'], data['bookings'], data['cancellations']), (150, 2, 1))
+        self.assertEqual([(day['date'], day['booked_minutes']) for day in data['days']],
+                         [('2025-03-10', 90), ('2025-03-12', 60)])
+        self.assertEqual((data['hours'][9], data['hours'][10], data['hours'][13]), (30, 60, 60))
+        self.assertEqual(data['peak_hours'], [10, 13, 9])
+
+        # The rollups kept by the trigger are the ones rebuilt from the bookings.
+        call_command('backfill_utilization', batch_days=3, stdout=StringIO())
+        self.assertEqual(self.client.get(url, {'month': '2025-03'}).json(), data)
+        year = self.client.get(url, {'year': '2025'}).json()
+        self.assertEqual((year['booked_minutes'], year['days']), (150, data['days']))
+        self.assertEqual(self.client.get(url, {'month': 'March'}).status_code, 400)
+
+    def test_35_export(self):
+        start = self.start_time + timedelta(days=1)
+        Booking.objects.create(name='Design, review; v2', description='Agenda:\n' + 'ü' * 60, start=start,
+                               end=start + timedelta(hours=1), userid=self.user)
+        Booking.objects.create(name='Called off', start=start + timedelta(hours=2), end=start + timedelta(hours=3),
+                               userid=self.user, active=False)
+        url = reverse('api_export')
+        window = {'start': start.isoformat(), 'end': (start + timedelta(days=1)).isoformat()}
+
+        def export(**params):
+            response = self.client.get(url, dict(window, **params))
+            self.assertEqual(response.status_code, 200)
+            return response, b''.join(response.streaming_content).decode()
+
+        response, body = export(output='csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(StringIO(body)))
+        self.assertEqual(rows[0], ['id', 'name', 'description', 'start', 'end', 'active', 'room', 'username'])
+        self.assertEqual([(row[1], row[7]) for row in rows[1:]], [('Design, review; v2', 'testuser')])
+
+        _, body = export(output='ndjson', cancelled='1')
+        lines = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([(line['name'], line['active']) for line in lines],
+                         [('Design, review; v2', True), ('Called off', False)])
+
+        _, body = export(output='ics', cancelled='1')
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n') and body.endswith('END:VCALENDAR\r\n'))
+        self.assertEqual(body.count('BEGIN:VEVENT'), 2)
+        self.assertIn('SUMMARY:Design\\, review\\; v2\r\n', body)
+        self.assertIn('STATUS:CANCELLED', body)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in body.split('\r\n')))
+
+        out = StringIO()
+        call_command('export_bookings', format='ndjson', cancelled=True, start=window['start'], end=window['end'],
+                     stdout=out)
+        self.assertEqual(out.getvalue(), export(output='ndjson', cancelled='1')[1])
+        # Under ASGI the same chunks come from an async iterator.
+        with override_settings(ASYNC_API=True):
+            response = self.client.get(url, dict(window, output='ndjson', cancelled='1'))
+            self.assertEqual(b''.join(response).decode(), out.getvalue())
+        self.assertEqual(self.client.get(url, {'output': 'xml'}).status_code, 400)
+
+    def test_36_bulk_update_query_count(self):
+        start = self.start_time + timedelta(days=30)
+        rooms = [self.booking.room_id, Room.objects.create(name='Annex').id]
+        local = lambda value: timezone.localtime(value).replace(tzinfo=None).isoformat()
+
+        def move(offset, count):
+            bookings = Booking.objects.bulk_create(
+                Booking(name='Before', start=start + timedelta(hours=offset + i),
+                        end=start + timedelta(hours=offset + i, minutes=30), userid=self.user)
+                for i in range(count)
+            )
+            # Moved by a quarter of an hour, half of them into another room.
+            items = [{'id': booking.id, 'name': 'Moved', 'start': local(booking.start + timedelta(minutes=15)),
+                      'end': local(booking.end + timedelta(minutes=15)), 'room': rooms[i % 2]}
+                     for i, booking in enumerate(bookings)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(reverse('api_bulk_update_bookings'), {'bookings': items}, format='json')
+            self.assertEqual(response.data['updated'], count)
+            return len(queries)
+
+        move(0, 1)
+        self.assertEqual(move(10, 10), move(100, 200))
+
+    def test_37_free_slots_before_history(self):
+        availability.rebuild()
+        start = self.start_time - availability.HISTORY - timedelta(days=2)
+        Booking.objects.create(name='Past', start=start, end=start + timedelta(minutes=30), userid=self.user)
+        # Older than what the index loaded, so the window is read from the database.
+        response = self.client.get(reverse('api_free_slots'), {
+            'start': (start - timedelta(minutes=30)).isoformat(),
+            'end': (start + timedelta(hours=1)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(slot['start'], slot['end']) for slot in response.data],
+                         [(start - timedelta(minutes=30), start), (start + timedelta(minutes=30), start + timedelta(hours=1))])
+
+
+class LiveStreamTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.start_time = timezone.now()
+        self.booking = Booking.objects.create(
+            name="Live Booking",
+            start=self.start_time,
+            end=self.start_time + timedelta(minutes=30),
+            userid=self.user
+        )
+
+    # The Postgres listener is not started, changes are published by hand.
+    @mock.patch.object(feed, 'listen', lambda: None)
+    async def test_1_snapshot_then_changes(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('live_stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+
+        snapshot = await anext(events)
+        self.assertTrue(snapshot.startswith(b'event: snapshot'))
+        self.assertIn(b'Live Booking', snapshot)
+
+        self.booking.name = "Renamed Booking"
+        await sync_to_async(self.booking.save)()
+        await feed.publish(self.booking.id, [(self.booking.room_id, timezone.localdate(self.start_time))])
+        upsert = await anext(events)
+        self.assertTrue(upsert.startswith(b'event: upsert'))
+        self.assertIn(b'Renamed Booking', upsert)
+
+        self.booking.active = False
+        await sync_to_async(self.booking.save)()
+        await feed.publish(self.booking.id, [(self.booking.room_id, timezone.localdate(self.start_time))])
+        delete = await anext(events)
+        self.assertEqual(delete, f'event: delete\ndata: {{"id": {self.booking.id}}}\n\n'.encode())
+
+    async def test_2_requires_login(self):
+        response = await self.async_client.get(reverse('live_stream'))
+        self.assertEqual(response.status_code, 401)
+
+    @mock.patch.object(feed, 'listen', lambda: None)
+    async def test_3_unsubscribes_when_closed(self):
+        key = (self.booking.room_id, timezone.localdate(self.start_time))
+        watching = len(feed.subscribers.get(key, ()))
+        events = live_events(*key)
+        await anext(events)
+        self.assertEqual(len(feed.subscribers[key]), watching + 1)
+        await events.aclose()
+        self.assertEqual(len(feed.subscribers.get(key, ())), watching)
+
+class BookingConcurrencyTestCase(TransactionTestCase):
+    # Keeps the default room created by the migrations across the table flushes.
+    serialized_rollback = True
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.token = Token.objects.create(user=self.user)
+
+    def test_1_parallel_create_same_slot(self):
+        workers = 8
+        start = timezone.now() + timedelta(days=1)
+        barrier = threading.Barrier(workers)
+
+        def create(i):
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+            data = {
+                'name': f'Parallel Booking {i}',
+                'description': 'Parallel Description',
+                'start': start.isoformat(),
+                'end': (start + timedelta(minutes=30)).isoformat(),
+            }
+            try:
+                barrier.wait()
+                response = client.post(reverse('api_create_booking'), data)
+                return response.status_code, response.data
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(create, range(workers)))
+
+        statuses = sorted(code for code, _ in results)
+        self.assertEqual(statuses, [201] + [400] * (workers - 1))
+        for code, data in results:
+            if code == 400:
+                self.assertIn("This booking overlaps with an existing booking.", data['__all__'])
+        self.assertEqual(Booking.objects.filter(active=True).count(), 1)
+
+    def test_2_my_bookings_sync(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        url = reverse('api_my_bookings')
+        start = timezone.now() + timedelta(days=1)
+
+        def book(offset):
+            return Booking.objects.create(name=f'Booking {offset}', start=start + timedelta(hours=offset),
+                                          end=start + timedelta(hours=offset, minutes=30), userid=self.user)
+
+        first, second, third = book(0), book(1), book(2)
+        data = client.get(url, {'since': '0', 'limit': 2}).data
+        self.assertEqual(([row['id'] for row in data['results']], data['more']), ([first.id, second.id], True))
+        data = client.get(url, {'since': data['next'], 'limit': 2}).data
+        self.assertEqual(([row['id'] for row in data['results']], data['more']), ([third.id], False))
+        token = data['next']
+        self.assertEqual(client.get(url, {'since': token}).data['results'], [])
+
+        client.delete(f"{reverse('api_delete_booking')}?id={first.id}")
+        Booking.objects.filter(id=third.id).update(name='Renamed')
+        data = client.get(url, {'since': token}).data
+        self.assertEqual([(row['id'], row['active'], row['name']) for row in data['results']],
+                         [(first.id, False, 'Booking 0'), (third.id, True, 'Renamed')])
+        token = data['next']
+
+        # A write still in flight when a sync runs is sent by the next one, even
+        # if a later transaction committed first.
+        written, release = threading.Event(), threading.Event()
+
+        def slow_writer():
+            try:
+                with transaction.atomic():
+                    book(3)
+                    written.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=slow_writer)
+        writer.start()
+        written.wait(10)
+        fifth = book(4)
+        data = client.get(url, {'since': token}).data
+        self.assertEqual(data['results'], [])
+        release.set()
+        writer.join()
+        data = client.get(url, {'since': data['next']}).data
+        self.assertEqual([row['name'] for row in data['results']], ['Booking 3', fifth.name])
@@ -1,8 +1,12 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views, api
+from . import views, api, async_api
 from rest_framework.authtoken.views import obtain_auth_token
 
+# Async views for the read-only API under ASGI, see settings.ASYNC_API.
+reads = async_api if settings.ASYNC_API else api
+
 urlpatterns = [
     path('signup/', views.signup_view, name='signup'),
     path('login/', views.login_view, name='login'),
@@ -11,20 +15,33 @@ urlpatterns = [
     path('booking/<int:id>/delete/', views.delete_booking, name="delete_booking"),
     path('all_bookings/', views.all_bookings, name="all_bookings"),
     path('liveview/', views.live_view, name="live_view"),
+    path('liveview/stream', views.live_stream, name="live_stream"),
     path('get-bookings', views.get_bookings, name='get_bookings'),
     path("calendar/", views.calendar, name="calendar"),
     path("create_booking/", views.create_booking, name="create_booking"),
     path("home/", views.home, name="home"),
     path("",views.index, name="index" ),
-    path("api/login", api.login, name="api_login"),
-    path("api/logout", api.logout, name="api_logout"),
+    path("api/login", api.login_view, name="api_login"),
+    path("api/logout", api.logout_view, name="api_logout"),
     path('api/token', obtain_auth_token, name='api_token_auth'),
-    path('api/get_day_bookings', api.get_day, name='api_get_day_bookings'),
-    path('api/get_week_bookings', api.get_week, name='api_get_week_bookings'),
+    path('api/get_day_bookings', reads.get_day, name='api_get_day_bookings'),
+    path('api/get_week_bookings', reads.get_week, name='api_get_week_bookings'),
     path('api/create_booking',api.create_booking, name='api_create_booking'),
-    path('api/my_bookings', api.my_bookings, name='api_my_bookings'),
-    path('api/get_booking', api.get_booking, name='api_get_booking'),
+    path('api/bulk_create_bookings', api.bulk_create_bookings, name='api_bulk_create_bookings'),
+    path('api/my_bookings', reads.my_bookings, name='api_my_bookings'),
+    path('api/get_booking', reads.get_booking, name='api_get_booking'),
     path('api/delete_booking', api.delete_booking, name='api_delete_booking'),
     path('api/update_booking',api.update_booking, name='api_update_booking'),
+    path('api/bulk_update_bookings', api.bulk_update_bookings, name='api_bulk_update_bookings'),
+    path('api/bulk_delete_bookings', api.bulk_delete_bookings, name='api_bulk_delete_bookings'),
+    path('api/create_recurring_booking', api.create_recurring_booking, name='api_create_recurring_booking'),
+    path('api/delete_recurring_booking', api.delete_recurring_booking, name='api_delete_recurring_booking'),
+    path('api/cancel_occurrence', api.cancel_occurrence, name='api_cancel_occurrence'),
+    path('api/rooms', api.rooms, name='api_rooms'),
+    path('api/free_slots', api.free_slots, name='api_free_slots'),
+    path('api/utilization', api.utilization_stats, name='api_utilization'),
+    path('api/export', api.export_bookings, name='api_export'),
+    path('api/cache_stats', api.cache_stats, name='api_cache_stats'),
+    path('metrics', api.metrics, name='metrics'),
 
 ]
\ No newline at end of file
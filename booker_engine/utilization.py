@@ -0,0 +1,132 @@
+"""
+Room utilization stats from hourly rollups.
+
+UtilizationRollup keeps, per room and UTC hour, the booked time of active
+bookings, the bookings starting in the hour and the soft deleted ones. The
+booking_rollup trigger (migration 0014) adds every INSERT, UPDATE and DELETE
+on the booking table to it in the writing transaction, so bulk writes and raw
+SQL are counted as well. Moves to and from the archive are not, the archive
+keeps its history in the stats.
+
+A month or a year of a room is then at most 24 rows a day to add up, however
+many bookings there were. Recurring occurrences are not stored, they are
+expanded for the requested range and added on read. Days and hours of day are
+local to TIME_ZONE, which has to be a whole number of hours off UTC for the
+hourly rows to fall into a single local hour.
+
+backfill() rebuilds the rollups from the booking and archive tables, one
+window at a time. It locks the rollup table while replacing a window, so
+writes that would change the rollups wait for it rather than getting lost.
+"""
+import time
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from . import recurrence
+from .days import midnight
+from .models import ArchivedBooking, Booking, UtilizationRollup
+
+HOUR = timedelta(hours=1)
+
+BACKFILL = '''
+INSERT INTO "booker_engine_utilizationrollup" ("room_id", "hour", "booked_seconds", "bookings", "cancellations")
+SELECT "room_id", h."hour", sum(h."booked_seconds"), sum(h."bookings"), sum(h."cancellations")
+FROM (
+    SELECT "room_id", "start", "end", "active" FROM "booker_engine_booking" WHERE "start" >= %s AND "start" < %s
+    UNION ALL
+    SELECT "room_id", "start", "end", "active" FROM "booker_engine_archivedbooking" WHERE "start" >= %s AND "start" < %s
+) AS b, booking_rollup_hours(b."start", b."end", b."active") AS h
+WHERE h."hour" >= %s AND h."hour" < %s
+GROUP BY "room_id", h."hour"
+'''
+
+
+def hours(start, end):
+    """Yields (hour, seconds) for the UTC hours [start, end) covers."""
+    hour = start.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    while hour < end:
+        yield hour, (min(end, hour + HOUR) - max(start, hour)).total_seconds()
+        hour += HOUR
+
+
+def occurrence_rows(room_id, range_start, range_end):
+    """Rollup rows, (hour, booked_seconds, bookings, cancellations), of a room's occurrences in the range."""
+    _, series = recurrence.cached_room_series(room_id)
+    for one in series:
+        for start, end in recurrence.occurrences(one, range_start, range_end):
+            for position, (hour, seconds) in enumerate(hours(max(start, range_start), min(end, range_end))):
+                yield hour, seconds, int(position == 0 and start >= range_start), 0
+
+
+def stats(room_id, first_day, last_day):
+    """Utilization of a room over the local days [first_day, last_day)."""
+    range_start, range_end = midnight(first_day), midnight(last_day)
+    rows = list(UtilizationRollup.objects.filter(room=room_id, hour__gte=range_start, hour__lt=range_end)
+                .values_list('hour', 'booked_seconds', 'bookings', 'cancellations'))
+    rows += occurrence_rows(room_id, range_start, range_end)
+
+    days = defaultdict(lambda: [0, 0, 0])
+    hours_of_day = [0] * 24
+    tz = timezone.get_current_timezone()
+    for hour, seconds, bookings, cancellations in rows:
+        if not (seconds or bookings or cancellations):
+            # Left at zero by the trigger when its only booking moved away.
+            continue
+        local = hour.astimezone(tz)
+        day = days[local.date()]
+        day[0] += seconds
+        day[1] += bookings
+        day[2] += cancellations
+        hours_of_day[local.hour] += seconds
+
+    booked = sum(day[0] for day in days.values())
+    minutes = lambda seconds: round(seconds / 60)
+    return {
+        'room': room_id,
+        'start': first_day,
+        'end': last_day,
+        'booked_minutes': minutes(booked),
+        'bookings': sum(day[1] for day in days.values()),
+        'cancellations': sum(day[2] for day in days.values()),
+        'utilization': round(booked / (range_end - range_start).total_seconds(), 4),
+        'days': [{'date': day, 'booked_minutes': minutes(seconds), 'bookings': bookings, 'cancellations': cancellations}
+                 for day, (seconds, bookings, cancellations) in sorted(days.items())],
+        'hours': [minutes(seconds) for seconds in hours_of_day],
+        'peak_hours': sorted((hour for hour in range(24) if hours_of_day[hour]),
+                             key=lambda hour: -hours_of_day[hour])[:3],
+    }
+
+
+def rebuild(window_start, window_end):
+    """Replaces the rollups of the UTC hours [window_start, window_end) with ones computed from the bookings."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Writers add to the rollups in their own transaction. Those that did wait
+        # to commit before the lock is granted, the others wait for this one.
+        cursor.execute('LOCK TABLE "booker_engine_utilizationrollup" IN SHARE ROW EXCLUSIVE MODE')
+        UtilizationRollup.objects.filter(hour__gte=window_start, hour__lt=window_end).delete()
+        # Bookings that started before the window may still run into it.
+        earliest = window_start - recurrence.MAX_DURATION
+        cursor.execute(BACKFILL, [earliest, window_end, earliest, window_end, window_start, window_end])
+
+
+def backfill(batch_days=7, pause=0, log=None):
+    """Rebuilds the rollups of every booking and archived booking, batch_days at a time. Returns how many days."""
+    spans = [model.objects.aggregate(first=Min('start'), last=Max('end')) for model in (Booking, ArchivedBooking)]
+    firsts = [span['first'] for span in spans if span['first']]
+    if not firsts:
+        return 0
+    first = min(firsts).astimezone(dt_timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    last = max(span['last'] for span in spans if span['last'])
+    window_start = first
+    while window_start < last:
+        window_end = window_start + timedelta(days=batch_days)
+        rebuild(window_start, window_end)
+        if log:
+            log(f"Rebuilt the rollups up to {window_end:%Y-%m-%d}")
+        window_start = window_end
+        time.sleep(pause)
+    return (window_start - first).days
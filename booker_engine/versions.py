@@ -0,0 +1,75 @@
+"""
+Change versions for booking data, kept in the cache.
+
+Every calendar day of every room, every user and the booking table as a whole
+has a version.
+A version is the time of the last write that touched it, in nanoseconds, so it
+can serve both as a cache key component and as a Last-Modified date. A missing
+version (never set, or evicted) is started at the current time. That is always
+later than whatever a client or the cache saw before, so it never makes stale
+data look current.
+"""
+import time
+
+from django.core.cache import cache
+from django.utils import timezone
+
+
+def day_key(room_id, day):
+    return f'booking-version:day:{room_id}:{day.isoformat()}'
+
+
+def user_key(user_id):
+    return f'booking-version:user:{user_id}'
+
+
+ALL_KEY = 'booking-version:all'
+SERIES_KEY = 'booking-version:series'
+
+
+def get_many(keys):
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return versions
+
+
+def day_versions(room_id, days):
+    versions = get_many([day_key(room_id, day) for day in days] + [SERIES_KEY])
+    # A series write may touch any day it repeats on, so it counts for all of them.
+    return {day: max(versions[day_key(room_id, day)], versions[SERIES_KEY]) for day in days}
+
+
+def user_version(user_id):
+    return get_many([user_key(user_id)])[user_key(user_id)]
+
+
+def all_version():
+    return get_many([ALL_KEY])[ALL_KEY]
+
+
+def series_version():
+    return get_many([SERIES_KEY])[SERIES_KEY]
+
+
+def bump(room_days=(), user_ids=(), series=False):
+    stamp = time.time_ns()
+    keys = [day_key(room_id, day) for room_id, day in set(room_days)] + [user_key(user_id) for user_id in set(user_ids)] + [ALL_KEY]
+    if series:
+        keys.append(SERIES_KEY)
+    cache.set_many({key: stamp for key in keys}, timeout=None)
+
+
+def booking_changed(booking):
+    # Runs on commit, so the stamp is later than any version a reader created
+    # while the write was still in flight.
+    room_days = [(booking.room_id, timezone.localdate(booking.start))]
+    if getattr(booking, 'loaded_start', None) is not None:
+        room_days.append((booking.loaded_room, timezone.localdate(booking.loaded_start)))
+    bump(room_days, [booking.userid_id])
+
+
+def series_changed(series):
+    bump(user_ids=[series.userid_id], series=True)
@@ -1,4 +1,5 @@
-from django.http import HttpResponse, JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.template import loader
 from django.shortcuts import redirect, get_object_or_404, render
 from datetime import datetime, timedelta
@@ -6,34 +7,61 @@ from django.utils import timezone
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required
-from django.db.models import F
+from django.db import connection
+from django.db.models.functions import TruncDate
+from django.core.serializers.json import DjangoJSONEncoder
+from asgiref.sync import sync_to_async
+from operator import attrgetter, itemgetter
+from types import SimpleNamespace
+import asyncio
+import heapq
+import json
+import threading
 
-from .models import Booking
+from . import archive, compact, day_cache, recurrence, versions
+from .days import bucket_by_day, day_bounds, window_bounds
+from .live import feed
+from .conditional import conditional
+from .models import Booking, Room
 from .forms import BookingForm, SignUpForm, LoginForm, DateForm
+from .query_inspector import query_budget
 
-def last_midnight():
-    return timezone.make_aware(datetime.combine(timezone.now().date(), datetime.min.time()))
+def room_param(request):
+    try:
+        return Room.id_param(request.GET.get('room'))
+    except ValueError:
+        return None
 
-def today_midnight():
-    return last_midnight() + timedelta(days=1)
 
-def tomorrow_midnight():
-    return today_midnight() + timedelta(days=1)
+def day_versions(request):
+    form = DateForm(request.GET)
+    room_id = room_param(request)
+    if form.is_valid() and room_id:
+        day = form.cleaned_data['date']
+        return list(versions.day_versions(room_id, [day]).values())
+    return None
+
 
-def after_tomorrow_midnight():
-    return today_midnight() + timedelta(days=2)
+def all_versions(request):
+    return [versions.all_version()]
 
+@query_budget(5)
 @login_required()
 def home(request):
-    today_list = Booking.objects.filter(
-        start__gte=last_midnight(), start__lt=today_midnight(), active=True
-    ).select_related('userid').order_by("start")
-    tomorrow_list = Booking.objects.filter(
-        start__gte=today_midnight(), start__lt=tomorrow_midnight(), active=True
-    ).select_related('userid').order_by("start")
-    after_tomorrow_list = Booking.objects.filter(
-        start__gte=tomorrow_midnight(), start__lt=after_tomorrow_midnight(), active=True
+    today = timezone.localdate()
+    days = [today + timedelta(days=offset) for offset in range(3)]
+    window_start, window_end = window_bounds(today, len(days))
+    bookings = Booking.objects.filter(
+        start__gte=window_start, start__lt=window_end, active=True
     ).select_related('userid').order_by("start")
+    # Occurrences look like bookings to the template, without an id to link to.
+    occurrences = sorted(
+        (SimpleNamespace(**row, userid=SimpleNamespace(username=row['username']))
+         for row in recurrence.occurrence_rows(None, window_start, window_end)),
+        key=attrgetter('start'),
+    )
+    bookings = heapq.merge(bookings, occurrences, key=attrgetter('start'))
+    today_list, tomorrow_list, after_tomorrow_list = bucket_by_day(bookings, days).values()
 
     template = loader.get_template("booker/home.html")
     context = {
@@ -43,70 +71,201 @@ def home(request):
     }
     return HttpResponse(template.render(context, request))
 
+@query_budget(9)
 @login_required()
 def create_booking(request):
     if request.method == "POST":
         form = BookingForm(request.POST)
-        if form.is_valid():
-            booking = Booking(
-                name=form.cleaned_data["name"],
-                description=form.cleaned_data["description"],
-                start=form.cleaned_data["start"],
-                end=form.cleaned_data["end"],
-                userid=request.user  # Use request.user instead of request.user.id
-            )
-            booking.save()
+        form.instance.userid = request.user
+        if form.is_valid() and form.save():
             return redirect("home")
     else:
         form = BookingForm()
     return render(request, "booker/create_booking.html", {"form": form})
 
+@query_budget(3)
 @login_required()
 def calendar(request):
-    return render(request, "booker/calendar.html")
+    return render(request, "booker/calendar.html", {"rooms": Room.objects.order_by("name"), "room": room_param(request)})
+
+MAX_BOOKING_LENGTH = timedelta(hours=6)
+ALL_BOOKINGS_CHUNK_SIZE = 2000
+
+def parse_range_param(value):
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
 
+def merge_occurrences(bookings, occurrences):
+    """The rows of the bookings and the occurrence rows, both ordered by start, in start order."""
+    return heapq.merge(bookings.iterator(chunk_size=ALL_BOOKINGS_CHUNK_SIZE), occurrences, key=itemgetter('start'))
+
+async def amerge_occurrences(bookings, occurrences):
+    """Async merge_occurrences()."""
+    occurrences = iter(occurrences)
+    pending = next(occurrences, None)
+    async for booking in bookings.aiterator(chunk_size=ALL_BOOKINGS_CHUNK_SIZE):
+        while pending is not None and pending['start'] < booking['start']:
+            yield pending
+            pending = next(occurrences, None)
+        yield booking
+    if pending is not None:
+        yield pending
+    for pending in occurrences:
+        yield pending
+
+def booking_json(booking):
+    return json.dumps({
+        'name': booking['name'],
+        'start': booking['start'].isoformat(),
+        'end': booking['end'].isoformat(),
+    })
+
+def stream_json_list(bookings):
+    # WSGI servers send a sync iterator as it is read.
+    yield '['
+    separator = ''
+    for booking in bookings:
+        yield separator + booking_json(booking)
+        separator = ','
+    yield ']'
+
+async def astream_json_list(bookings):
+    # ASGI servers buffer a sync iterator whole, an async one is sent chunk by chunk.
+    yield '['
+    separator = ''
+    async for booking in bookings:
+        yield separator + booking_json(booking)
+        separator = ','
+    yield ']'
+
+@query_budget(6)
 @login_required()
+@conditional(all_versions)
 def all_bookings(request):
-    all_bookings = Booking.objects.all()
-    out = []
-    for booking in all_bookings:
-        out.append({
-            'name' : booking.name,
-            'start' : booking.start.isoformat(),
-            'end' : booking.end.isoformat(),
-        })
-    return JsonResponse(out, safe=False)
+    try:
+        range_start = parse_range_param(request.GET.get('start'))
+        range_end = parse_range_param(request.GET.get('end'))
+    except ValueError:
+        return JsonResponse({'errors': 'start and end must be ISO 8601 datetimes'}, status=400)
+
+    room_id = room_param(request)
+    if not room_id:
+        return JsonResponse({'errors': 'room must be a room id'}, status=400)
 
+    columns = {'day': TruncDate('start')} if compact.requested(request) else {}
+
+    def in_range(model):
+        bookings = model.objects.filter(room=room_id, active=True)
+        if range_end:
+            bookings = bookings.filter(start__lt=range_end)
+        if range_start:
+            # The lower bound on start keeps the scan on the start index, bookings
+            # last at most MAX_BOOKING_LENGTH.
+            bookings = bookings.filter(end__gt=range_start, start__gt=range_start - MAX_BOOKING_LENGTH)
+        return bookings.values('name', 'start', 'end', **columns)
+
+    bookings = archive.including_archive(in_range, range_start and range_start - MAX_BOOKING_LENGTH).order_by('start')
+    occurrences = sorted(recurrence.occurrence_rows(room_id, range_start, range_end, overlapping=True),
+                         key=itemgetter('start'))
+    # The compact encoding is columnar, so it is built whole in memory rather
+    # than streamed. Ranges too large for that should be read without compact.
+    if compact.requested(request):
+        tz = timezone.get_current_timezone()
+        for row in occurrences:
+            row['day'] = row['start'].astimezone(tz).date()
+        rows = heapq.merge(bookings, occurrences, key=itemgetter('start'))
+        return JsonResponse(compact.encode_rows(rows, ('name', 'start', 'end')))
+
+    if settings.ASYNC_API:
+        content = astream_json_list(amerge_occurrences(bookings, occurrences))
+    else:
+        content = stream_json_list(merge_occurrences(bookings, occurrences))
+    return StreamingHttpResponse(content, content_type='application/json')
+
+@query_budget(5)
 @login_required()
+@conditional(day_versions)
 def get_bookings(request):
     form = DateForm(request.GET)
-    if form.is_valid():
+    room_id = room_param(request)
+    if form.is_valid() and room_id:
         fetched_date = form.cleaned_data['date']
-        start_of_day = timezone.make_aware(datetime.combine(fetched_date, datetime.min.time()))
-        end_of_day = timezone.make_aware(datetime.combine(fetched_date + timedelta(days=1), datetime.min.time()) - timedelta(seconds=1))
-        
-        bookings = Booking.objects.filter(start__gt=start_of_day, start__lt=end_of_day, active=True).select_related('userid').order_by("start")
-        bookings_list = list(bookings.values('name', 'description', 'start', 'end', username=F('userid__username')))
+        bookings_list = [
+            {key: value for key, value in booking.items() if key != 'id'}
+            for booking in day_cache.get_day(room_id, fetched_date)
+        ]
         return JsonResponse(bookings_list, safe=False)
     
-    return JsonResponse({'errors': form.errors}, status=400)
+    return JsonResponse({'errors': form.errors or {'room': ['Enter a room id.']}}, status=400)
 
+@query_budget(3)
 @login_required()
 def live_view(request):
-    return render(request, "booker/live_view.html")
+    return render(request, "booker/live_view.html", {"rooms": Room.objects.order_by("name"), "room": room_param(request)})
+
+LIVE_KEEPALIVE_SECONDS = 25
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
 
+live_db_slots = threading.BoundedSemaphore(10)
+
+def with_connection_released(func, *args):
+    # Streams outlive the request cycle that normally closes the database
+    # connection, and every display reconnects at once after a deploy. Bound
+    # how many of them use the database at a time and give the connection back
+    # straight away instead of holding one per subscriber.
+    with live_db_slots:
+        try:
+            return func(*args)
+        finally:
+            if not connection.in_atomic_block:
+                connection.close()
+
+async def live_events(room_id, day):
+    # Subscribe before taking the snapshot so no change can fall in between.
+    queue = feed.subscribe(room_id, day)
+    try:
+        yield sse_event('snapshot', await sync_to_async(with_connection_released)(day_cache.get_day, room_id, day))
+        # The stream ends at midnight and the browser reconnects for the new day.
+        end_of_day = day_bounds(day)[1]
+        while (remaining := (end_of_day - timezone.now()).total_seconds()) > 0:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), min(LIVE_KEEPALIVE_SECONDS, remaining))
+                yield sse_event(event, data)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+    finally:
+        feed.unsubscribe(room_id, day, queue)
+
+@query_budget(2)
+async def live_stream(request):
+    # Server-Sent Events of today's bookings in a room, served by the ASGI application.
+    if not await sync_to_async(with_connection_released)(lambda: request.user.is_authenticated):
+        return HttpResponse(status=401)
+    room_id = await sync_to_async(with_connection_released)(room_param, request)
+    if not room_id:
+        return HttpResponse(status=400)
+    response = StreamingHttpResponse(live_events(room_id, timezone.localdate()), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+@query_budget(3)
 @login_required()
 def view_booking(request, id):
-    booking = get_object_or_404(Booking, id=id)
+    booking = get_object_or_404(Booking.objects.select_related('userid'), id=id)
     return render(request, "booker/view_booking.html", {'booking': booking})
 
+@query_budget(9)
 @login_required()
 def edit_booking(request, id):
     booking = get_object_or_404(Booking, id=id)
     if request.method == 'POST':
         form = BookingForm(request.POST, instance=booking)
-        if form.is_valid():
-            form.save()
+        if form.is_valid() and form.save():
             return redirect("home")
     elif request.method == 'GET':
         date = booking.start.date()
@@ -120,9 +279,11 @@ def edit_booking(request, id):
             'date': date,
             'time': time,
             'duration': duration_in_min,
+            'room': booking.room_id,
         })
     return render(request, "booker/edit.html", {'id': booking.id, 'form': form, 'booking': booking})
 
+@query_budget(5)
 @login_required()
 def delete_booking(request, id):
     booking = get_object_or_404(Booking, id=id)
@@ -132,6 +293,7 @@ def delete_booking(request, id):
         return redirect("home")
     return redirect("home")
 
+@query_budget(8)
 def signup_view(request):
     if request.method == 'POST':
         form = SignUpForm(request.POST)
@@ -146,9 +308,11 @@ def signup_view(request):
         form = SignUpForm()
     return render(request, 'auth/signup.html', {'form': form})
 
+@query_budget(0)
 def index(request):
     return redirect('login')
 
+@query_budget(7)
 def login_view(request):
     if request.method == 'POST':
         form = LoginForm(request.POST)
@@ -12,5 +12,11 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bookersite.settings')
+# Serve the read-only booking API from the async views (booker_engine/async_api.py).
+os.environ.setdefault('ASYNC_API', '1')
+# Every ASGI request runs its database work in a thread of its own, so a kept
+# connection is never reused and only lingers. PgBouncer pools them instead,
+# see the pgbouncer service in compose.yaml.
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from pathlib import Path
 import os
+import sys
+
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -44,6 +47,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'corsheaders',
     'rest_framework',
     'rest_framework.authtoken',
@@ -64,12 +68,17 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'booker_engine.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+
+    'DEFAULT_RENDERER_CLASSES': [
+        'booker_engine.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -106,9 +115,69 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD','mysecretpassword'),
         'HOST': os.getenv('DB_HOST','localhost'),
         'PORT': os.getenv('DB_PORT','5432'),
+        # Seconds a worker keeps its connection open between requests, 0 closes
+        # it after every request. Health checks replace a connection the
+        # database dropped instead of failing the next request on it.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', '1') == '1',
+        # Needed behind PgBouncer in transaction pooling mode, compose.yaml runs it in session mode.
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_DISABLE_SERVER_SIDE_CURSORS', '') == '1',
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Local memory is per worker. Point CACHE_BACKEND/CACHE_LOCATION at a shared
+# backend (e.g. django.core.cache.backends.redis.RedisCache and
+# redis://redis:6379, as compose.yaml does) to share the booking day cache
+# between gunicorn workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 
+# The change versions live in the cache. A worker would keep serving its own
+# copy of a day another worker has since written, so several workers (gunicorn
+# reads WEB_CONCURRENCY) need a shared cache.
+if int(os.getenv('WEB_CONCURRENCY', 1)) > 1 and CACHES['default']['BACKEND'].endswith('.LocMemCache'):
+    raise ImproperlyConfigured('WEB_CONCURRENCY > 1 needs a shared CACHE_BACKEND, local memory is per worker')
+
+DAY_CACHE_TIMEOUT = int(os.getenv('DAY_CACHE_TIMEOUT', 86400))
+
+# The archive_bookings command moves bookings that ended this many days ago, and
+# soft deleted ones not touched for BOOKING_ARCHIVE_INACTIVE_DAYS, to the
+# archive table. Day and range reads before the cutoff also read the archive.
+BOOKING_ARCHIVE_AFTER_DAYS = int(os.getenv('BOOKING_ARCHIVE_AFTER_DAYS', 365))
+BOOKING_ARCHIVE_INACTIVE_DAYS = int(os.getenv('BOOKING_ARCHIVE_INACTIVE_DAYS', 30))
+
+# Resolved API tokens are kept in the shared cache and, briefly, in every
+# worker. A deleted token can keep working in other workers for up to
+# TOKEN_CACHE_LOCAL_TTL seconds. 0 disables a layer.
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 300))
+TOKEN_CACHE_LOCAL_TTL = int(os.getenv('TOKEN_CACHE_LOCAL_TTL', 10))
+
+# Route the read-only booking API to the async views in async_api.py.
+# bookersite/asgi.py turns this on, WSGI deployments keep the sync DRF views.
+ASYNC_API = os.getenv('ASYNC_API', '') == '1'
+
+# Per view query count, DB time, total time and response size, sent in a
+# Server-Timing header and aggregated for Prometheus at /metrics (admin token).
+REQUEST_METRICS = os.getenv('REQUEST_METRICS', '') == '1'
+if REQUEST_METRICS:
+    MIDDLEWARE.insert(0, 'booker_engine.metrics.RequestMetricsMiddleware')
+
+# Log repeated (N+1) and slow queries per request, and check the query budgets
+# declared with @query_budget next to the views: 'warn' logs, 'raise' fails the
+# request. The test suite raises, DEBUG warns, production leaves it off.
+QUERY_INSPECTOR = os.getenv('QUERY_INSPECTOR', 'raise' if sys.argv[1:2] == ['test'] else 'warn' if DEBUG else '')
+SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', 100))
+if QUERY_INSPECTOR:
+    MIDDLEWARE.insert(0, 'booker_engine.query_inspector.QueryInspectorMiddleware')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators